@@ -0,0 +1,95 @@
+# Import needed libraries
+import argparse
+import json
+import platform
+from typing import Any, Dict, List, Sequence, Tuple
+
+"""
+Helpers shared by the benchmark scripts.
+
+Every script writes its measurement records in a JSON document holding the run
+environment, and can compare them with the document of a previous run: records
+are matched on their key fields and flagged when slower than the baseline by
+more than --tolerance.
+"""
+
+
+
+def add_report_arguments (parser:argparse.ArgumentParser) -> None:
+    """
+    Adds the --json, --compare and --tolerance arguments to a benchmark parser.
+
+    :param parser: The argument parser of a benchmark script.
+    """
+
+    parser.add_argument("--json", help="write the records to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown flagged by --compare")
+
+
+
+def environment () -> Dict[str, str]:
+    """
+    Describes the interpreter and platform of a run.
+
+    :return: A dictionary of the Python version and the platform.
+    """
+
+    return {'python': platform.python_version(), 'platform': platform.platform()}
+
+
+
+def write_document (document:Dict[str, Any], file_path:str) -> None:
+    """
+    Writes the JSON document of a run.
+
+    :param document: The run environment and its records.
+    :param file_path: The JSON file path.
+    """
+
+    with open(file_path, "w") as handle:
+        json.dump(document, handle, indent=2)
+
+
+
+def compare (records:List[dict], baseline:Dict[str, Any], tolerance:float, key:Sequence[str]) -> List[Tuple]:
+    """
+    Compares records with a baseline run of the same measurements.
+
+    :param records: Measurement records, each with a 'seconds' field.
+    :param baseline: The JSON document of a previous run.
+    :param tolerance: Relative slowdown above which a measurement is flagged, e.g. 0.2 for 20%.
+    :param key: The fields identifying a measurement, e.g. ('benchmark', 'size').
+    :return: A list of (*key values, ratio, flagged) tuples, ratio being new time over baseline time.
+    """
+
+    previous = {tuple(record[field] for field in key): record['seconds'] for record in baseline['records']}
+    rows = []
+    for record in records:
+        values = tuple(record[field] for field in key)
+        if values in previous:
+            ratio = record['seconds'] / previous[values]
+            rows.append((*values, ratio, ratio > 1 + tolerance))
+    return rows
+
+
+
+def report_comparison (records:List[dict], file_path:str, tolerance:float, key:Sequence[str], widths:Sequence[str]) -> bool:
+    """
+    Compares records with the JSON document of a previous run and prints the ratios.
+
+    :param records: Measurement records, each with a 'seconds' field.
+    :param file_path: The JSON file of the previous run.
+    :param tolerance: Relative slowdown above which a measurement is flagged.
+    :param key: The fields identifying a measurement.
+    :param widths: The format specification of each key field, e.g. ('<24', '>10').
+    :return: Whether a measurement is flagged as slower.
+    """
+
+    with open(file_path) as handle:
+        rows = compare(records, json.load(handle), tolerance, key)
+    print()
+    for *values, ratio, flagged in rows:
+        labels = " ".join(format(value, width) for value, width in zip(values, widths))
+        print(f"{labels} {ratio:>8.2f}x{'  SLOWER' if flagged else ''}")
+    return any(flagged for *_, flagged in rows)
@@ -0,0 +1,92 @@
+# Import needed libraries
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from _common import add_report_arguments, environment, report_comparison, write_document
+
+# Allow running the script from a source checkout
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+"""
+Startup benchmark of the CrossDome package.
+
+Every target is imported in a fresh interpreter, the best wall time of --repeat runs
+being kept, together with the heavy dependencies the import pulled in. 'crossdome'
+is what every CLI invocation pays, 'crossdome.core_functions' what a scoring-only
+worker pays. Records are written as JSON so two versions can be compared with
+--compare, which flags targets slower than the baseline by more than --tolerance;
+--max-seconds fails the run when `import crossdome` exceeds a budget.
+
+Usage:
+    python benchmarks/bench_import.py --json import.json
+    python benchmarks/bench_import.py --compare import.json --max-seconds 0.1
+"""
+
+# Modules timed, from the bare package to the plotting functions
+TARGETS = ['crossdome', 'crossdome.core_functions', 'crossdome.parallel', 'crossdome.utils', 'crossdome.visualization']
+
+# Dependencies whose presence in sys.modules is reported after each import
+HEAVY_MODULES = ['pandas', 'scipy', 'scipy.stats', 'matplotlib', 'seaborn', 'pyarrow']
+
+# Run in the child interpreter: time the import and list the heavy modules it loaded
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {target}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+
+def measure (target:str, repeat:int) -> dict:
+    """
+    Imports a module in fresh interpreters.
+
+    :param target: The module to import.
+    :param repeat: The number of interpreters, the best time is kept.
+    :return: A measurement record.
+    """
+
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(target=target, heavy=HEAVY_MODULES)], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run['seconds'])
+    return {'target': target, 'seconds': best['seconds'], 'loaded': best['loaded']}
+
+
+
+def main ():
+    parser = argparse.ArgumentParser(description="CrossDome import time benchmark")
+    parser.add_argument("--targets", nargs="+", default=TARGETS, help="modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per target")
+    add_report_arguments(parser)
+    parser.add_argument("--max-seconds", type=float, help="fail when `import crossdome` takes longer")
+    args = parser.parse_args()
+
+    records = [measure(target, args.repeat) for target in args.targets]
+    print(f"{'target':<28} {'ms':>8}  heavy modules loaded")
+    for record in records:
+        print(f"{record['target']:<28} {record['seconds'] * 1000:>8.1f}  {', '.join(record['loaded']) or '-'}")
+
+    if args.json:
+        write_document({**environment(), 'records': records}, args.json)
+
+    failed = bool(args.compare) and report_comparison(records, args.compare, args.tolerance, ('target',), ('<28',))
+
+    package = next((record for record in records if record['target'] == 'crossdome'), None)
+    if args.max_seconds is not None and package is not None and package['seconds'] > args.max_seconds:
+        print(f"\nimport crossdome took {package['seconds']:.3f}s, over the {args.max_seconds:.3f}s budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+# Program entry point
+if __name__ == "__main__":
+    main()
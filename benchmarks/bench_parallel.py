@@ -0,0 +1,107 @@
+# Import needed libraries
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# Allow running the script from a source checkout
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from crossdome.core_classes import xrBackground
+from crossdome.core_functions import cross_compose_many
+from crossdome.encoding import decode_peptides
+from crossdome.parallel import ScreeningPool
+
+"""
+Scaling benchmark for multi-core screening.
+
+Screens a batch of queries against a synthetic background with an increasing
+number of workers and reports pairs/sec, speedup and parallel efficiency.
+Pools are started before timing so only steady-state screening is measured.
+Speedups are relative to a single-process run, which is always timed.
+
+Usage:
+    python benchmarks/bench_parallel.py --size 2000000 --queries 64 --workers 1 2 4 8 16 32 64
+"""
+
+
+
+def run (size:int, queries:int, workers:list, top_k:int, repeat:int, seed:int) -> list:
+    """
+    Times cross_compose_many for each worker count.
+
+    :param size: Number of synthetic background peptides.
+    :param queries: Number of query peptides.
+    :param workers: Worker counts to benchmark (1 runs the single-process engine, and is added when missing).
+    :param top_k: Hits kept per query, keeps result building out of the measurement.
+    :param repeat: Timed repetitions per worker count, the best one is kept.
+    :param seed: Random seed of the synthetic data.
+    :return: A list of measurement records.
+    """
+
+    rng = np.random.default_rng(seed)
+    background = xrBackground.from_encoded("synthetic", rng.integers(0, 20, size=(size, 9), dtype=np.uint8))
+    query_peptides = decode_peptides(rng.integers(0, 20, size=(queries, 9), dtype=np.uint8))
+
+    # The single-process run is the baseline of the speedups, timed first
+    workers = [1] + [count for count in dict.fromkeys(workers) if count != 1]
+
+    records = []
+    for count in workers:
+        pool = ScreeningPool(background, workers=count) if count > 1 else None
+        timings = []
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            if pool is None:
+                cross_compose_many(query_peptides, background, top_k=top_k)
+            else:
+                pool.compose_many(query_peptides, top_k=top_k)
+            timings.append(time.perf_counter() - start)
+        if pool is not None:
+            pool.close()
+
+        # The first run warms up the workers and is discarded
+        timings = timings[1:]
+
+        best = min(timings)
+        records.append({
+            'workers': count,
+            'seconds': best,
+            'pairs_per_second': size * queries / best
+        })
+
+    baseline = records[0]['seconds']
+    for record in records:
+        record['speedup'] = baseline / record['seconds']
+        record['efficiency'] = record['speedup'] / record['workers']
+    return records
+
+
+
+def main ():
+    parser = argparse.ArgumentParser(description="CrossDome multi-core screening benchmark")
+    parser.add_argument("--size", type=int, default=1_000_000, help="number of background peptides")
+    parser.add_argument("--queries", type=int, default=32, help="number of query peptides")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="worker counts to benchmark")
+    parser.add_argument("--top-k", type=int, default=100, help="hits kept per query")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per worker count")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--json", help="write the records to this JSON file")
+    args = parser.parse_args()
+
+    records = run(args.size, args.queries, args.workers, args.top_k, args.repeat, args.seed)
+
+    print(f"{'workers':>8} {'seconds':>10} {'pairs/sec':>14} {'speedup':>8} {'efficiency':>10}")
+    for record in records:
+        print(f"{record['workers']:>8} {record['seconds']:>10.3f} {record['pairs_per_second']:>14.3e} {record['speedup']:>8.2f} {record['efficiency']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump({'size': args.size, 'queries': args.queries, 'cpu_count': os.cpu_count(), 'records': records}, handle, indent=2)
+
+
+# Program entry point
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# Import needed libraries
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+# Allow running the script from a source checkout
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import crossdome
+from crossdome.core_classes import xrBackground
+from crossdome.core_functions import cross_compose, cross_compose_many, cross_write
+from crossdome.encoding import decode_peptides
+from crossdome.quant import mismatch_distribution
+from crossdome.utils import load_background_binary, load_hla_database, save_background_binary
+
+from _common import add_report_arguments, environment, report_comparison, write_document
+
+"""
+Benchmark suite for scoring, quant, I/O and result building.
+
+Every benchmark runs against synthetic backgrounds of increasing size and records
+its best wall time, throughput (peptides/sec) and peak traced memory. The scaling
+exponent of each benchmark is the slope of log(time) against log(size), close to 1
+for linear work. Records are written as JSON so two versions can be compared with
+--compare, which flags benchmarks slower than the baseline by more than --tolerance.
+
+Usage:
+    python benchmarks/bench_suite.py --sizes 10000 100000 1000000 --json results.json
+    python benchmarks/bench_suite.py --sizes 10000 100000 1000000 --compare results.json
+"""
+
+# Benchmarks, each given the benchmark data (background, queries, file paths) and returning the callable to time
+BENCHMARKS = {
+    'cross_compose': lambda data: lambda: cross_compose(data['queries'][0], data['background']),
+    'cross_compose_top_k': lambda data: lambda: cross_compose(data['queries'][0], data['background'], top_k=100),
+    'cross_compose_many': lambda data: lambda: cross_compose_many(data['queries'], data['background'], top_k=100),
+    'result_dataframe': lambda data: lambda: cross_compose(data['queries'][0], data['background']).result,
+    'mismatch_distribution': lambda data: lambda: mismatch_distribution(data['queries'][0], data['background']),
+    'cross_write_csv': lambda data: lambda: cross_write(cross_compose(data['queries'][0], data['background']),
+                                                        os.path.join(data['directory'], "results.csv")),
+    'load_hla_database': lambda data: lambda: load_hla_database(data['csv']),
+    'load_background_binary': lambda data: lambda: load_background_binary(data['binary'], mmap=False),
+}
+
+# Benchmarks scoring several queries, whose throughput counts query-peptide pairs
+_PAIR_BENCHMARKS = {'cross_compose_many'}
+
+
+
+def synthetic_background(size:int, length:int = 9, seed:int = 0, allele:str = "synthetic") -> xrBackground:
+    """
+    Generates a background of uniformly random peptides.
+
+    :param size: Number of peptides.
+    :param length: Peptide length.
+    :param seed: Random seed, the same seed gives the same background.
+    :param allele: Allele name of the background.
+    :return: An xrBackground.
+    """
+
+    rng = np.random.default_rng(seed)
+    return xrBackground.from_encoded(allele, rng.integers(0, 20, size=(size, length), dtype=np.uint8), validate=False)
+
+
+
+def _best_time(function, repeat:int) -> float:
+    """Best wall time of repeat calls, after one warm-up call."""
+
+    function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+
+def _peak_memory(function) -> int:
+    """Peak traced allocation of one call, in bytes (NumPy buffers are traced too)."""
+
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+
+def run (sizes:list, names:list, queries:int, repeat:int, seed:int) -> list:
+    """
+    Runs the selected benchmarks for every background size.
+
+    :param sizes: Background sizes.
+    :param names: Names of the benchmarks to run.
+    :param queries: Number of query peptides of cross_compose_many.
+    :param repeat: Timed repetitions, the best one is kept.
+    :param seed: Random seed of the synthetic data.
+    :return: A list of measurement records.
+    """
+
+    records = []
+    for size in sizes:
+        background = synthetic_background(size, seed=seed)
+        query_peptides = decode_peptides(np.random.default_rng(seed + 1).integers(0, 20, size=(queries, 9), dtype=np.uint8))
+
+        with tempfile.TemporaryDirectory() as directory:
+            data = {'background': background, 'queries': query_peptides, 'directory': directory,
+                    'csv': os.path.join(directory, "background.csv"), 'binary': os.path.join(directory, "background.xrbg")}
+            if 'load_hla_database' in names:
+                pd.DataFrame({'peptide': background.peptides}).to_csv(data['csv'], index=False)
+            if 'load_background_binary' in names:
+                save_background_binary(background, data['binary'])
+
+            for name in names:
+                function = BENCHMARKS[name](data)
+                seconds = _best_time(function, repeat)
+                work = size * queries if name in _PAIR_BENCHMARKS else size
+                records.append({'benchmark': name, 'size': size, 'seconds': seconds,
+                                'peptides_per_second': work / seconds, 'peak_bytes': _peak_memory(function)})
+    return records
+
+
+
+def scaling (records:list) -> dict:
+    """
+    Fits the scaling exponent of each benchmark, the slope of log(seconds) against log(size).
+
+    :param records: Measurement records of run.
+    :return: A dictionary of exponents, for benchmarks measured at two sizes or more.
+    """
+
+    exponents = {}
+    for name in dict.fromkeys(record['benchmark'] for record in records):
+        points = [(record['size'], record['seconds']) for record in records if record['benchmark'] == name]
+        if len(points) > 1:
+            sizes, seconds = np.log(np.array(points, dtype=np.float64)).T
+            exponents[name] = float(np.polyfit(sizes, seconds, 1)[0])
+    return exponents
+
+
+
+def main ():
+    parser = argparse.ArgumentParser(description="CrossDome benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="background sizes")
+    parser.add_argument("--benchmarks", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--queries", type=int, default=16, help="number of query peptides of cross_compose_many")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repetitions per measurement")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+
+    records = run(args.sizes, args.benchmarks, args.queries, args.repeat, args.seed)
+    exponents = scaling(records)
+
+    print(f"{'benchmark':<24} {'size':>10} {'seconds':>10} {'peptides/sec':>14} {'peak MiB':>10}")
+    for record in records:
+        print(f"{record['benchmark']:<24} {record['size']:>10} {record['seconds']:>10.4f} "
+              f"{record['peptides_per_second']:>14.3e} {record['peak_bytes'] / 2 ** 20:>10.1f}")
+    print()
+    for name, exponent in exponents.items():
+        print(f"{name:<24} scaling exponent {exponent:.2f}")
+
+    document = {'version': crossdome.__version__, **environment(), 'numpy': np.__version__, 'cpu_count': os.cpu_count(),
+                'queries': args.queries, 'records': records, 'scaling': exponents}
+    if args.json:
+        write_document(document, args.json)
+
+    if args.compare and report_comparison(records, args.compare, args.tolerance, ('benchmark', 'size'), ('<24', '>10')):
+        sys.exit(1)
+
+
+# Program entry point
+if __name__ == "__main__":
+    main()
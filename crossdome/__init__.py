@@ -1,8 +1,10 @@
-# Import modules and functions exposing them at package level
-from .core_functions import cross_compose, cross_pair_summary, cross_substitution_matrix, cross_write
-from .quant import peptide_similarity, overall_similarity, mismatch_distribution, peptide_distance
-from .utils import load_hla_database, load_background_peptides, save_results_to_csv, validate_peptide_length
-from .visualization import plot_similarity_heatmap, plot_mismatch_distribution, plot_relatedness_score_distribution, plot_peptide_expression
+# Import the submodules lazily, exposing their functions at package level on first access
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+# The profiling module is light, and imported eagerly: its profiling context would otherwise be
+# shadowed by the submodule itself as soon as another submodule imports it
+from .profiling import Profiler, profiling
 
 # Define the version of your package
 __version__ = "1.0.0"
@@ -21,4 +23,77 @@ Modules:
 - quant: Quantitative analysis functions
 - utils: Utility functions for file I/O and validation
 - visualization: Functions for visualizing peptide-related data
-"""
\ No newline at end of file
+
+Submodules are imported on first access to one of their names, so `import crossdome`
+loads neither matplotlib, seaborn nor scipy until a plot or statistic needs them.
+"""
+
+# Public names and the submodule defining each of them
+_LAZY_ATTRIBUTES = {
+    **dict.fromkeys(['cross_compose', 'cross_compose_many', 'cross_pair_summary', 'cross_substitution_matrix', 'cross_write'],
+                    'core_functions'),
+    **dict.fromkeys(['peptide_similarity', 'overall_similarity', 'mismatch_distribution', 'peptide_distance',
+                     'mismatch_matrix', 'similarity_matrix', 'mismatch_histogram'], 'quant'),
+    **dict.fromkeys(['load_hla_database', 'load_background_peptides', 'save_results_to_csv', 'validate_peptide_length',
+                     'save_background_binary', 'load_background_binary', 'convert_csv_to_background',
+                     'load_bio_database', 'load_expression_table', 'load_off_target_backgrounds',
+                     'load_background_file', 'read_fasta', 'read_query_peptides'], 'utils'),
+    **dict.fromkeys(['ResultWriter', 'write_results'], 'export'),
+    **dict.fromkeys(['EmpiricalNull', 'empirical_null', 'ScoreSummaries'], 'null'),
+    'ResultCache': 'cache',
+    'ExpressionIndex': 'expression',
+    'ProteomeIndex': 'proteome',
+    **dict.fromkeys(['pairwise_matrix', 'cluster_order'], 'pairwise'),
+    **dict.fromkeys(['plot_similarity_heatmap', 'plot_mismatch_distribution', 'plot_relatedness_score_distribution',
+                     'plot_peptide_expression', 'plot_query_reports'], 'visualization'),
+}
+
+# Submodules, also imported on first access
+_SUBMODULES = ('cache', 'core_classes', 'core_functions', 'encoding', 'export', 'expression', 'index', 'null', 'pairwise',
+               'parallel', 'proteome', 'quant', 'rdata', 'server', 'substitution', 'utils', 'visualization')
+
+__all__ = list(_LAZY_ATTRIBUTES) + ['Profiler', 'profiling']
+
+
+
+def __getattr__(name:str) -> Any:
+    """
+    Imports the submodule defining a public name on first access, and caches the name.
+
+    :param name: The attribute name.
+    :return: The function, class or submodule.
+    :raises AttributeError: If the package has no such name.
+    """
+
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_SUBMODULES))
+
+
+# Static analysis and IDEs see the eager imports
+if TYPE_CHECKING:
+    from .core_functions import cross_compose, cross_compose_many, cross_pair_summary, cross_substitution_matrix, cross_write
+    from .quant import peptide_similarity, overall_similarity, mismatch_distribution, peptide_distance
+    from .quant import mismatch_matrix, similarity_matrix, mismatch_histogram
+    from .utils import load_hla_database, load_background_peptides, save_results_to_csv, validate_peptide_length
+    from .utils import save_background_binary, load_background_binary, convert_csv_to_background
+    from .utils import load_bio_database, load_expression_table, load_off_target_backgrounds
+    from .utils import load_background_file, read_fasta, read_query_peptides
+    from .export import ResultWriter, write_results
+    from .null import EmpiricalNull, empirical_null, ScoreSummaries
+    from .cache import ResultCache
+    from .expression import ExpressionIndex
+    from .proteome import ProteomeIndex
+    from .pairwise import pairwise_matrix, cluster_order
+    from .visualization import plot_similarity_heatmap, plot_mismatch_distribution, plot_relatedness_score_distribution
+    from .visualization import plot_peptide_expression, plot_query_reports
@@ -0,0 +1,233 @@
+# Import needed libraries
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Import core objects
+from crossdome.core_classes import xrBackground, xrResult
+from crossdome.substitution import Substitution, substitution_key
+
+"""
+Memoization of CrossDome screening results.
+
+A ResultCache maps (query, background fingerprint, position weights, scoring and
+selection options) to the arrays of a finished xrResult. Because the key holds a
+content fingerprint of the background, a modified background never reuses stale
+entries: it simply misses. Entries live in an in-memory LRU tier bounded by size
+in bytes and, optionally, in an on-disk tier of .npz files shared across runs.
+"""
+
+# Default memory budget of the in-memory tier
+_CACHE_MAX_BYTES:int = 256 << 20
+
+# Arrays stored per entry, subject_row is absent when every background row is reported
+_CACHE_ARRAYS = ('subject_row', 'relatedness_score', 'num_positive', 'num_negative', 'rank')
+
+# Rough per-entry bookkeeping cost counted on top of the arrays
+_CACHE_ENTRY_OVERHEAD:int = 512
+
+
+
+def _null_key (null:Any) -> Any:
+    """Turns the null option (a name or an EmpiricalNull) into a hashable key."""
+
+    if null is None or isinstance(null, str):
+        return null or 'normal'
+    return ('empirical', hashlib.blake2b(np.ascontiguousarray(null.scores).data, digest_size=16).hexdigest())
+
+
+
+class ResultCache:
+    """
+    A two-tier cache of screening results.
+
+    Pass it to cross_compose or cross_compose_many with cache=...; only queries
+    missing from the cache are scored.
+
+    Attributes:
+        max_bytes (int): The memory budget of the in-memory tier.
+        directory (str): The directory of the on-disk tier, or None.
+        hits (int): Lookups answered from memory or disk.
+        misses (int): Lookups that required scoring.
+        disk_hits (int): Hits answered from the on-disk tier.
+        evictions (int): Entries dropped from memory to stay within max_bytes.
+        nbytes (int): The current size of the in-memory tier.
+    """
+
+    def __init__(self, max_bytes:int = _CACHE_MAX_BYTES, directory:str = None):
+        if max_bytes < 0:
+            raise ValueError(f"max_bytes must be non-negative, got {max_bytes} instead.")
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries:"OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        if directory is not None:
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                raise IOError(f"Cannot create cache directory {directory}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key:str) -> bool:
+        return key in self._entries or (self.directory is not None and os.path.exists(self._path(key)))
+
+    def __repr__(self):
+        return f"ResultCache(entries={len(self)}, nbytes={self.nbytes}, hits={self.hits}, misses={self.misses})"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and size counters, e.g. to size max_bytes."""
+
+        return {'hits': self.hits, 'misses': self.misses, 'disk_hits': self.disk_hits, 'evictions': self.evictions,
+                'entries': len(self._entries), 'nbytes': self.nbytes, 'max_bytes': self.max_bytes}
+
+    @staticmethod
+    def key(query:str, background:xrBackground, position_weight:List[float], top_k:int = None, max_score:float = None,
+            max_mismatches:int = None, substitution:Substitution = None, align:bool = False, null:Any = None,
+            index:bool = False, summaries:bool = False) -> str:
+        """
+        Builds the cache key of one query.
+
+        :param query: The query peptide.
+        :param background: The background (or length bucket) the query is scored against.
+        :param position_weight: The resolved position weights.
+        :param top_k: The top_k selection (optional).
+        :param max_score: The max_score selection (optional).
+        :param max_mismatches: The max_mismatches selection (optional).
+        :param substitution: The substitution scheme (optional).
+        :param align: Whether lengths are aligned on their anchors.
+        :param null: The null option or EmpiricalNull (optional).
+        :param index: Whether the background was pre-filtered with a mismatch index.
+        :param summaries: Whether an index search reports statistics from score summaries.
+        :return: A hex digest.
+        """
+
+        parts = (query, background.fingerprint(), tuple(float(weight) for weight in position_weight), top_k, max_score,
+                 max_mismatches, substitution_key(substitution), bool(align), _null_key(null), bool(index))
+        if summaries:
+            parts += ('summaries',)
+        return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=20).hexdigest()
+
+    def get(self, key:str, background:xrBackground, null:Any = None) -> Optional[xrResult]:
+        """
+        Looks up a result, rebuilding it against the background it was computed on.
+
+        :param key: The cache key, see ResultCache.key.
+        :param background: The background (or length bucket) used in the key.
+        :param null: The resolved EmpiricalNull of the key, None for the normal approximation.
+        :return: A new xrResult, or None on a miss.
+        """
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        elif self.directory is not None:
+            entry = self._load(key)
+            if entry is not None:
+                self.disk_hits += 1
+                self._remember(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        arrays = entry['arrays']
+        result = xrResult.from_arrays(entry['query'], background, arrays, arrays['rank'], rows=arrays.get('subject_row'),
+                                      summary=tuple(entry['summary']), position_weight=entry['position_weight'], null=null)
+        result.analysis['score_summary'] = entry['score_summary']
+        return result
+
+    def put(self, key:str, result:xrResult) -> None:
+        """
+        Stores the arrays of a single-query result.
+
+        Results that are not array-backed (e.g. after assigning result.result) are not cached.
+
+        :param key: The cache key, see ResultCache.key.
+        :param result: The xrResult returned for the key.
+        """
+
+        store = result._store
+        if store is None or result._rows is not None or result._columns is not None or result._extra or store['query_row'] is not None:
+            return
+
+        arrays = {name: store[name] for name in _CACHE_ARRAYS if store[name] is not None}
+        entry = {'query': store['queries'][0], 'arrays': arrays, 'summary': [float(value) for value in store['stats'][0]],
+                 'position_weight': None if result.position_weight is None else [float(weight) for weight in result.position_weight],
+                 'score_summary': result.analysis.get('score_summary')}
+        self._remember(key, entry)
+        if self.directory is not None:
+            self._save(key, entry)
+
+    def clear(self, disk:bool = False) -> None:
+        """
+        Empties the in-memory tier, and the on-disk tier when disk is True.
+
+        :param disk: Also delete the cache files.
+        """
+
+        self._entries.clear()
+        self.nbytes = 0
+        if disk and self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _remember(self, key:str, entry:Dict[str, Any]) -> None:
+        """Adds an entry to the in-memory tier, evicting the least recently used ones beyond max_bytes."""
+
+        size = sum(array.nbytes for array in entry['arrays'].values()) + _CACHE_ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)['nbytes']
+        entry['nbytes'] = size
+        self._entries[key] = entry
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted['nbytes']
+            self.evictions += 1
+
+    def _path(self, key:str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _save(self, key:str, entry:Dict[str, Any]) -> None:
+        """Writes an entry to the on-disk tier, atomically so concurrent runs never read partial files."""
+
+        meta = {name: entry[name] for name in ('query', 'summary', 'position_weight', 'score_summary')}
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.savez(file, meta=np.array(json.dumps(meta)), **entry['arrays'])
+            os.replace(temporary, self._path(key))
+        except OSError as e:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise IOError(f"Error writing cache entry to {self.directory}: {e}")
+
+    def _load(self, key:str) -> Optional[Dict[str, Any]]:
+        """Reads an entry from the on-disk tier, a missing or unreadable file being a miss."""
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = json.loads(str(data['meta']))
+                entry['arrays'] = {name: data[name] for name in _CACHE_ARRAYS if name in data.files}
+        except (OSError, ValueError, KeyError):
+            return None
+        return entry
@@ -1,32 +1,394 @@
 # Imported libraries
+import hashlib
+import re
+import weakref
+import numpy as np
 import pandas as pd
 import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple, Union
+
+from crossdome.profiling import stage
+from crossdome.encoding import AMINO_ACIDS, PEPTIDE_LENGTHS, encode_peptides, decode_peptides, pack_peptides
+
+# Columns of a screening result, in DataFrame order
+RESULT_COLUMNS:List[str] = ['query', 'subject', 'relatedness_score', 'num_positive', 'num_negative',
+                            'zscore', 'pvalue', 'percentile_rank', 'rank']
 
 class xrBackground:
     """
     A class to represent the CrossDome background data holding peptides and related stats.
     
+    Peptides are validated in one vectorized pass at construction and kept as
+    compact uint8 residue matrices, one fixed-width bucket per peptide length;
+    the string list is only materialized on demand.
+    
+    Peptides can be appended and removed in place. Indexes and score summaries
+    built on the background subscribe to it and are updated with the changed
+    rows only (see subscribe).
+    
     Attributes:
         allele (str): The MHC Class I allele.
-        peptides (List[str]): List of 9-mer peptides.
+        peptides (List[str]): List of peptides, grouped by increasing length.
+        encoded (np.ndarray): (N, L) uint8 matrix of residue codes of a single-length background.
+        buckets (Dict[int, np.ndarray]): The residue matrix of each peptide length.
         stats (dict): A dictionary to hold statistics like off-target and database size.
     """
     
-    def __init__(self, allele: str, peptides: List[str]):
+    __slots__ = ('allele', 'stats', '_buckets', '_peptides', '_views', '_fingerprint', '_listeners')
+    
+    def __init__(self, allele: str, peptides: List[str], deduplicate: bool = False, lengths: Iterable[int] = (9,)):
         self.allele = allele
-        self.peptides = peptides
+        lengths = _checking_lengths(lengths)
+        
+        if len(lengths) == 1:
+            # Ensure all peptides have the single expected length and standard amino acids
+            self._buckets: Dict[int, np.ndarray] = {lengths[0]: encode_peptides(peptides, length=lengths[0])}
+            self._peptides: Dict[int, Optional[List[str]]] = {lengths[0]: peptides}
+        else:
+            # Split a mixed-length collection into one bucket per length
+            sizes = np.fromiter(map(len, peptides), dtype=np.int64, count=len(peptides))
+            unexpected = np.flatnonzero(~np.isin(sizes, lengths))
+            if unexpected.size:
+                raise ValueError(f"Expected peptides of length {', '.join(map(str, lengths))}, "
+                                 f"got size {sizes[unexpected[0]]} instead ({peptides[unexpected[0]]}).")
+            self._buckets, self._peptides = {}, {}
+            for length in lengths:
+                members = [peptides[row] for row in np.flatnonzero(sizes == length)]
+                self._buckets[length] = encode_peptides(members, length=length)
+                self._peptides[length] = members
+        
+        self._views: Dict[int, 'xrBackground'] = {}
+        self._fingerprint: Optional[str] = None
+        self._listeners = weakref.WeakSet()
+        if deduplicate:
+            self._deduplicate()
+        self._update_stats()
+    
+    @classmethod
+    def from_encoded(cls, allele: str, encoded: Union[np.ndarray, Dict[int, np.ndarray]], deduplicate: bool = False,
+                     validate: bool = True) -> 'xrBackground':
+        """
+        Builds a background directly from residue code matrices, skipping string parsing.
+        
+        :param allele: The MHC Class I allele.
+        :param encoded: A (N, L) matrix of residue codes, or a dictionary of such matrices keyed
+                        by peptide length; memory-mapped arrays are kept as is.
+        :param deduplicate: Drop repeated peptides, keeping the first occurrence.
+        :param validate: Check every residue code (skip for trusted, already validated sources).
+        :return: A new xrBackground object.
+        """
+        
+        buckets = encoded if isinstance(encoded, dict) else {None: encoded}
+        background = cls.__new__(cls)
+        background.allele = allele
+        background._buckets, background._peptides, background._views = {}, {}, {}
+        background._fingerprint = None
+        background._listeners = weakref.WeakSet()
+        
+        for length, matrix in buckets.items():
+            if not isinstance(matrix, np.ndarray):
+                matrix = np.asarray(matrix)
+            if matrix.ndim != 2 or matrix.shape[1] not in PEPTIDE_LENGTHS or matrix.shape[1] != (length or matrix.shape[1]):
+                raise ValueError(f"Encoded peptides must be of length {PEPTIDE_LENGTHS.start} to {PEPTIDE_LENGTHS.stop - 1}, "
+                                 f"got a matrix of shape {matrix.shape} for length {length}.")
+            if validate and matrix.size and int(matrix.max()) >= len(AMINO_ACIDS):
+                raise ValueError("Encoded background contains codes outside of the standard amino acids.")
+            background._buckets[matrix.shape[1]] = matrix if matrix.dtype == np.uint8 else matrix.astype(np.uint8)
+            background._peptides[matrix.shape[1]] = None
+        
+        if not background._buckets:
+            raise ValueError("Encoded background holds no peptide length.")
+        background._buckets = dict(sorted(background._buckets.items()))
+        if deduplicate:
+            background._deduplicate()
+        background._update_stats()
+        return background
+    
+    def _update_stats(self) -> None:
+        """Recomputes the database size statistics from the buckets."""
+        
         self.stats = {
             'off-target': 0,
-            'database': len(peptides)
+            'database': sum(len(matrix) for matrix in self._buckets.values())
         }
+        if len(self._buckets) > 1:
+            self.stats['lengths'] = {length: len(matrix) for length, matrix in self._buckets.items()}
+    
+    def _deduplicate(self) -> None:
+        """Drops repeated peptides in place, keeping the first occurrence of each."""
+        
+        for length, matrix in self._buckets.items():
+            _, first = np.unique(pack_peptides(matrix), return_index=True)
+            if len(first) == len(matrix):
+                continue
+            
+            keep = np.sort(first)
+            self._buckets[length] = matrix[keep]
+            self._peptides[length] = None
+        self._views = {}
+        self._fingerprint = None
+    
+    def fingerprint(self) -> str:
+        """
+        Returns a content fingerprint of the background, computed once and cached.
+        
+        Two backgrounds with the same allele and the same peptides in the same order
+        share a fingerprint, whatever their origin (strings, binary file, memory map).
+        
+        :return: A hex digest of the allele and every residue matrix.
+        """
+        
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(str(self.allele).encode("utf-8"))
+            for length, matrix in self._buckets.items():
+                digest.update(length.to_bytes(2, "little") + len(matrix).to_bytes(8, "little"))
+                digest.update(np.ascontiguousarray(matrix).data)
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+    
+    @property
+    def lengths(self) -> List[int]:
+        """The peptide lengths held by the background, in increasing order."""
+        
+        return list(self._buckets)
+    
+    @property
+    def buckets(self) -> Dict[int, np.ndarray]:
+        """The residue matrix of each peptide length."""
+        
+        return dict(self._buckets)
+    
+    @property
+    def encoded(self) -> np.ndarray:
+        """(N, L) uint8 matrix of residue codes, aligned with peptides (single-length backgrounds only)."""
+        
+        if len(self._buckets) != 1:
+            raise ValueError(f"Background holds peptides of length {self.lengths}, select one with bucket(length).")
+        return next(iter(self._buckets.values()))
+    
+    def bucket(self, length: int) -> 'xrBackground':
+        """
+        Returns the single-length background of the given peptide length.
+        
+        The bucket shares its residue matrix with this background; a single-length
+        background is its own bucket.
+        
+        :param length: The peptide length.
+        :return: An xrBackground holding only peptides of that length.
+        :raises ValueError: If the background has no bucket for that length.
+        """
+        
+        if length not in self._buckets:
+            raise ValueError(f"Background holds peptides of length {self.lengths}, got a query of length {length} instead.")
+        if len(self._buckets) == 1:
+            return self
+        if length not in self._views:
+            view = xrBackground.from_encoded(self.allele, self._buckets[length], validate=False)
+            view._peptides[length] = self._peptides[length]
+            self._views[length] = view
+        return self._views[length]
+    
+    @property
+    def peptides(self) -> List[str]:
+        """List of peptides grouped by increasing length, decoded from the residue matrices on first access."""
         
-        # Ensure all peptides are 9-mers
-        if not all(len(pep) == 9 for pep in peptides):
-            raise ValueError("All peptides must be 9-mers.")
+        for length, matrix in self._buckets.items():
+            if self._peptides[length] is None:
+                self._peptides[length] = decode_peptides(matrix)
+        if len(self._buckets) == 1:
+            return next(iter(self._peptides.values()))
+        return [peptide for peptides in self._peptides.values() for peptide in peptides]
+    
+    def take_peptides(self, indices: np.ndarray) -> List[str]:
+        """
+        Returns the peptides at the given row indices without materializing the full list.
+
+        Rows of a mixed-length background follow the peptides order (grouped by length).
+
+        :param indices: Row indices into the background.
+        :return: A list of peptide strings.
+        """
+
+        indices = np.asarray(indices, dtype=np.int64)
+        lengths = self.lengths
+        offsets = np.cumsum([0] + [len(self._buckets[length]) for length in lengths])
+        owners = np.searchsorted(offsets, indices, side='right') - 1
+
+        peptides = [None] * len(indices)
+        for owner in np.unique(owners):
+            length = lengths[owner]
+            selected = np.flatnonzero(owners == owner)
+            local = indices[selected] - offsets[owner]
+            if self._peptides[length] is not None:
+                decoded = [self._peptides[length][index] for index in local]
+            else:
+                decoded = decode_peptides(self._buckets[length][local])
+            for position, peptide in zip(selected, decoded):
+                peptides[position] = peptide
+        return peptides
+
+    def _encode_groups(self, peptides: Union[Sequence[str], np.ndarray]) -> Dict[int, np.ndarray]:
+        """Validates and encodes peptides of the background lengths, grouped by length."""
+        
+        if isinstance(peptides, np.ndarray):
+            if peptides.ndim != 2 or peptides.shape[1] not in self._buckets:
+                raise ValueError(f"Expected encoded peptides of length {', '.join(map(str, self.lengths))}, "
+                                 f"got a matrix of shape {peptides.shape} instead.")
+            if peptides.size and int(peptides.max()) >= len(AMINO_ACIDS):
+                raise ValueError("Encoded peptides contain codes outside of the standard amino acids.")
+            return {peptides.shape[1]: peptides.astype(np.uint8, copy=False)}
+        
+        peptides = list(peptides)
+        sizes = np.fromiter(map(len, peptides), dtype=np.int64, count=len(peptides))
+        unexpected = np.flatnonzero(~np.isin(sizes, self.lengths))
+        if unexpected.size:
+            raise ValueError(f"Expected peptides of length {', '.join(map(str, self.lengths))}, "
+                             f"got size {sizes[unexpected[0]]} instead ({peptides[unexpected[0]]}).")
+        return {
+            length: encode_peptides([peptides[row] for row in np.flatnonzero(sizes == length)], length=length)
+            for length in self.lengths if (sizes == length).any()
+        }
+    
+    def _replace_bucket(self, length: int, matrix: np.ndarray, added: np.ndarray = None, removed: np.ndarray = None,
+                        keep: np.ndarray = None) -> None:
+        """Installs a changed residue matrix and forwards the change to the bucket view and the subscribers."""
+        
+        self._buckets[length] = matrix
+        self._fingerprint = None
+        self._update_stats()
+        view = self._views.get(length)
+        if view is not None:
+            view._peptides[length] = self._peptides[length]
+            view._replace_bucket(length, matrix, added=added, removed=removed, keep=keep)
+        for listener in list(self._listeners):
+            listener.background_changed(self, length, added=added, removed=removed, keep=keep)
+    
+    def subscribe(self, listener: Any) -> None:
+        """
+        Registers an object to be told about appended and removed peptides.
+        
+        After every change of a length bucket, the listener's
+        background_changed(background, length, added, removed, keep) method is called with the
+        residue matrix of the appended rows (now last in the bucket), the residue matrix of the
+        removed rows and the boolean mask of the previous rows that were kept (None when unused).
+        Listeners are held by weak reference and dropped once garbage collected.
+        
+        :param listener: An object with a background_changed method, e.g. a SegmentIndex.
+        """
+        
+        self._listeners.add(listener)
+    
+    def append(self, peptides: Union[Sequence[str], np.ndarray], deduplicate: bool = False) -> int:
+        """
+        Appends peptides in place, after the existing peptides of their length.
+        
+        Only the new rows are encoded and passed to the bucket views, indexes and score
+        summaries subscribed to the background; the fingerprint is recomputed on next use.
+        
+        :param peptides: Peptides of lengths held by the background, or a (N, L) residue code matrix.
+        :param deduplicate: Skip peptides already in the background or repeated in the input.
+        :return: The number of peptides added.
+        :raises ValueError: If a peptide has an unexpected length or non-standard amino acids.
+        """
+        
+        count = 0
+        for length, matrix in self._encode_groups(peptides).items():
+            if deduplicate:
+                keys = pack_peptides(matrix)
+                _, first = np.unique(keys, return_index=True)
+                first = np.sort(first)
+                matrix = matrix[first[~np.isin(keys[first], pack_peptides(self._buckets[length]))]]
+            if not len(matrix):
+                continue
+            
+            if self._peptides[length] is not None:
+                self._peptides[length] = self._peptides[length] + decode_peptides(matrix)
+            self._replace_bucket(length, np.concatenate([self._buckets[length], matrix]), added=matrix)
+            count += len(matrix)
+        return count
+    
+    def remove(self, peptides: Union[Sequence[str], np.ndarray]) -> int:
+        """
+        Removes every occurrence of the given peptides in place, keeping the order of the others.
+        
+        Subscribed indexes and score summaries are updated with the removed rows only.
+        
+        :param peptides: Peptides of lengths held by the background, or a (N, L) residue code matrix.
+        :return: The number of rows removed.
+        :raises ValueError: If a peptide has an unexpected length or non-standard amino acids.
+        """
+        
+        count = 0
+        for length, matrix in self._encode_groups(peptides).items():
+            current = self._buckets[length]
+            keep = ~np.isin(pack_peptides(current), pack_peptides(matrix))
+            if keep.all():
+                continue
+            
+            if self._peptides[length] is not None:
+                self._peptides[length] = np.asarray(self._peptides[length], dtype=object)[keep].tolist()
+            self._replace_bucket(length, current[keep], removed=current[~keep], keep=keep)
+            count += int((~keep).sum())
+        return count
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # Subscribers stay with the original background
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_listeners'}
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._listeners = weakref.WeakSet()
+
+    def __len__(self) -> int:
+        return self.stats['database']
     
     def __repr__(self):
-        return f"xrBackground(allele={self.allele}, peptides_count={len(self.peptides)})"
+        if len(self._buckets) > 1:
+            return f"xrBackground(allele={self.allele}, peptides_count={len(self)}, lengths={self.lengths})"
+        return f"xrBackground(allele={self.allele}, peptides_count={len(self)})"
+
+
+
+def _checking_lengths(lengths: Iterable[int]) -> List[int]:
+    """
+    Validates the peptide lengths requested for a background.
+
+    :param lengths: The peptide lengths.
+    :return: The sorted, unique lengths.
+    :raises ValueError: If no length is given or a length is not supported.
+    """
+
+    lengths = sorted(set(int(length) for length in lengths))
+    if not lengths or any(length not in PEPTIDE_LENGTHS for length in lengths):
+        raise ValueError(f"CrossDome supports peptides of length {PEPTIDE_LENGTHS.start} to {PEPTIDE_LENGTHS.stop - 1}, got {lengths} instead.")
+    return lengths
+
+
+
+def _shared_indices(shared: List[Any], items: List[Any]) -> np.ndarray:
+    """
+    Appends objects to a list of shared objects, compared by identity.
+
+    :param shared: The shared objects, extended in place.
+    :param items: The objects to look up.
+    :return: The index of each item in the shared list.
+    """
+
+    indices = []
+    for item in items:
+        position = next((index for index, known in enumerate(shared) if known is item), None)
+        if position is None:
+            shared.append(item)
+            position = len(shared) - 1
+        indices.append(position)
+    return np.asarray(indices, dtype=np.int64)
+
+
+
+# Stack frames between the caller of xrResult.filter and the pandas query, so @variables are the caller's
+_CALLER_LEVEL:int = 1
 
 
 
@@ -34,8 +396,14 @@ class xrResult:
     """
     A class to represent the result of CrossDome peptide comparison.
 
+    Screening results are array-backed: scores and counts are kept as typed NumPy
+    arrays and subjects as row indices into the background, while z-scores,
+    p-values and percentile ranks are derived from per-query statistics. The
+    DataFrame is only built when `result` is first accessed, and select, filter
+    and mutate return views sharing the same arrays.
+
     Attributes:
-        query (str): The peptide target (9-mer).
+        query (str): The peptide target (8 to 11-mer), or the list of queries of a long-form result.
         result (pd.DataFrame): The DataFrame containing relatedness ranking data.
         allele (str): The MHC Class I allele.
         expression (dict): A dictionary for storing expression data.
@@ -44,17 +412,271 @@ class xrResult:
         timestamp (str): The timestamp of the execution.
     """
     
-    def __init__(self, query: str, result: pd.DataFrame, allele: str, position_weight: List[float]):
+    def __init__(self, query: str, result: pd.DataFrame = None, allele: str = None, position_weight: List[float] = None):
         self.query = query
-        self.result = result
         self.allele = allele
         self.expression = {}
         self.analysis = {}
         self.position_weight = position_weight
         self.timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # DataFrame (given, or built on demand) and the shared arrays of array-backed results
+        self._frame: Optional[pd.DataFrame] = result
+        self._store: Optional[Dict[str, Any]] = None
+        self._rows: Optional[np.ndarray] = None
+        self._columns: Optional[List[str]] = None
+        self._extra: Dict[str, np.ndarray] = {}
+    
+    @classmethod
+    def from_arrays(cls, query: str, background: xrBackground, scores: Dict[str, np.ndarray], ranks: np.ndarray,
+                    rows: np.ndarray = None, summary: Tuple[int, float, float] = None,
+                    position_weight: List[float] = None, null: Any = None) -> 'xrResult':
+        """
+        Builds an array-backed result for one query without materializing any string.
+        
+        :param query: The query peptide.
+        :param background: The background the subjects belong to.
+        :param scores: 'relatedness_score', 'num_positive' and 'num_negative' arrays, aligned with rows.
+        :param ranks: 1-based ranks of the reported rows.
+        :param rows: Background row of each reported subject, None when every row is reported in order.
+        :param summary: The (count, mean, std) of the background scores, None when not computed.
+        :param position_weight: The position weights used for scoring.
+        :param null: An empirical null (see crossdome.null) replacing the normal approximation
+                     for z-scores, p-values and percentile ranks (optional).
+        :return: A new xrResult object.
+        """
+        
+        if null is not None:
+            summary = (len(null), null.mean, null.std)
+        
+        index_dtype = np.int32 if len(background) < 2 ** 31 else np.int64
+        result = cls(query=query, allele=background.allele, position_weight=position_weight)
+        result._store = {
+            'queries': [query],
+            'backgrounds': [background],
+            'background_of_query': np.zeros(1, dtype=np.int64),
+            'nulls': [] if null is None else [null],
+            'null_of_query': np.full(1, -1 if null is None else 0, dtype=np.int64),
+            'stats': np.array([summary if summary is not None else (np.nan, np.nan, np.nan)], dtype=np.float64),
+            'size': len(scores['relatedness_score']),
+            'query_row': None,
+            'subject_row': None if rows is None else np.asarray(rows).astype(index_dtype, copy=False),
+            'relatedness_score': scores['relatedness_score'],
+            'num_positive': scores['num_positive'].astype(np.int8, copy=False),
+            'num_negative': scores['num_negative'].astype(np.int8, copy=False),
+            'rank': np.asarray(ranks).astype(index_dtype, copy=False)
+        }
+        return result
+    
+    @classmethod
+    def concat(cls, results: List['xrResult'], query: Any = None, allele: str = None,
+               position_weight: List[float] = None) -> 'xrResult':
+        """
+        Stacks results into one long-form result, keeping them array-backed when possible.
+        
+        :param results: The results to stack, in order.
+        :param query: The query attribute of the stacked result (defaults to the list of queries).
+        :param allele: The allele of the stacked result (defaults to the first result's).
+        :param position_weight: The position weights of the stacked result (defaults to the first result's).
+        :return: A new xrResult object.
+        """
+        
+        if query is None:
+            query = [result.query for result in results]
+        if results:
+            allele = allele if allele is not None else results[0].allele
+            position_weight = position_weight if position_weight is not None else results[0].position_weight
+        
+        if not results or any(result._store is None or result._extra or result._columns is not None for result in results):
+            frames = [result.result for result in results] or [pd.DataFrame(columns=RESULT_COLUMNS)]
+            return cls(query=query, result=pd.concat(frames, ignore_index=True), allele=allele, position_weight=position_weight)
+        
+        # Backgrounds and nulls are shared by identity, each query keeps a reference to its own
+        backgrounds: List[xrBackground] = []
+        nulls: List[Any] = []
+        queries, background_of_query, null_of_query, stats, query_rows = [], [], [], [], []
+        for result in results:
+            store = result._store
+            query_rows.append(result._query_rows(result._positions()) + len(queries))
+            queries.extend(store['queries'])
+            background_of_query.append(_shared_indices(backgrounds, store['backgrounds'])[store['background_of_query']])
+            # Queries without a null (-1) pick the appended -1
+            null_of_query.append(np.append(_shared_indices(nulls, store['nulls']), -1)[store['null_of_query']])
+            stats.append(store['stats'])
+        
+        stacked = cls(query=query, allele=allele, position_weight=position_weight)
+        stacked._store = {
+            'queries': queries,
+            'backgrounds': backgrounds,
+            'background_of_query': np.concatenate(background_of_query),
+            'nulls': nulls,
+            'null_of_query': np.concatenate(null_of_query),
+            'stats': np.concatenate(stats),
+            'size': sum(len(result) for result in results),
+            'query_row': np.concatenate(query_rows).astype(np.int32 if len(queries) < 2 ** 31 else np.int64),
+            'subject_row': np.concatenate([result._subject_rows(result._positions()) for result in results]),
+            **{name: np.concatenate([result._store[name][result._positions()] for result in results])
+               for name in ('relatedness_score', 'num_positive', 'num_negative', 'rank')}
+        }
+        return stacked
+    
+    def _view(self, rows: Optional[np.ndarray], columns: Optional[List[str]], extra: Dict[str, np.ndarray]) -> 'xrResult':
+        """Returns a result sharing this one's arrays, with a new row selection and columns, and copies of its metadata."""
+        
+        view = xrResult(query=self.query, allele=self.allele, position_weight=self.position_weight)
+        view.expression, view.analysis, view.timestamp = dict(self.expression), dict(self.analysis), self.timestamp
+        view._store, view._rows, view._columns, view._extra = self._store, rows, columns, extra
+        return view
+    
+    def _positions(self, start: int = None, stop: int = None) -> Union[slice, np.ndarray]:
+        """Positions in the shared arrays of the view rows start to stop (a slice when not filtered)."""
+        
+        if self._rows is None:
+            return slice(start, stop)
+        return self._rows[start:stop]
+    
+    def _query_rows(self, positions: Union[slice, np.ndarray]) -> np.ndarray:
+        """Index of the query of each row at the given positions."""
+        
+        if self._store['query_row'] is None:
+            count = len(range(self._store['size'])[positions]) if isinstance(positions, slice) else len(positions)
+            return np.zeros(count, dtype=np.int64)
+        return self._store['query_row'][positions]
+    
+    def _subject_rows(self, positions: Union[slice, np.ndarray]) -> np.ndarray:
+        """Background row of each subject at the given positions."""
+        
+        if self._store['subject_row'] is None:
+            return np.arange(self._store['size'])[positions]
+        return self._store['subject_row'][positions]
+    
+    def _compute(self, name: str, positions: Union[slice, np.ndarray]) -> np.ndarray:
+        """Computes one stored or derived column at the given positions."""
+        
+        store = self._store
+        if name in ('relatedness_score', 'num_positive', 'num_negative'):
+            return store[name][positions]
+        if name == 'rank':
+            return store['rank'][positions].astype(np.int64)
+        if name == 'query':
+            return np.asarray(store['queries'], dtype=object)[self._query_rows(positions)]
+        if name == 'subject':
+            return self._subjects(positions)
+        
+        query_rows = self._query_rows(positions)
+        stats = store['stats'][query_rows]
+        if name == 'zscore':
+            return (store['relatedness_score'][positions] - stats[:, 1]) / stats[:, 2]
+        if name == 'pvalue':
+            # The normal CDF (scipy.stats.norm.cdf), imported on first use as scipy is slow to import
+            from scipy.special import ndtr
+            values = ndtr(self._compute('zscore', positions))
+        elif name == 'percentile_rank':
+            total = stats[:, 0]
+            ranks = store['rank'][positions].astype(np.float64)
+            values = np.where(total < 2, 0.0, (ranks - 1) / np.maximum(total - 1, 1) * 100)
+        else:
+            raise KeyError(f"Column {name} not found in the result.")
+        
+        # Queries scored with an empirical null look their scores up in its sorted sample
+        owners = store['null_of_query'][query_rows]
+        if (owners >= 0).any():
+            scores = store['relatedness_score'][positions]
+            for owner in np.unique(owners[owners >= 0]):
+                selected = owners == owner
+                null = store['nulls'][owner]
+                values[selected] = null.pvalue(scores[selected]) if name == 'pvalue' else null.percentile(scores[selected])
+        return values
+    
+    def _subjects(self, positions: Union[slice, np.ndarray]) -> np.ndarray:
+        """Decodes the subject peptides at the given positions from their backgrounds."""
+        
+        store = self._store
+        rows = self._subject_rows(positions)
+        if len(store['backgrounds']) == 1:
+            background = store['backgrounds'][0]
+            if store['subject_row'] is None and isinstance(positions, slice) and positions == slice(None, None):
+                return np.asarray(background.peptides, dtype=object)
+            return np.asarray(background.take_peptides(rows), dtype=object)
+        
+        owners = store['background_of_query'][self._query_rows(positions)]
+        subjects = np.empty(len(rows), dtype=object)
+        for owner in np.unique(owners):
+            selected = owners == owner
+            subjects[selected] = store['backgrounds'][owner].take_peptides(rows[selected])
+        return subjects
+    
+    @property
+    def columns(self) -> List[str]:
+        """The column names of the result."""
+        
+        if self._store is None:
+            return list(self.result.columns)
+        if self._columns is not None:
+            return list(self._columns)
+        return RESULT_COLUMNS + [name for name in self._extra if name not in RESULT_COLUMNS]
+    
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns the values of one column without building the DataFrame.
+        
+        :param name: The column name.
+        :return: A NumPy array with one value per row.
+        """
+        
+        if self._store is None:
+            return self.result[name].to_numpy()
+        if name not in self.columns:
+            raise KeyError(f"Column {name} not found in the result.")
+        if name in self._extra:
+            return self._extra[name]
+        return self._compute(name, self._positions())
+    
+    def to_dataframe(self, columns: List[str] = None, start: int = None, stop: int = None) -> pd.DataFrame:
+        """
+        Builds a DataFrame of the result, or of a slice of its rows, without caching it.
+        
+        :param columns: The columns to include (defaults to all columns).
+        :param start: The first row to include (optional).
+        :param stop: The row to stop at (optional).
+        :return: A new pandas DataFrame.
+        """
+        
+        columns = self.columns if columns is None else list(columns)
+        if self._store is None:
+            return self.result.iloc[start:stop][columns]
+        
+        missing = [name for name in columns if name not in self.columns]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in the result.")
+        positions = self._positions(start, stop)
+        with stage('dataframe', len(range(len(self))[start:stop])):
+            data = {
+                name: self._extra[name][start:stop] if name in self._extra else self._compute(name, positions)
+                for name in columns
+            }
+            return pd.DataFrame(data, columns=columns)
+    
+    @property
+    def result(self) -> pd.DataFrame:
+        """The result DataFrame, built from the arrays on first access."""
+        
+        if self._frame is None:
+            self._frame = self.to_dataframe()
+        return self._frame
+    
+    @result.setter
+    def result(self, value: pd.DataFrame) -> None:
+        self._frame = value
+        self._store, self._rows, self._columns, self._extra = None, None, None, {}
+    
+    def __len__(self) -> int:
+        if self._store is None:
+            return len(self.result)
+        return self._store['size'] if self._rows is None else len(self._rows)
     
     def __repr__(self):
-        return f"xrResult(query={self.query}, rank_count={len(self.result)})"
+        return f"xrResult(query={self.query}, rank_count={len(self)})"
     
     def show(self):
         """Display the result DataFrame."""
@@ -75,29 +697,76 @@ class xrResult:
         :param columns: A list of column names to keep in  the result 
         :return: A new xrResult object with selected columns
         """
-        self.result = self.result[columns]
-        return self
+        
+        if self._store is None:
+            selected = xrResult(self.query, self.result[columns], self.allele, self.position_weight)
+            selected.expression, selected.analysis, selected.timestamp = dict(self.expression), dict(self.analysis), self.timestamp
+            return selected
+        
+        missing = [name for name in columns if name not in self.columns]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in the result.")
+        return self._view(self._rows, list(columns), self._extra)
     
     def filter (self, condition:Any) -> 'xrResult':
         """
         Filter the result DataFrame based on a condition.
         
-        :param condition: A boolean condition to filter rows 
+        :param condition: A boolean condition to filter rows: a DataFrame.query string over the
+                          column names (e.g. "num_negative <= 2 and zscore < @limit", local variables
+                          of the caller being referenced with @), a boolean mask, or a callable
+                          returning a mask from the result.
         :return: A new xrResult object with filtered rows.
         """
         
-        self.result = self.result.query(condition)
-        return self 
+        if self._store is None:
+            frame = self.result.query(condition, level=_CALLER_LEVEL) if isinstance(condition, str) else self.result[self._mask(condition)]
+            filtered = xrResult(self.query, frame, self.allele, self.position_weight)
+            filtered.expression, filtered.analysis, filtered.timestamp = dict(self.expression), dict(self.analysis), self.timestamp
+            return filtered
+        
+        selected = np.flatnonzero(self._mask(condition))
+        rows = selected if self._rows is None else self._rows[selected]
+        return self._view(rows, self._columns, {name: value[selected] for name, value in self._extra.items()})
+    
+    def _mask(self, condition:Any) -> np.ndarray:
+        """Evaluates a filter condition to a boolean mask over the rows, called from filter only."""
+        
+        if callable(condition):
+            condition = condition(self)
+        elif isinstance(condition, str):
+            # Only the columns named in the expression are computed, pandas parses it as DataFrame.query does
+            names = [name for name in self.columns if re.search(rf"(?<![\w@]){re.escape(name)}(?!\w)", condition)]
+            frame = pd.DataFrame({name: self.column(name) for name in names}, index=pd.RangeIndex(len(self)))
+            condition = frame.eval(condition, level=_CALLER_LEVEL + 1)
+        
+        mask = np.asarray(condition, dtype=bool)
+        if mask.shape != (len(self),):
+            raise ValueError(f"Filter condition must give one boolean per row ({len(self)}), got shape {mask.shape} instead.")
+        return mask
     
     def mutate (self, **kwargs) -> 'xrResult':
         """ 
         Add or modify columns in the result DataFrame 
         
         :param kwargs: Column names and their respective values to add/modify in the DataFrame
+                       (a scalar, one value per row, or a callable computing them from the result)
         :return: A new xrResult with mutated columns
         """
         
+        if self._store is None:
+            mutated = xrResult(self.query, self.result.assign(**kwargs), self.allele, self.position_weight)
+            mutated.expression, mutated.analysis, mutated.timestamp = dict(self.expression), dict(self.analysis), self.timestamp
+            return mutated
+        
+        extra = dict(self._extra)
         for key, value in kwargs.items():
-            self.result[key] = value 
-        return self
-        
\ No newline at end of file
+            value = np.asarray(value(self) if callable(value) else value)
+            if value.ndim == 0:
+                value = np.broadcast_to(value, (len(self),))
+            elif value.shape[0] != len(self):
+                raise ValueError(f"Column {key} must have one value per row ({len(self)}), got {value.shape[0]} instead.")
+            extra[key] = value
+        
+        columns = None if self._columns is None else self._columns + [key for key in kwargs if key not in self._columns]
+        return self._view(self._rows, columns, extra)
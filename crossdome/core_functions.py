@@ -1,34 +1,68 @@
 # Import needed libraries & packages
 import numpy as np 
-import pandas as pd
-from typing import List, Dict
-from scipy.stats import norm # for Z-scores & p-vals 
+from typing import Any, Iterable, List, Dict, Tuple, Union
 import datetime
 
 # Import class objects 
 from crossdome.core_classes import xrBackground, xrResult
+from crossdome.encoding import AMINO_ACIDS, PEPTIDE_LENGTHS, encode_peptides
+from crossdome.cache import ResultCache
+from crossdome.export import write_results
+from crossdome.profiling import profiling, stage
+from crossdome.substitution import Substitution, substitution_key, substitution_score_table
+
+# Mapping from each amino acid to a unique integer value
+_AA_TO_NUM:Dict[str, int] = {aa: i for i, aa in enumerate(AMINO_ACIDS)}
+
+# Number of query-subject pairs scored per block, bounds temporary memory
+_SCORING_BLOCK_SIZE:int = 1 << 20
 
 # Internal helper functions 
 def _internal_checking_peptide (peptide:str) -> List[str]:
     """
-    Checks if the peptide is a valid 9-mer and contains only standard amino acids 
+    Checks if the peptide has a supported length (8 to 11) and contains only standard amino acids 
     
     :param peptide: The peptide sequence 
     :return: Peptide split into a list of amino acids 
-    :raises ValueError: If the peptide is not a valid 9-mer or contains non-standard amino acids.
+    :raises ValueError: If the peptide length is not supported or it contains non-standard amino acids.
     """
     
-    if len(peptide) != 9:
-        raise ValueError(f"CrossDome currently only supports 9-mer peptides, got size {len(peptide)} instead.")
-    
-    # Define a @set containing the standard amino acids 
-    standard_amino_acids = set("ACDEFGHIKLMNPQRSTVWY")
+    if len(peptide) not in PEPTIDE_LENGTHS:
+        raise ValueError(f"CrossDome supports peptides of length {PEPTIDE_LENGTHS.start} to {PEPTIDE_LENGTHS.stop - 1}, "
+                         f"got size {len(peptide)} instead.")
     
-    if not all(residue in standard_amino_acids for residue in peptide):
+    if not all(residue in _AA_TO_NUM for residue in peptide):
         raise ValueError(f"Please check your input sequence {peptide}. Currently, only standard amino acids are supported.")
 
     return list(peptide) 
     
+def _internal_checking_weight (position_weight:List[float], length:int) -> List[float]:
+    """
+    Checks that position weights match the peptide length, defaulting to uniform weights.
+
+    :param position_weight: A list of position weights, or None.
+    :param length: The peptide length.
+    :return: The position weights.
+    :raises ValueError: If the number of weights differs from the peptide length.
+    """
+    
+    if not position_weight:
+        return [1.0] * length
+    if len(position_weight) != length:
+        raise ValueError(f"position_weight must have {length} values for {length}-mer queries, got {len(position_weight)} instead.")
+    return position_weight
+    
+def _internal_checking_selection (top_k:int = None) -> None:
+    """
+    Checks that a requested top_k selection is a positive integer.
+
+    :param top_k: The number of hits to keep, or None for no limit.
+    :raises ValueError: If top_k is not a positive integer.
+    """
+    
+    if top_k is not None and (int(top_k) != top_k or top_k < 1):
+        raise ValueError(f"top_k must be a positive integer, got {top_k} instead.")
+    
 def _amino_acid_to_numeric (peptide:List[str]) -> np.ndarray:
     """
     Converts a peptide (list of amino acids) to a numerical representation.
@@ -37,11 +71,8 @@ def _amino_acid_to_numeric (peptide:List[str]) -> np.ndarray:
     :return: A numpy array representing the numerical values of amino acids.
     """
     
-    # Create a mapping from each amino acid to a unique integer value
-    aa_to_num = {aa: i for i, aa in enumerate("ACDEFGHIKLMNPQRSTVWY")}
-    
     # Convert peptide sequence to corresponding numeric values
-    return np.array([aa_to_num[residue] for residue in peptide])
+    return np.array([_AA_TO_NUM[residue] for residue in peptide])
 
 
 
@@ -68,23 +99,382 @@ def _internal_related_distance (query_components:List[str], subject_components:L
         relatedness_score = relatedness_score * np.sqrt(position_weight)
 
     # Normalize the score by the maximum possible distance (assuming the max difference for each position)
-    max_possible_distance = np.sqrt(len(query_components) * (len(set("ACDEFGHIKLMNPQRSTVWY")) - 1) ** 2)
+    max_possible_distance = np.sqrt(len(query_components) * (len(AMINO_ACIDS) - 1) ** 2)
     relatedness_score = np.sum(relatedness_score) / max_possible_distance
     
     return relatedness_score
 
 
 
-def _internal_percentile_rank (scores:List[float]) -> List[float]:
+def _internal_score_lookup (position_weight:List[float] = None, length:int = 9) -> np.ndarray:
+    """
+    Precomputes the relatedness score for every possible squared residue distance.
+
+    Squared distances between two encoded peptides are small integers, so the
+    per-pair arithmetic of _internal_related_distance is applied once to each of
+    them and scoring becomes a table gather. Values are identical to the per-pair path.
+
+    :param position_weight: Weights for each position in the peptide.
+    :param length: The peptide length.
+    :return: An array mapping squared distance to normalized relatedness score.
+    """
+
+    relatedness_score = np.sqrt(np.arange(length * (len(AMINO_ACIDS) - 1) ** 2 + 1))
+
+    if position_weight is not None:
+        relatedness_score = np.sum(relatedness_score[:, None] * np.sqrt(position_weight), axis=1)
+
+    return relatedness_score / np.sqrt(length * (len(AMINO_ACIDS) - 1) ** 2)
+
+
+
+def _internal_pairwise_block (query_numeric:np.ndarray, subject_columns:np.ndarray, substitution_table:np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    Computes squared distances and positional matches for a block of queries and subjects.
+
+    With a substitution table the block is scored directly by gathering, for each
+    position, the precomputed cost of every query residue against every subject residue.
+
+    :param query_numeric: Encoded query peptides, shape (Q, L).
+    :param subject_columns: Encoded subject peptides stored column-wise, shape (L, N).
+    :param substitution_table: Optional (L, 20, 20) weighted substitution cost table.
+    :return: A dictionary with (Q, N) 'squared_distance' (int16) or 'relatedness_score' (float64),
+             and 'num_positive' (int8) arrays.
+    """
+
+    query_numeric = query_numeric.astype(np.int16)
+    shape = (query_numeric.shape[0], subject_columns.shape[1])
+    num_positive = np.zeros(shape, dtype=np.int8)
+
+    if substitution_table is not None:
+        # Row q of query_costs[:, position] holds the costs of query residue q against all 20 residues
+        query_costs = substitution_table[np.arange(subject_columns.shape[0])[None, :], query_numeric]
+        relatedness_score = np.zeros(shape, dtype=np.float64)
+        for position in range(subject_columns.shape[0]):
+            relatedness_score += query_costs[:, position][:, subject_columns[position]]
+            num_positive += subject_columns[position][None, :] == query_numeric[:, position][:, None]
+        return {'relatedness_score': relatedness_score, 'num_positive': num_positive}
+
+    squared_distance = np.zeros(shape, dtype=np.int16)
+
+    # One broadcast pass per position keeps temporaries at (Q, N) instead of (Q, N, L)
+    for position in range(subject_columns.shape[0]):
+        difference = subject_columns[position][None, :] - query_numeric[:, position][:, None]
+        squared_distance += difference * difference
+        num_positive += (difference == 0)
+
+    return {'squared_distance': squared_distance, 'num_positive': num_positive}
+
+
+
+def _internal_score_background (query_numeric:np.ndarray, subject_numeric:np.ndarray, position_weight:List[float] = None,
+                                block_size:int = _SCORING_BLOCK_SIZE, substitution_table:np.ndarray = None) -> Dict[str, np.ndarray]:
+    """
+    Scores encoded queries against an encoded background in memory bounded blocks.
+
+    :param query_numeric: Encoded query peptides, shape (Q, L).
+    :param subject_numeric: Encoded background peptides, shape (N, L).
+    :param position_weight: Weights for each position in the peptide.
+    :param block_size: Maximum number of query-subject pairs held in temporaries at once.
+    :param substitution_table: Optional (L, 20, 20) table replacing the residue index distance.
+    :return: A dictionary with (Q, N) 'relatedness_score', 'num_positive' and 'num_negative' arrays.
+    """
+
+    query_numeric = np.atleast_2d(query_numeric)
+    queries, length = query_numeric.shape
+    size = subject_numeric.shape[0]
+    lookup = _internal_score_lookup(position_weight, length)
+
+    relatedness_score = np.empty((queries, size), dtype=np.float64)
+    num_positive = np.empty((queries, size), dtype=np.int8)
+
+    # Split the pair budget between subjects and queries
+    subject_step = max(1, min(size, block_size))
+    query_step = max(1, block_size // subject_step)
+
+    for subject_start in range(0, size, subject_step):
+        subject_stop = min(size, subject_start + subject_step)
+        subject_columns = np.ascontiguousarray(subject_numeric[subject_start:subject_stop].T, dtype=np.int16)
+
+        for query_start in range(0, queries, query_step):
+            query_stop = min(queries, query_start + query_step)
+            block = _internal_pairwise_block(query_numeric[query_start:query_stop], subject_columns, substitution_table)
+            if substitution_table is None:
+                block['relatedness_score'] = lookup[block['squared_distance']]
+            relatedness_score[query_start:query_stop, subject_start:subject_stop] = block['relatedness_score']
+            num_positive[query_start:query_stop, subject_start:subject_stop] = block['num_positive']
+
+    return {
+        'relatedness_score': relatedness_score,
+        'num_positive': num_positive,
+        'num_negative': (length - num_positive).astype(np.int8)
+    }
+
+
+
+def _internal_aligned_positions (query_length:int, subject_length:int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs the positions of peptides of different lengths.
+
+    Class I ligands of different lengths share their N-terminal and C-terminal
+    anchors and bulge out in the middle, so the first half of the shorter peptide
+    is aligned to the N-terminus and the rest to the C-terminus of the longer one.
+
+    :param query_length: The query peptide length.
+    :param subject_length: The subject peptide length.
+    :return: The compared query positions and the matching subject positions.
+    """
+
+    width = min(query_length, subject_length)
+    head = width // 2
+    tail = width - head
+    query_positions = np.concatenate([np.arange(head), np.arange(query_length - tail, query_length)])
+    subject_positions = np.concatenate([np.arange(head), np.arange(subject_length - tail, subject_length)])
+    return query_positions, subject_positions
+
+
+
+def _internal_score_aligned (query_numeric:np.ndarray, background:xrBackground, position_weight:List[float],
+                             block_size:int = _SCORING_BLOCK_SIZE, substitution:Substitution = None) -> Dict[str, np.ndarray]:
+    """
+    Scores encoded queries against every length bucket of a background.
+
+    Each bucket is compared on the anchor-aligned positions (see _internal_aligned_positions),
+    the score being normalized by the number of compared positions. Columns follow the
+    background peptides order.
+
+    :param query_numeric: Encoded query peptides of a single length, shape (Q, L).
+    :param background: The background to score against.
+    :param position_weight: Weights for each query position.
+    :param block_size: Maximum number of query-subject pairs held in temporaries at once.
+    :param substitution: A substitution scheme used for scoring (optional).
+    :return: A dictionary with (Q, N) 'relatedness_score', 'num_positive' and 'num_negative' arrays.
+    """
+
+    position_weight = np.asarray(position_weight, dtype=np.float64)
+    parts = []
+    for length, encoded in background.buckets.items():
+        query_positions, subject_positions = _internal_aligned_positions(query_numeric.shape[1], length)
+        weights = position_weight[query_positions].tolist()
+        substitution_table = None if substitution is None else substitution_score_table(substitution, weights, len(weights))
+        subjects = encoded if length == query_numeric.shape[1] else encoded[:, subject_positions]
+        parts.append(_internal_score_background(query_numeric[:, query_positions], subjects, weights,
+                                                block_size=block_size, substitution_table=substitution_table))
+    return {key: np.concatenate([part[key] for part in parts], axis=1) for key in parts[0]}
+
+
+
+def _internal_rank (scores:np.ndarray, subset:np.ndarray = None) -> np.ndarray:
+    """
+    Calculates 1-based ranks of scores in ascending order, ties broken by position.
+
+    When a subset is given only its ranks are computed, sorting just the scores
+    that are not larger than the worst score in the subset.
+
+    :param scores: Relatedness scores of the whole background.
+    :param subset: Optional sorted indices of the scores to rank.
+    :return: An array of ranks, aligned with scores or with subset.
+    """
+    
+    if subset is None:
+        ranks = np.empty(len(scores), dtype=np.int64)
+        ranks[np.argsort(scores, kind='stable')] = np.arange(1, len(scores) + 1)
+        return ranks
+    
+    if len(subset) == 0:
+        return np.empty(0, dtype=np.int64)
+    
+    below = np.flatnonzero(scores <= scores[subset].max())
+    positions = np.empty(len(below), dtype=np.int64)
+    positions[np.argsort(scores[below], kind='stable')] = np.arange(1, len(below) + 1)
+    return positions[np.searchsorted(below, subset)]
+
+
+
+def _internal_select_hits (scores:Dict[str, np.ndarray], top_k:int = None, max_score:float = None, max_mismatches:int = None) -> np.ndarray:
+    """
+    Selects the background rows to report, ordered by relatedness score.
+
+    Threshold filters are applied first, then the top_k best remaining rows are
+    picked with a partial selection so the cost scales with k rather than N log N.
+
+    :param scores: 1-D 'relatedness_score' and 'num_negative' arrays for the whole background.
+    :param top_k: Keep at most this many of the best scoring peptides.
+    :param max_score: Keep peptides with a relatedness score at or below this value.
+    :param max_mismatches: Keep peptides with at most this many mismatches.
+    :return: Indices of the selected rows, best score first.
     """
-    Calculates the percentile rank of each score.
+    
+    relatedness_score = scores['relatedness_score']
+    
+    mask = None
+    if max_score is not None:
+        mask = relatedness_score <= max_score
+    if max_mismatches is not None:
+        within = scores['num_negative'] <= max_mismatches
+        mask = within if mask is None else mask & within
+    candidates = np.arange(len(relatedness_score)) if mask is None else np.flatnonzero(mask)
+    
+    if top_k is not None and top_k < len(candidates):
+        candidate_scores = relatedness_score[candidates]
+        threshold = np.partition(candidate_scores, top_k - 1)[top_k - 1]
+        
+        # Break ties at the boundary by position so the selection is deterministic
+        better = np.flatnonzero(candidate_scores < threshold)
+        tied = np.flatnonzero(candidate_scores == threshold)[:top_k - len(better)]
+        candidates = candidates[np.sort(np.concatenate([better, tied]))]
+    
+    return candidates[np.argsort(relatedness_score[candidates], kind='stable')]
+
 
-    :param scores: A list of scores.
-    :return: A list of percentile ranks for each score.
+
+def _internal_score_summary (scores:np.ndarray) -> Tuple[int, float, float]:
+    """
+    Computes the sufficient statistics of a score array.
+
+    :param scores: Relatedness scores.
+    :return: A (count, mean, M2) tuple, M2 being the sum of squared deviations from the mean.
     """
     
-    ranks:List = [(rank / (len(scores) - 1)) * 100 for rank in range(len(scores))]
-    return ranks  
+    if len(scores) == 0:
+        return (0, 0.0, 0.0)
+    mean = float(scores.mean())
+    deviation = scores - mean
+    return (len(scores), mean, float(np.dot(deviation, deviation)))
+
+
+
+def _internal_merge_summary (left:Tuple[int, float, float], right:Tuple[int, float, float]) -> Tuple[int, float, float]:
+    """
+    Merges two (count, mean, M2) summaries with the pairwise update of Chan et al.
+
+    :param left: Summary of the first group of scores.
+    :param right: Summary of the second group of scores.
+    :return: The summary of both groups combined.
+    """
+    
+    count = left[0] + right[0]
+    if left[0] == 0 or right[0] == 0:
+        return left if right[0] == 0 else right
+    
+    delta = right[1] - left[1]
+    mean = left[1] + delta * right[0] / count
+    m2 = left[2] + right[2] + delta * delta * left[0] * right[0] / count
+    return (count, mean, m2)
+
+
+
+def _internal_remove_summary (total:Tuple[int, float, float], part:Tuple[int, float, float]) -> Tuple[int, float, float]:
+    """
+    Takes a group of scores out of a (count, mean, M2) summary, the inverse of _internal_merge_summary.
+
+    :param total: Summary of all scores.
+    :param part: Summary of the scores to take out, a subset of them.
+    :return: The summary of the remaining scores.
+    """
+    
+    count = total[0] - part[0]
+    if count <= 0:
+        return (0, 0.0, 0.0)
+    if part[0] == 0:
+        return total
+    
+    mean = (total[0] * total[1] - part[0] * part[1]) / count
+    delta = part[1] - mean
+    m2 = total[2] - part[2] - delta * delta * count * part[0] / total[0]
+    return (count, mean, max(m2, 0.0))
+
+
+
+def _internal_resolve_null (null:Any, background:xrBackground, length:int, position_weight:List[float],
+                            substitution:Substitution = None) -> Any:
+    """
+    Resolves the null option of the compose functions.
+
+    :param null: 'normal', 'empirical' or an EmpiricalNull.
+    :param background: The background the queries are scored against.
+    :param length: The query length.
+    :param position_weight: The position weights used for scoring.
+    :param substitution: The substitution scheme used for scoring.
+    :return: None for the normal approximation, or the EmpiricalNull to use.
+    :raises ValueError: If the option is unknown.
+    """
+
+    if null is None or (isinstance(null, str) and null == 'normal'):
+        return None
+    if isinstance(null, str) and null == 'empirical':
+        # Imported here, the null module builds on this one
+        from crossdome.null import empirical_null
+        return empirical_null(background, length=length, position_weight=position_weight, substitution=substitution)
+    if isinstance(null, str):
+        raise ValueError(f"null must be 'normal', 'empirical' or an EmpiricalNull, got {null} instead.")
+    return null
+
+
+
+def _internal_null_summary (null:Any) -> Dict[str, Any]:
+    """Describes an empirical null for result.analysis['score_summary'] (None without one)."""
+
+    if null is None:
+        return None
+    return {'count': len(null), 'mean': float(null.mean), 'std': float(null.std), 'null': 'empirical'}
+
+
+
+def _internal_build_result (query:str, background:xrBackground, scores:Dict[str, np.ndarray], position_weight:List[float],
+                            top_k:int = None, max_score:float = None, max_mismatches:int = None,
+                            rows:np.ndarray = None, ranks:np.ndarray = None, summary:Tuple[int, float, float] = None,
+                            null:Any = None) -> xrResult:
+    """
+    Assembles the result DataFrame and summary statistics for one query.
+
+    Z-scores, p-values and ranks are always computed against the full background,
+    while the DataFrame only holds the selected rows when a selection is requested.
+    With an empirical null, z-scores, p-values and percentile ranks refer to it instead
+    and no background-wide summary is computed.
+
+    :param query: The query peptide.
+    :param background: The background the scores were computed against.
+    :param scores: 1-D 'relatedness_score', 'num_positive' and 'num_negative' arrays.
+    :param position_weight: The position weights used for scoring.
+    :param top_k: Keep at most this many of the best scoring peptides.
+    :param max_score: Keep peptides with a relatedness score at or below this value.
+    :param max_mismatches: Keep peptides with at most this many mismatches.
+    :param rows: Precomputed selected rows, best score first (used when merging shards).
+    :param ranks: Precomputed ranks of the selected rows (used when merging shards).
+    :param summary: Precomputed background (count, mean, M2) summary (used when merging shards).
+    :param null: An EmpiricalNull used for the statistics (optional).
+    :return: An xrResult object with comparison results.
+    """
+
+    relatedness_score = scores['relatedness_score']
+    total = len(relatedness_score)
+
+    with stage('statistics', total):
+        # Background-wide statistics, std uses the sample estimator like pandas
+        if null is not None:
+            mean, std = null.mean, null.std
+        else:
+            if summary is None:
+                summary = _internal_score_summary(relatedness_score)
+            mean = summary[1] if total else np.nan
+            std = np.sqrt(summary[2] / (total - 1)) if total > 1 else np.nan
+
+        if rows is None and top_k is None and max_score is None and max_mismatches is None:
+            ranks = _internal_rank(relatedness_score)
+            scores = {key: np.array(value) for key, value in scores.items()}
+        else:
+            if rows is None:
+                rows = _internal_select_hits(scores, top_k=top_k, max_score=max_score, max_mismatches=max_mismatches)
+            if ranks is None:
+                ranks = _internal_rank(relatedness_score, np.sort(rows))[np.argsort(np.argsort(rows))]
+            scores = {key: value[rows] for key, value in scores.items()}
+
+    # Keep typed arrays, subjects and derived statistics are only materialized on demand
+    result = xrResult.from_arrays(query, background, scores, ranks, rows=rows, summary=(total, mean, std),
+                                  position_weight=position_weight, null=null)
+    result.analysis['score_summary'] = _internal_null_summary(null) or {'count': total, 'mean': float(mean), 'std': float(std)}
+    return result
 
 
 
@@ -102,58 +492,326 @@ def _internal_matrix_correlation (query_components:np.ndarray, subject_component
 
 
 
-def cross_compose (query:str, background:xrBackground, position_weight:List[float] = None) -> xrResult:
+def _internal_compose_prefiltered (query:str, background:xrBackground, index:Any, position_weight:List[float],
+                                   top_k:int = None, max_score:float = None, max_mismatches:int = None,
+                                   substitution_table:np.ndarray = None, null:Any = None,
+                                   summary:Tuple[int, float, float] = None) -> xrResult:
+    """
+    Scores only the background peptides returned by a mismatch index search.
+
+    :param query: The validated query peptide.
+    :param background: The indexed background.
+    :param index: A SegmentIndex built on the background.
+    :param position_weight: The position weights used for scoring.
+    :param top_k: Report at most this many of the most related hits.
+    :param max_score: Report hits with a relatedness score at or below this value.
+    :param max_mismatches: The mismatch radius of the search (required).
+    :param substitution_table: Optional weighted substitution cost table.
+    :param null: An EmpiricalNull providing z-scores, p-values and percentile ranks (optional).
+    :param summary: The background (count, mean, M2) summary of the query's scores, giving z-scores
+                    and p-values against the full background (optional, see crossdome.null.ScoreSummaries).
+    :return: An xrResult with the hits, best score first.
+    :raises ValueError: If max_mismatches is missing or the index belongs to another background.
+    """
+
+    if max_mismatches is None:
+        raise ValueError("A mismatch index can only be used together with max_mismatches.")
+    if index.background is not background:
+        raise ValueError("The mismatch index was built on a different background.")
+
+    query_numeric = _amino_acid_to_numeric(list(query))
+    with stage('index_search', len(background)):
+        candidates, _ = index.search(query_numeric, max_mismatches)
+    with stage('scoring', len(candidates)):
+        scores = {key: value[0] for key, value in _internal_score_background(query_numeric, background.encoded[candidates], position_weight,
+                                                                                              substitution_table=substitution_table).items()}
+    with stage('statistics', len(candidates)):
+        selected = _internal_select_hits(scores, top_k=top_k, max_score=max_score)
+
+    statistics = None
+    if summary is not None:
+        # Background-wide statistics, std uses the sample estimator like pandas
+        total = summary[0]
+        statistics = (total, summary[1] if total else np.nan, np.sqrt(summary[2] / (total - 1)) if total > 1 else np.nan)
+    result = xrResult.from_arrays(query, background, {key: value[selected] for key, value in scores.items()},
+                                  np.arange(1, len(selected) + 1), rows=candidates[selected], summary=statistics,
+                                  position_weight=position_weight, null=null)
+    result.analysis['score_summary'] = _internal_null_summary(null) or (
+        None if statistics is None else {'count': statistics[0], 'mean': float(statistics[1]), 'std': float(statistics[2])})
+    return result
+
+
+
+def cross_compose (query:str, background:xrBackground, position_weight:List[float] = None,
+                   top_k:int = None, max_score:float = None, max_mismatches:int = None, workers:int = None,
+                   index:Any = None, substitution:Substitution = None, align:bool = False, null:Any = 'normal',
+                   cache:ResultCache = None, profile:Any = None, summaries:Any = None) -> xrResult:
     """
     This function compares a query peptide to a background set of peptides
     and returns an xrResult object containing relatedness scores.
 
-    :param query: The query peptide (must be a 9-mer).
+    By default every background peptide is reported in background order. With
+    top_k, max_score or max_mismatches only the matching hits are reported,
+    best score first; statistics and ranks still refer to the full background.
+
+    The query is scored against the background peptides of its own length. With
+    align, it is scored against every length bucket instead, peptides of other
+    lengths being compared on their anchor-aligned positions.
+
+    Passing a SegmentIndex (see crossdome.index) together with max_mismatches
+    pre-filters the background in sub-linear time and scores only the hits.
+    Background-wide statistics are then not computed: zscore, pvalue and
+    percentile_rank are NaN (unless an empirical null is used) and rank is the
+    rank among the reported hits. Passing ScoreSummaries (see crossdome.null),
+    kept current as the background grows, gives zscore and pvalue against the
+    full background again, percentile_rank then being a lower bound.
+
+    By default p-values come from a normal approximation of the query's scores
+    against the background. With null='empirical' they are looked up in a cached,
+    sorted sample of scores between random background peptides (see crossdome.null),
+    which needs no pass over the background and suits skewed score distributions.
+
+    With a ResultCache (see crossdome.cache), results already computed for the same
+    query, background content, weights and options are returned without scoring.
+
+    With profile=True (or a crossdome.profiling.Profiler) the wall time, item count
+    and, optionally, peak allocations of each stage are stored in
+    result.analysis['profile'].
+
+    The default relatedness score is the distance between alphabetical residue
+    indices. With substitution (e.g. 'blosum62' or a 20x20 matrix, see
+    crossdome.substitution) it is a weighted substitution-matrix distance instead.
+
+    :param query: The query peptide (8 to 11 residues).
     :param background: An xrBackground object containing peptides to compare against.
-    :param position_weight: A list of position weights (optional).
+    :param position_weight: A list of position weights, one per query residue (optional).
+    :param top_k: Report at most this many of the most related peptides (optional).
+    :param max_score: Report peptides with a relatedness score at or below this value (optional).
+    :param max_mismatches: Report peptides with at most this many mismatches (optional).
+    :param workers: Score the background across this many processes (optional, see crossdome.parallel).
+    :param index: A SegmentIndex over the query length bucket used as a mismatch pre-filter (optional).
+    :param substitution: A substitution scheme used for scoring (optional).
+    :param align: Also score peptides of other lengths, aligned on their anchors (optional).
+    :param null: 'normal', 'empirical' or an EmpiricalNull, the null distribution of the statistics (optional).
+    :param cache: A ResultCache memoizing results (optional).
+    :param profile: True or a Profiler to record the time spent in each stage (optional).
+    :param summaries: ScoreSummaries of the background, giving the statistics of an index search (optional).
     :return: An xrResult object with comparison results.
     """
 
+    if profile:
+        with profiling(profile) as profiler:
+            result = cross_compose(query, background, position_weight=position_weight, top_k=top_k, max_score=max_score,
+                                   max_mismatches=max_mismatches, workers=workers, index=index, substitution=substitution,
+                                   align=align, null=null, cache=cache, summaries=summaries)
+        result.analysis['profile'] = profiler.report()
+        return result
+
     # Validate the query peptide
-    query_peptide = _internal_checking_peptide(query)
+    with stage('validation', 1):
+        query_peptide = _internal_checking_peptide(query)
+        _internal_checking_selection(top_k)
+        if align and index is not None:
+            raise ValueError("A mismatch index covers a single length bucket and cannot be combined with align.")
+        if summaries is not None and index is None:
+            raise ValueError("Score summaries give the statistics of a mismatch index search, pass them together with index.")
+
+    if index is None and (align or cache is not None or (workers is not None and workers > 1)):
+        return cross_compose_many([query], background, position_weight=position_weight, top_k=top_k, max_score=max_score,
+                                  max_mismatches=max_mismatches, workers=workers, substitution=substitution, align=align,
+                                  null=null, cache=cache)[0]
 
     # Use default position weights if none provided
-    position_weight = position_weight or [1.0] * 9
+    with stage('validation', 1):
+        position_weight = _internal_checking_weight(position_weight, len(query))
+        substitution_table = None if substitution is None else substitution_score_table(substitution, position_weight, len(query))
+        subjects = background.bucket(len(query))
+    with stage('null', 1):
+        null = _internal_resolve_null(null, subjects, len(query), position_weight, substitution)
+
+    if index is not None:
+        summary = None
+        if summaries is not None:
+            if null is not None:
+                raise ValueError("Score summaries only apply to the normal null.")
+            if summaries.background is not background and summaries.background is not subjects:
+                raise ValueError("The score summaries were built on a different background.")
+            if list(_internal_checking_weight(summaries.position_weight, len(query))) != list(position_weight) or \
+                    substitution_key(summaries.substitution) != substitution_key(substitution):
+                raise ValueError("The score summaries were built with different position weights or substitution scheme.")
+            with stage('statistics', 1):
+                summary = summaries.summary(query)
+
+        key = None if cache is None else cache.key(query, subjects, position_weight, top_k=top_k, max_score=max_score,
+                                                   max_mismatches=max_mismatches, substitution=substitution, null=null, index=True,
+                                                   summaries=summary is not None)
+        result = None if cache is None else cache.get(key, subjects, null)
+        if result is None:
+            result = _internal_compose_prefiltered(query, subjects, index, position_weight, top_k=top_k, max_score=max_score,
+                                                   max_mismatches=max_mismatches, substitution_table=substitution_table, null=null,
+                                                   summary=summary)
+            if cache is not None:
+                cache.put(key, result)
+        return result
+
+    # Score every background peptide at once against its pre-encoded residue matrix
+    with stage('encoding', 1):
+        query_numeric = _amino_acid_to_numeric(query_peptide)
+    with stage('scoring', len(subjects)):
+        scores = _internal_score_background(query_numeric, subjects.encoded, position_weight, substitution_table=substitution_table)
+
+    return _internal_build_result(query, subjects, {key: value[0] for key, value in scores.items()}, position_weight,
+                                  top_k=top_k, max_score=max_score, max_mismatches=max_mismatches, null=null)
+
+
+
+def cross_compose_many (queries:List[str], background:xrBackground, position_weight:List[float] = None,
+                        block_size:int = _SCORING_BLOCK_SIZE, long_form:bool = False,
+                        top_k:int = None, max_score:float = None, max_mismatches:int = None,
+                        workers:int = None, substitution:Substitution = None, align:bool = False,
+                        null:Any = 'normal', cache:ResultCache = None, profile:Any = None) -> Union[List[xrResult], xrResult]:
+    """
+    Compares many query peptides to the same background in one batched pass.
 
-    # Store results
-    results: List[Dict[str, float]] = []
+    The query-by-background score matrix is computed in blocks of at most
+    block_size pairs, so throughput is driven by array operations rather than
+    per-pair Python overhead. Queries are processed in groups so that only the
+    selected hits of finished queries are kept in memory.
 
-    # Iterate through each peptide in the background
-    for element in background.peptides:
-        # Validate the background peptide
-        background_peptide = _internal_checking_peptide(element)
+    Queries of different lengths are batched per length, each against its own
+    length bucket (or every bucket with align, see cross_compose).
 
-        # Calculate relatedness score
-        score = _internal_related_distance(np.array(query_peptide), np.array(background_peptide), position_weight)
+    :param queries: A list of query peptides (8 to 11 residues).
+    :param background: An xrBackground object containing peptides to compare against.
+    :param position_weight: A list of position weights, one per query residue (optional).
+    :param block_size: Maximum number of query-subject pairs scored per block.
+    :param long_form: Return a single xrResult with all queries stacked instead of one per query.
+    :param top_k: Report at most this many of the most related peptides per query (optional).
+    :param max_score: Report peptides with a relatedness score at or below this value (optional).
+    :param max_mismatches: Report peptides with at most this many mismatches (optional).
+    :param workers: Shard the background across this many processes (optional, see crossdome.parallel).
+    :param substitution: A substitution scheme used for scoring (optional, see crossdome.substitution).
+    :param align: Also score peptides of other lengths, aligned on their anchors (optional).
+    :param null: 'normal', 'empirical' or an EmpiricalNull, see cross_compose (optional).
+    :param cache: A ResultCache, only the queries it misses are scored (optional).
+    :param profile: True or a Profiler, the stage breakdown of the whole batch is stored in
+                    the analysis['profile'] of every result (optional, see cross_compose).
+    :return: A list of xrResult objects in query order, or one long-form xrResult.
+    """
 
-        # Count positive matches and mismatches
-        num_positive = sum(q == c for q, c in zip(query, element))
-        num_negative = 9 - num_positive
+    if profile:
+        with profiling(profile) as profiler:
+            results = cross_compose_many(queries, background, position_weight=position_weight, block_size=block_size,
+                                         long_form=long_form, top_k=top_k, max_score=max_score, max_mismatches=max_mismatches,
+                                         workers=workers, substitution=substitution, align=align, null=null, cache=cache)
+        report = profiler.report()
+        for result in ([results] if long_form else results):
+            result.analysis['profile'] = report
+        return results
+
+    queries = list(queries)
+    lengths = sorted(set(map(len, queries)))
+
+    if len(lengths) > 1:
+        # One batch per query length, results are put back in query order
+        results: List[xrResult] = [None] * len(queries)
+        for length in lengths:
+            members = [position for position, query in enumerate(queries) if len(query) == length]
+            batch = cross_compose_many([queries[position] for position in members], background, position_weight=position_weight,
+                                       block_size=block_size, top_k=top_k, max_score=max_score, max_mismatches=max_mismatches,
+                                       workers=workers, substitution=substitution, align=align, null=null, cache=cache)
+            for position, result in zip(members, batch):
+                results[position] = result
+    else:
+        results = _internal_compose_batch(queries, background, position_weight=position_weight, block_size=block_size,
+                                          top_k=top_k, max_score=max_score, max_mismatches=max_mismatches,
+                                          workers=workers, substitution=substitution, align=align, null=null, cache=cache)
+
+    if not long_form:
+        return results
+
+    return xrResult.concat(results, query=queries, allele=background.allele,
+                           position_weight=results[0].position_weight if results and len(lengths) == 1 else position_weight)
+
+
+
+def _internal_compose_batch (queries:List[str], background:xrBackground, position_weight:List[float] = None,
+                             block_size:int = _SCORING_BLOCK_SIZE, top_k:int = None, max_score:float = None,
+                             max_mismatches:int = None, workers:int = None, substitution:Substitution = None,
+                             align:bool = False, null:Any = 'normal', cache:ResultCache = None) -> List[xrResult]:
+    """
+    Compares queries of a single length to the background, see cross_compose_many.
 
-        # Add results
-        results.append({
-            'query': query,
-            'subject': element,
-            'relatedness_score': score,
-            'num_positive': num_positive,
-            'num_negative': num_negative
-        })
+    :return: A list of xrResult objects in query order.
+    """
 
-    # Convert results to pandas DataFrame
-    result_dataframe = pd.DataFrame(results)
+    length = len(queries[0]) if queries else background.lengths[0]
 
-    # Calculate Z-scores, p-values, percentile ranks, and ranks
-    result_dataframe['zscore'] = (result_dataframe['relatedness_score'] - result_dataframe['relatedness_score'].mean()) / result_dataframe['relatedness_score'].std()
-    result_dataframe['pvalue'] = norm.cdf(result_dataframe['zscore'])
-    result_dataframe['percentile_rank'] = _internal_percentile_rank(result_dataframe['relatedness_score'].tolist())
-    result_dataframe['rank'] = result_dataframe.index + 1
+    # Validate all queries in one pass
+    with stage('encoding', len(queries)):
+        if length not in PEPTIDE_LENGTHS:
+            raise ValueError(f"CrossDome supports peptides of length {PEPTIDE_LENGTHS.start} to {PEPTIDE_LENGTHS.stop - 1}, "
+                             f"got size {length} instead.")
+        query_numeric = encode_peptides(queries, length=length)
 
-    # Return xrResult object
-    return xrResult(query=query, result=result_dataframe, allele=background.allele, position_weight=position_weight)
+    # Use default position weights if none provided
+    with stage('validation', len(queries)):
+        _internal_checking_selection(top_k)
+        position_weight = _internal_checking_weight(position_weight, length)
+
+    if align:
+        if workers is not None and workers > 1:
+            raise ValueError("Aligned scoring across peptide lengths does not support workers.")
+        if null is not None and not (isinstance(null, str) and null == 'normal'):
+            raise ValueError("Aligned scoring across peptide lengths only supports the normal null.")
+        subjects = background
+    else:
+        subjects = background.bucket(length)
+    with stage('null', 1):
+        null = None if align else _internal_resolve_null(null, subjects, length, position_weight, substitution)
+
+    if cache is not None:
+        # Only the queries missing from the cache are scored
+        with stage('cache', len(queries)):
+            keys = [cache.key(query, subjects, position_weight, top_k=top_k, max_score=max_score, max_mismatches=max_mismatches,
+                              substitution=substitution, align=align, null=null) for query in queries]
+            results = [cache.get(key, subjects, null) for key in keys]
+        missing = [position for position, result in enumerate(results) if result is None]
+        if missing:
+            scored = _internal_compose_batch([queries[position] for position in missing], background, position_weight=position_weight,
+                                             block_size=block_size, top_k=top_k, max_score=max_score, max_mismatches=max_mismatches,
+                                             workers=workers, substitution=substitution, align=align, null=null)
+            for position, result in zip(missing, scored):
+                cache.put(keys[position], result)
+                results[position] = result
+        return results
+
+    if workers is not None and workers > 1:
+        # Imported here, the parallel module builds on this one
+        from crossdome.parallel import ScreeningPool
+        with ScreeningPool(subjects, workers=workers) as pool:
+            return pool.compose_many(queries, position_weight=position_weight, block_size=block_size,
+                                     top_k=top_k, max_score=max_score, max_mismatches=max_mismatches, substitution=substitution,
+                                     null=null)
+
+    substitution_table = None if substitution is None else substitution_score_table(substitution, position_weight, length)
+
+    results: List[xrResult] = []
+    query_step = max(1, block_size // max(1, len(subjects)))
+    for start in range(0, len(queries), query_step):
+        with stage('scoring', len(query_numeric[start:start + query_step]) * len(subjects)):
+            if align:
+                scores = _internal_score_aligned(query_numeric[start:start + query_step], subjects, position_weight,
+                                                 block_size=block_size, substitution=substitution)
+            else:
+                scores = _internal_score_background(query_numeric[start:start + query_step], subjects.encoded, position_weight,
+                                                    block_size=block_size, substitution_table=substitution_table)
+        results.extend(
+            _internal_build_result(query, subjects, {key: value[index] for key, value in scores.items()}, position_weight,
+                                   top_k=top_k, max_score=max_score, max_mismatches=max_mismatches, null=null)
+            for index, query in enumerate(queries[start:start + query_step])
+        )
+    return results
 
 
 
@@ -169,9 +827,11 @@ def calculate_relatedness(query:str, candidate:str, position_weight:List[float]
     
     query_peptide = _internal_checking_peptide(query)
     candidate_peptide = _internal_checking_peptide(candidate)
+    if len(query_peptide) != len(candidate_peptide):
+        raise ValueError(f"Query {query} and candidate {candidate} peptides must have the same length.")
 
     # Use default position weights if none provided
-    position_weight = position_weight or [1.0] * 9
+    position_weight = _internal_checking_weight(position_weight, len(query_peptide))
 
     # Calculate relatedness score
     raw_score = _internal_related_distance(np.array(query_peptide), np.array(candidate_peptide), position_weight)
@@ -199,16 +859,24 @@ def cross_pair_summary (query:str, background:xrBackground) -> xrResult:
 
 
 
-def cross_write (result:xrResult, file_path:str) -> None:
+def cross_write (result:Union[xrResult, Iterable[xrResult]], file_path:str, columns:List[str] = None,
+                 format:str = None, compression:str = None) -> None:
     """
-        Exports the result DataFrame to a CSV file.
+        Exports the result DataFrame to a CSV, compressed CSV, Parquet or Arrow file.
+
+        Results are streamed in bounded chunks (see crossdome.export), and an iterable
+        of results, such as a generator of screening batches, is written one at a time.
 
-        :param result: An xrResult object containing peptide comparison results.
-        :param file_path: The file path to save the CSV.
+        :param result: An xrResult object containing peptide comparison results, or an iterable of them.
+        :param file_path: The file path to save to, the format is inferred from the extension
+                          (.csv, .csv.gz, .csv.bz2, .csv.xz, .parquet, .arrow).
+        :param columns: Write only these columns (optional).
+        :param format: Force the output format, 'csv', 'parquet' or 'arrow' (optional).
+        :param compression: Force the compression codec (optional).
         :return: None
     """
     
-    result.result.to_csv(file_path, index=False)
+    write_results(result, file_path, format=format, compression=compression, columns=columns)
     
     
     
@@ -216,15 +884,17 @@ def cross_substitution_matrix (query:str, candidate:str) -> List[int]:
     """
     Creates a matrix showing amino acid substitutions between the query and candidate peptides.
     
-    :param query: The query peptide sequence (must be a 9-mer).
-    :param candidate: The candidate peptide sequence (must be a 9-mer).
+    :param query: The query peptide sequence (8 to 11 residues).
+    :param candidate: The candidate peptide sequence, of the same length as the query.
     :return: A list where 0 represents a match and 1 represents a mismatch.
-    :raises ValueError: If either peptide is not a valid 9-mer.
+    :raises ValueError: If either peptide is not valid or their lengths differ.
     """
     
     # Validate the query and candidate peptides
     query_peptide = _internal_checking_peptide(query)
     candidate_peptide = _internal_checking_peptide(candidate)
+    if len(query_peptide) != len(candidate_peptide):
+        raise ValueError(f"Query {query} and candidate {candidate} peptides must have the same length.")
 
     # Create a substitution matrix: 0 for match, 1 for mismatch
     substitution_matrix = [0 if q == c else 1 for q, c in zip(query_peptide, candidate_peptide)]
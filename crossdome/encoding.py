@@ -0,0 +1,89 @@
+# Import needed libraries
+import numpy as np
+from typing import List, Sequence
+
+# Standard amino acid alphabet, the index of each residue is its numeric code
+AMINO_ACIDS:str = "ACDEFGHIKLMNPQRSTVWY"
+
+# Peptide lengths supported by CrossDome (HLA class I ligands)
+PEPTIDE_LENGTHS:range = range(8, 12)
+
+# Code used for any residue outside of the standard alphabet
+INVALID_RESIDUE:int = 255
+
+# Lookup tables between raw ASCII bytes and residue codes
+_BYTE_TO_CODE = np.full(256, INVALID_RESIDUE, dtype=np.uint8)
+_BYTE_TO_CODE[np.frombuffer(AMINO_ACIDS.encode("ascii"), dtype=np.uint8)] = np.arange(len(AMINO_ACIDS), dtype=np.uint8)
+_CODE_TO_BYTE = np.frombuffer(AMINO_ACIDS.encode("ascii"), dtype=np.uint8)
+
+
+
+def encode_peptides (peptides:Sequence[str], length:int = 9) -> np.ndarray:
+    """
+    Encodes a collection of equal length peptides into a residue code matrix.
+
+    The whole collection is validated in one vectorized pass, peptides are joined
+    into a single byte buffer and mapped through a 256 entry lookup table.
+
+    :param peptides: A sequence of peptide strings.
+    :param length: The expected length of every peptide (default is 9-mers).
+    :return: A (N, length) uint8 matrix of residue codes.
+    :raises ValueError: If a peptide has the wrong length or contains non-standard amino acids.
+    """
+
+    count = len(peptides)
+    if count == 0:
+        return np.empty((0, length), dtype=np.uint8)
+
+    # Check lengths before joining, a single wrong length would shift every row after it
+    lengths = np.fromiter(map(len, peptides), dtype=np.int64, count=count)
+    wrong_length = np.flatnonzero(lengths != length)
+    if wrong_length.size:
+        first = peptides[int(wrong_length[0])]
+        raise ValueError(f"CrossDome expected {length}-mer peptides, got {first} of size {len(first)} ({wrong_length.size} invalid in total).")
+
+    # Non ASCII characters are replaced by '?', which maps to the invalid code
+    raw = np.frombuffer("".join(peptides).encode("ascii", errors="replace"), dtype=np.uint8)
+    encoded = _BYTE_TO_CODE[raw].reshape(count, length)
+
+    invalid_rows = np.flatnonzero((encoded == INVALID_RESIDUE).any(axis=1))
+    if invalid_rows.size:
+        first = peptides[int(invalid_rows[0])]
+        raise ValueError(f"Please check your input sequence {first}. Currently, only standard amino acids are supported ({invalid_rows.size} invalid in total).")
+
+    return encoded
+
+
+
+def decode_peptides (encoded:np.ndarray) -> List[str]:
+    """
+    Converts a residue code matrix back into peptide strings.
+
+    :param encoded: A (N, length) uint8 matrix of residue codes.
+    :return: A list of peptide strings.
+    """
+
+    encoded = np.ascontiguousarray(encoded, dtype=np.uint8)
+    if encoded.shape[0] == 0:
+        return []
+
+    letters = _CODE_TO_BYTE[encoded]
+    return np.frombuffer(letters.tobytes(), dtype=f"S{encoded.shape[1]}").astype(str).tolist()
+
+
+
+def pack_peptides (encoded:np.ndarray) -> np.ndarray:
+    """
+    Packs each encoded peptide into a single integer key (5 bits per residue).
+
+    Keys compare equal exactly when the peptides are identical, which makes
+    them suitable for hashing, sorting and deduplication of up to 12-mers.
+
+    :param encoded: A (N, length) uint8 matrix of residue codes.
+    :return: An array of N uint64 keys.
+    """
+
+    keys = np.zeros(encoded.shape[0], dtype=np.uint64)
+    for position in range(encoded.shape[1]):
+        keys = (keys << np.uint64(5)) | encoded[:, position].astype(np.uint64)
+    return keys
@@ -0,0 +1,226 @@
+# Import needed libraries
+import bz2
+import gzip
+import lzma
+import os
+import pandas as pd
+from typing import Any, Iterable, List, Optional, Union
+
+# Import core objects
+from crossdome.core_classes import RESULT_COLUMNS, xrResult
+from crossdome.profiling import stage
+
+"""
+Streaming export of CrossDome results.
+
+A ResultWriter accepts result chunks (xrResult objects or DataFrames) as they are
+produced and appends them to a CSV, compressed CSV, Parquet or Arrow IPC file, so a
+full-background screen never needs all of its rows in memory at once. Parquet and
+Arrow output require the optional pyarrow dependency.
+"""
+
+# Formats and compressions recognized from the file extension
+_FORMAT_EXTENSIONS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+_COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+_CSV_OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+# Rows converted and written per slice, bounds the temporary text or Arrow buffers
+_EXPORT_CHUNK_ROWS:int = 1 << 16
+
+
+
+def _infer_format (file_path:str) -> tuple:
+    """
+    Infers the output format and compression from a file name.
+
+    :param file_path: The output file path, e.g. 'hits.csv.gz' or 'hits.parquet'.
+    :return: A (format, compression) tuple, compression being None when not applicable.
+    """
+
+    root, extension = os.path.splitext(file_path.lower())
+    compression = _COMPRESSION_EXTENSIONS.get(extension)
+    if compression is not None:
+        root, extension = os.path.splitext(root)
+    return _FORMAT_EXTENSIONS.get(extension, 'csv'), compression
+
+
+
+def _require_pyarrow () -> Any:
+    """Imports pyarrow, which is only needed for Parquet and Arrow output."""
+
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet and Arrow output require pyarrow, install it with `pip install pyarrow`.") from e
+    return pyarrow
+
+
+
+def _arrow_schema (pyarrow:Any, dataframe:pd.DataFrame) -> Any:
+    """
+    Builds the Arrow schema of the output from the column dtypes of a result slice.
+
+    Columns of an empty slice holding no value (e.g. the query and subject of a query
+    without hits) would otherwise get the Arrow null type, which later rows cannot be cast to.
+
+    :param pyarrow: The pyarrow module.
+    :param dataframe: A result slice, possibly empty.
+    :return: A pyarrow Schema.
+    """
+
+    schema = pyarrow.Schema.from_pandas(dataframe, preserve_index=False)
+    fields = []
+    for field in schema:
+        if pyarrow.types.is_null(field.type):
+            numeric = pd.api.types.is_numeric_dtype(dataframe[field.name].dtype)
+            field = field.with_type(pyarrow.float64() if numeric else pyarrow.string())
+        fields.append(field)
+    return pyarrow.schema(fields, metadata=schema.metadata)
+
+
+
+class ResultWriter:
+    """
+    Incrementally writes result chunks to a single file with bounded memory.
+
+    Usable as a context manager; the file is complete once the writer is closed.
+
+    Attributes:
+        file_path (str): The output file path.
+        format (str): 'csv', 'parquet' or 'arrow'.
+        compression (str): The compression codec, or None.
+        columns (List[str]): The columns written, fixed by the first chunk when not given.
+        rows (int): The number of rows written so far.
+    """
+
+    def __init__(self, file_path:str, format:str = None, compression:str = None, columns:List[str] = None,
+                 chunk_rows:int = _EXPORT_CHUNK_ROWS):
+        inferred_format, inferred_compression = _infer_format(file_path)
+        self.file_path = file_path
+        self.format = (format or inferred_format).lower()
+        self.compression = compression if compression is not None else inferred_compression
+        self.columns: Optional[List[str]] = list(columns) if columns is not None else None
+        self.rows = 0
+        self._chunk_rows = max(1, chunk_rows)
+        self._handle = None
+        self._arrow_writer = None
+        self._schema = None
+        self._closed = False
+
+        if self.format not in ('csv', 'parquet', 'arrow'):
+            raise ValueError(f"Unknown result format {self.format}, expected 'csv', 'parquet' or 'arrow'.")
+        if self.format == 'csv' and self.compression not in (None, *_CSV_OPENERS):
+            raise ValueError(f"Unknown CSV compression {self.compression}, expected one of {sorted(_CSV_OPENERS)}.")
+        # Errors of the output library are raised as IOError by write
+        self._errors = (OSError, ValueError)
+        if self.format != 'csv':
+            self._errors += (_require_pyarrow().ArrowException,)
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self):
+        return f"ResultWriter(file_path={self.file_path}, format={self.format}, rows={self.rows})"
+
+    def write(self, chunk:Union[xrResult, pd.DataFrame]) -> None:
+        """
+        Appends one chunk of results to the file.
+
+        :param chunk: An xrResult or a result DataFrame.
+        :raises KeyError: If a selected column is missing from the chunk.
+        :raises IOError: If the chunk cannot be written.
+        """
+
+        if self._closed:
+            raise ValueError(f"ResultWriter for {self.file_path} is closed.")
+
+        available = chunk.columns if isinstance(chunk, xrResult) else list(chunk.columns)
+        if self.columns is None:
+            self.columns = list(available)
+        missing = [column for column in self.columns if column not in available]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in the result chunk.")
+
+        # Array-backed results are converted one slice at a time, never as a whole DataFrame
+        if isinstance(chunk, xrResult):
+            rows = lambda start, stop: chunk.to_dataframe(self.columns, start, stop)
+        else:
+            rows = lambda start, stop: chunk.iloc[start:stop][self.columns]
+
+        try:
+            with stage('export', len(chunk)):
+                for start in range(0, len(chunk), self._chunk_rows):
+                    self._write_rows(rows(start, start + self._chunk_rows))
+                if len(chunk) == 0 and self._handle is None and self._arrow_writer is None:
+                    # Still write the header (or schema) of an empty result
+                    self._write_rows(rows(0, 0))
+        except self._errors as e:
+            raise IOError(f"Error saving file {self.file_path}: {e}")
+
+    def _write_rows(self, dataframe:pd.DataFrame) -> None:
+        """Writes a bounded slice of rows, opening the output on first use."""
+
+        if self.format == 'csv':
+            if self._handle is None:
+                opener = _CSV_OPENERS.get(self.compression, open)
+                self._handle = opener(self.file_path, "wt", newline="")
+                dataframe.to_csv(self._handle, index=False)
+            elif len(dataframe):
+                dataframe.to_csv(self._handle, index=False, header=False)
+        else:
+            pyarrow = _require_pyarrow()
+            if self._arrow_writer is None:
+                self._schema = _arrow_schema(pyarrow, dataframe)
+                if self.format == 'parquet':
+                    self._arrow_writer = pyarrow.parquet.ParquetWriter(self.file_path, self._schema, compression=self.compression or 'snappy')
+                else:
+                    self._arrow_writer = pyarrow.ipc.new_file(self.file_path, self._schema)
+            self._arrow_writer.write_table(pyarrow.Table.from_pandas(dataframe, schema=self._schema, preserve_index=False))
+        self.rows += len(dataframe)
+
+    def close(self) -> None:
+        """Flushes and closes the output file."""
+
+        if self._closed:
+            return
+        if self._handle is None and self._arrow_writer is None:
+            # Nothing was written, leave a header-only file, with every result column when no chunk arrived
+            self._write_rows(pd.DataFrame(columns=self.columns if self.columns is not None else RESULT_COLUMNS))
+        self._closed = True
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if self._arrow_writer is not None:
+            self._arrow_writer.close()
+            self._arrow_writer = None
+
+
+
+def write_results (results:Union[xrResult, pd.DataFrame, Iterable[Union[xrResult, pd.DataFrame]]], file_path:str,
+                   format:str = None, compression:str = None, columns:List[str] = None) -> int:
+    """
+    Streams one result or an iterable of result chunks to a file.
+
+    Passing a generator (e.g. of cross_compose_many batches) keeps only one chunk in memory.
+
+    :param results: An xrResult, a DataFrame, or an iterable of either.
+    :param file_path: The output path, the format is inferred from the extension
+                      (.csv, .csv.gz, .csv.bz2, .csv.xz, .parquet, .arrow).
+    :param format: Force the output format ('csv', 'parquet' or 'arrow').
+    :param compression: Force the compression codec.
+    :param columns: Write only these columns, in this order.
+    :return: The number of rows written.
+    """
+
+    if isinstance(results, (xrResult, pd.DataFrame)):
+        results = [results]
+
+    with ResultWriter(file_path, format=format, compression=compression, columns=columns) as writer:
+        for chunk in results:
+            writer.write(chunk)
+        return writer.rows
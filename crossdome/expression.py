@@ -0,0 +1,193 @@
+# Import needed libraries
+import numpy as np
+import pandas as pd
+from typing import List, Sequence
+
+# Import core objects and the expression data
+from crossdome.core_classes import xrResult
+from crossdome.profiling import stage
+from crossdome.utils import HPA_ANNOTATION_COLUMNS, load_expression_table
+
+"""
+Tissue expression annotation of CrossDome hits.
+
+An ExpressionIndex is built once from (peptide, source gene) pairs and an
+expression table, the bundled HPA table by default. Peptides map to a row of a
+float32 profile matrix: the row of their gene, or, for peptides shared by several
+genes, an extra row holding the per-tissue maximum over those genes. Annotating a
+result is then one hash lookup of all its subjects and one fancy index of the
+profile matrix, with a trailing NaN row for peptides without a known source gene.
+"""
+
+
+
+class ExpressionIndex:
+    """
+    Maps peptides to their source genes and tissue expression profiles.
+
+    Attributes:
+        tissues (List[str]): The tissues of the profiles.
+        genes (np.ndarray): The gene ids of the expression table, e.g. Ensembl ids.
+        profiles (np.ndarray): A float32 matrix of one expression profile per row, gene rows first.
+    """
+
+    def __init__(self, peptides:Sequence[str], genes:Sequence[str], expression:pd.DataFrame = None):
+        """
+        Builds the index from (peptide, source gene) pairs.
+
+        :param peptides: The peptides, repeated once per source gene.
+        :param genes: The source gene of each peptide, an id of the expression table or a gene symbol.
+        :param expression: A table indexed by gene id with one numeric column per tissue and optionally the
+                           gene symbols in 'gene_donor' (defaults to the bundled HPA table).
+        :raises ValueError: If peptides and genes differ in length.
+        """
+
+        if len(peptides) != len(genes):
+            raise ValueError(f"Peptides and genes must have the same length, got {len(peptides)} and {len(genes)} instead.")
+        if expression is None:
+            expression = load_expression_table()
+
+        self.tissues: List[str] = [name for name in expression.columns if name not in HPA_ANNOTATION_COLUMNS]
+        self.genes = expression.index.astype(str).to_numpy(dtype=object)
+        matrix = expression[self.tissues].to_numpy(dtype=np.float64)
+        # R's NA is a NaN with a payload, which warns when cast to float32
+        matrix = np.where(np.isnan(matrix), np.nan, matrix).astype(np.float32)
+
+        # Genes are looked up by id first, then by symbol
+        symbols = pd.Series(np.arange(len(expression)), index=expression['gene_donor'].to_numpy(dtype=object)) \
+            if 'gene_donor' in expression.columns else pd.Series(dtype=np.int64)
+        symbols = symbols[~symbols.index.duplicated()]
+
+        pairs = pd.DataFrame({'peptide': np.asarray(peptides, dtype=object), 'gene': np.asarray(genes, dtype=object)})
+        pairs = pairs.dropna().drop_duplicates()
+        codes, uniques = pd.factorize(pairs['peptide'])
+        order = np.argsort(codes, kind='stable')
+        codes, names = codes[order], pairs['gene'].to_numpy(dtype=object)[order]
+        gene_rows = pd.Index(self.genes).get_indexer(names)
+        unknown = gene_rows < 0
+        gene_rows[unknown] = np.append(symbols.to_numpy(), -1)[symbols.index.get_indexer(names[unknown])]
+
+        # Source gene labels, joined only for peptides of several genes
+        counts = np.bincount(codes, minlength=len(uniques))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        labels = names[starts] if len(names) else np.empty(0, dtype=object)
+        for peptide in np.flatnonzero(counts > 1):
+            labels[peptide] = ";".join(names[starts[peptide]:starts[peptide] + counts[peptide]])
+
+        # Profile row of each peptide, peptides of several known genes getting a combined row
+        known = gene_rows >= 0
+        known_codes, known_rows = codes[known], gene_rows[known]
+        known_counts = np.bincount(known_codes, minlength=len(uniques))
+        first = np.searchsorted(known_codes, np.arange(len(uniques)))
+        rows = np.full(len(uniques), -1, dtype=np.int64)
+        single = known_counts == 1
+        rows[single] = known_rows[first[single]]
+
+        shared = np.flatnonzero(known_counts > 1)
+        combined = np.empty((0, len(self.tissues)), dtype=np.float32)
+        if shared.size:
+            members = np.isin(known_codes, shared)
+            offsets = np.concatenate([[0], np.cumsum(known_counts[shared])[:-1]])
+            combined = np.fmax.reduceat(matrix[known_rows[members]], offsets, axis=0)
+            rows[shared] = len(matrix) + np.arange(shared.size)
+
+        # A trailing NaN profile, label and row answer peptides missing from the index
+        self.profiles = np.vstack([matrix, combined, np.full((1, len(self.tissues)), np.nan, dtype=np.float32)])
+        self._peptides = pd.Index(uniques)
+        self._rows = np.append(rows, -1)
+        self._labels = np.append(labels, None)
+
+    @classmethod
+    def from_dataframe(cls, df:pd.DataFrame, peptide_column:str = 'peptide', gene_column:str = 'gene',
+                       expression:pd.DataFrame = None) -> 'ExpressionIndex':
+        """
+        Builds the index from a peptide dataset annotated with source genes.
+
+        :param df: A DataFrame with one row per (peptide, source gene) pair.
+        :param peptide_column: The column of the peptides.
+        :param gene_column: The column of the source genes.
+        :param expression: The expression table (defaults to the bundled HPA table).
+        :return: An ExpressionIndex.
+        :raises KeyError: If a column is missing.
+        """
+
+        for column in (peptide_column, gene_column):
+            if column not in df.columns:
+                raise KeyError(f"Column {column} not found in the DataFrame.")
+        return cls(df[peptide_column].to_numpy(dtype=object), df[gene_column].to_numpy(dtype=object), expression=expression)
+
+    def __len__(self) -> int:
+        return len(self._peptides)
+
+    def __repr__(self):
+        return f"ExpressionIndex(peptides_count={len(self)}, genes_count={len(self.genes)}, tissues_count={len(self.tissues)})"
+
+    def _positions(self, peptides:Sequence[str]) -> np.ndarray:
+        """Position of each peptide in the index, -1 (the trailing entries) when missing."""
+
+        return self._peptides.get_indexer(np.asarray(peptides, dtype=object))
+
+    def _tissue_columns(self, tissues:Sequence[str] = None) -> np.ndarray:
+        """Column of each requested tissue in the profiles."""
+
+        if tissues is None:
+            return np.arange(len(self.tissues))
+        missing = [tissue for tissue in tissues if tissue not in self.tissues]
+        if missing:
+            raise KeyError(f"Tissues {missing} not found in the expression table.")
+        return np.array([self.tissues.index(tissue) for tissue in tissues], dtype=np.int64)
+
+    def source_genes(self, peptides:Sequence[str]) -> np.ndarray:
+        """
+        Returns the source genes of peptides, ';'-separated for peptides of several genes.
+
+        :param peptides: The peptides.
+        :return: An object array with one label per peptide, None when the peptide is not indexed.
+        """
+
+        return self._labels[self._positions(peptides)]
+
+    def lookup(self, peptides:Sequence[str], tissues:Sequence[str] = None) -> np.ndarray:
+        """
+        Returns the expression profiles of peptides.
+
+        :param peptides: The peptides.
+        :param tissues: The tissues to return (defaults to all tissues).
+        :return: A (N, T) float32 matrix, NaN for peptides without a known source gene.
+        :raises KeyError: If a tissue is unknown.
+        """
+
+        columns = self._tissue_columns(tissues)
+        return self.profiles[self._rows[self._positions(peptides)]][:, columns]
+
+    def profile_table(self, peptides:Sequence[str], tissues:Sequence[str] = None) -> pd.DataFrame:
+        """
+        Returns the expression profiles of peptides in the layout of plot_peptide_expression.
+
+        :param peptides: The peptides.
+        :param tissues: The tissues to return (defaults to all tissues).
+        :return: A DataFrame indexed by tissue with one column per peptide.
+        """
+
+        tissues = self.tissues if tissues is None else list(tissues)
+        return pd.DataFrame(self.lookup(peptides, tissues).T, index=tissues, columns=list(peptides))
+
+    def annotate(self, result:xrResult, tissues:Sequence[str] = None, gene_column:str = 'gene') -> xrResult:
+        """
+        Attaches the source genes and tissue expression of every hit of a result in one pass.
+
+        :param result: An xrResult, e.g. from cross_compose.
+        :param tissues: The tissues to add as columns (defaults to all tissues).
+        :param gene_column: The name of the source gene column.
+        :return: A new xrResult with the gene column and one expression column per tissue.
+        :raises KeyError: If a tissue is unknown.
+        """
+
+        tissues = self.tissues if tissues is None else list(tissues)
+        columns = self._tissue_columns(tissues)
+        with stage('expression', len(result)):
+            positions = self._positions(result.column('subject'))
+            values = self.profiles[self._rows[positions]][:, columns]
+            annotations = {gene_column: self._labels[positions]}
+            annotations.update({tissue: values[:, column] for column, tissue in enumerate(tissues)})
+            return result.mutate(**annotations)
@@ -0,0 +1,140 @@
+# Import needed libraries
+import numpy as np
+from typing import List, Tuple, Union
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+from crossdome.encoding import encode_peptides, pack_peptides
+
+"""
+Mismatch-bounded search over an xrBackground.
+
+By the pigeonhole principle, a peptide within d mismatches of the query must
+match it exactly on at least one of d + 1 disjoint position segments. The index
+keeps, for each segment, the background rows sorted by their packed segment
+residues, so candidates are gathered with binary searches and then verified.
+The index subscribes to its background: appended rows are merged into the
+sorted keys and removed rows dropped and renumbered, without a full re-sort.
+"""
+
+
+
+class SegmentIndex:
+    """
+    A pigeonhole segment index answering small Hamming radius queries.
+
+    Attributes:
+        background (xrBackground): The indexed background (a single length bucket, see xrBackground.bucket).
+        max_mismatches (int): The largest radius the index can answer exactly.
+        segments (List[np.ndarray]): The peptide positions covered by each segment.
+    """
+
+    def __init__(self, background:xrBackground, max_mismatches:int = 2):
+        length = background.encoded.shape[1]
+        if not 0 <= max_mismatches < length:
+            raise ValueError(f"max_mismatches must be between 0 and {length - 1}, got {max_mismatches} instead.")
+
+        self.background = background
+        self.max_mismatches = max_mismatches
+        self.segments:List[np.ndarray] = np.array_split(np.arange(length), max_mismatches + 1)
+        self._keys:List[np.ndarray] = []
+        self._rows:List[np.ndarray] = []
+        self._build()
+        background.subscribe(self)
+
+    def __repr__(self):
+        return f"SegmentIndex(allele={self.background.allele}, peptides_count={len(self.background)}, max_mismatches={self.max_mismatches})"
+
+    def _build(self) -> None:
+        """(Re)builds the sorted segment keys from the background residue matrix."""
+
+        encoded = self.background.encoded
+        row_dtype = np.int32 if len(encoded) < 2 ** 31 else np.int64
+        self._keys, self._rows = [], []
+        for positions in self.segments:
+            keys = self._segment_keys(encoded, positions)
+            rows = np.argsort(keys, kind='stable').astype(row_dtype)
+            self._keys.append(keys[rows])
+            self._rows.append(rows)
+
+    def background_changed(self, background:xrBackground, length:int, added:np.ndarray = None, removed:np.ndarray = None,
+                           keep:np.ndarray = None) -> None:
+        """
+        Updates the sorted segment keys after peptides were appended to or removed from the background.
+
+        :param background: The changed background.
+        :param length: The length of the changed bucket.
+        :param added: The residue matrix of the appended rows, last in the bucket (optional).
+        :param removed: The residue matrix of the removed rows (optional).
+        :param keep: The mask of the previous rows that were kept (optional).
+        """
+
+        if keep is not None:
+            # Drop removed rows, the others shift down by the number of removed rows before them
+            renumber = np.cumsum(keep) - 1
+            for segment, (keys, rows) in enumerate(zip(self._keys, self._rows)):
+                kept = keep[rows]
+                self._keys[segment] = keys[kept]
+                self._rows[segment] = renumber[rows[kept]].astype(rows.dtype)
+
+        if added is not None:
+            size = len(background.encoded)
+            row_dtype = np.int32 if size < 2 ** 31 else np.int64
+            for segment, positions in enumerate(self.segments):
+                keys = self._segment_keys(added, positions)
+                order = np.argsort(keys, kind='stable')
+                # Equal keys keep increasing rows, as a stable sort of the whole bucket would
+                at = np.searchsorted(self._keys[segment], keys[order], side='right')
+                self._keys[segment] = np.insert(self._keys[segment], at, keys[order])
+                self._rows[segment] = np.insert(self._rows[segment].astype(row_dtype, copy=False), at,
+                                                (size - len(added) + order).astype(row_dtype))
+
+    @staticmethod
+    def _segment_keys(encoded:np.ndarray, positions:np.ndarray) -> np.ndarray:
+        """Packs the residues of one segment, 32-bit keys cover segments of up to 6 positions."""
+
+        keys = pack_peptides(np.ascontiguousarray(encoded[:, positions]))
+        return keys.astype(np.uint32) if len(positions) <= 6 else keys
+
+    def candidates(self, query:Union[str, np.ndarray]) -> np.ndarray:
+        """
+        Gathers every background row matching the query exactly on at least one segment.
+
+        :param query: The query peptide, as a string or an encoded array.
+        :return: Sorted, unique candidate row indices.
+        """
+
+        query_numeric = self._encode(query)
+        gathered = []
+        for positions, keys, rows in zip(self.segments, self._keys, self._rows):
+            key = self._segment_keys(query_numeric[None, positions], np.arange(len(positions)))[0]
+            start, stop = np.searchsorted(keys, key, side='left'), np.searchsorted(keys, key, side='right')
+            gathered.append(rows[start:stop])
+        return np.unique(np.concatenate(gathered)).astype(np.int64)
+
+    def search(self, query:Union[str, np.ndarray], max_mismatches:int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds all background peptides within max_mismatches of the query.
+
+        :param query: The query peptide, as a string or an encoded array.
+        :param max_mismatches: The search radius (defaults to the index radius).
+        :return: Sorted row indices of the hits and their mismatch counts.
+        :raises ValueError: If the radius exceeds what the index can answer.
+        """
+
+        max_mismatches = self.max_mismatches if max_mismatches is None else max_mismatches
+        if max_mismatches > self.max_mismatches:
+            raise ValueError(f"This index answers up to {self.max_mismatches} mismatches, got {max_mismatches} instead.")
+
+        query_numeric = self._encode(query)
+        rows = self.candidates(query_numeric)
+        mismatches = np.count_nonzero(self.background.encoded[rows] != query_numeric, axis=1)
+        within = mismatches <= max_mismatches
+        return rows[within], mismatches[within]
+
+    def _encode(self, query:Union[str, np.ndarray]) -> np.ndarray:
+        """Validates and encodes a query peptide."""
+
+        if isinstance(query, str):
+            return encode_peptides([query], length=self.background.encoded.shape[1])[0]
+        return np.asarray(query, dtype=np.uint8)
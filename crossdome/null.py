@@ -0,0 +1,233 @@
+# Import needed libraries
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+# Import core objects and the scoring engine
+from crossdome.core_classes import xrBackground
+from crossdome.core_functions import _internal_checking_weight, _internal_merge_summary, _internal_remove_summary
+from crossdome.core_functions import _internal_score_background, _internal_score_summary
+from crossdome.encoding import encode_peptides
+from crossdome.substitution import Substitution, substitution_key, substitution_score_table
+
+"""
+Empirical null distributions of relatedness scores.
+
+Instead of assuming normally distributed scores, the null is the distribution
+of scores between random pairs of background peptides, sampled once per
+(background, peptide length, position weights, scoring scheme) and kept as a
+sorted array. P-values and percentiles of any score are then binary searches,
+so a short candidate list can be assessed without scoring the whole background.
+
+ScoreSummaries keep the parameters of the normal approximation instead: the
+(count, mean, M2) of each query's scores against a background, updated with the
+appended or removed peptides only when the background changes.
+"""
+
+# Number of random peptide pairs scored for each null distribution
+_NULL_SAMPLES:int = 1 << 18
+
+# Number of sampled queries, each scored against the same sampled subjects
+_NULL_QUERIES:int = 256
+
+# Null distributions kept in memory, least recently used ones are dropped first
+_NULL_CACHE_SIZE:int = 32
+_NULL_CACHE:"OrderedDict[tuple, EmpiricalNull]" = OrderedDict()
+
+# Queries whose score summaries are kept, least recently used ones are dropped first
+_SUMMARY_CACHE_SIZE:int = 1 << 16
+
+
+
+class EmpiricalNull:
+    """
+    A sorted sample of null relatedness scores.
+
+    Attributes:
+        scores (np.ndarray): The null scores, sorted in ascending order.
+        mean (float): The mean of the null scores.
+        std (float): The sample standard deviation of the null scores.
+    """
+
+    def __init__(self, scores:np.ndarray):
+        self.scores = np.sort(np.asarray(scores, dtype=np.float64))
+        if len(self.scores) == 0:
+            raise ValueError("An empirical null needs at least one score.")
+        self.mean = float(self.scores.mean())
+        self.std = float(self.scores.std(ddof=1)) if len(self.scores) > 1 else np.nan
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __repr__(self):
+        return f"EmpiricalNull(samples={len(self)}, mean={self.mean:.4f}, std={self.std:.4f})"
+
+    def pvalue(self, scores:np.ndarray) -> np.ndarray:
+        """
+        Computes the probability of a null score at or below each score.
+
+        Uses the (k + 1) / (n + 1) estimate, so p-values are never exactly zero.
+
+        :param scores: Relatedness scores (lower is more related).
+        :return: An array of p-values.
+        """
+
+        below = np.searchsorted(self.scores, scores, side='right')
+        return (below + 1) / (len(self.scores) + 1)
+
+    def percentile(self, scores:np.ndarray) -> np.ndarray:
+        """
+        Computes the percentage of null scores strictly below each score.
+
+        :param scores: Relatedness scores.
+        :return: An array of percentiles (0 to 100).
+        """
+
+        return np.searchsorted(self.scores, scores, side='left') / len(self.scores) * 100
+
+
+
+def empirical_null (background:xrBackground, length:int = 9, position_weight:List[float] = None,
+                    substitution:Substitution = None, samples:int = _NULL_SAMPLES, seed:int = 0) -> EmpiricalNull:
+    """
+    Samples, or returns the cached, null score distribution of a background.
+
+    Random queries drawn from the background are scored against random subjects of
+    the same length bucket. Small buckets are scored exhaustively instead. A peptide
+    is never paired with itself, whose score of 0 would bias the null towards
+    significance. Results are cached by background fingerprint, so a changed
+    background gets a new null.
+
+    :param background: The background to sample from.
+    :param length: The peptide length (selects the length bucket).
+    :param position_weight: The position weights used for scoring (optional).
+    :param substitution: The substitution scheme used for scoring (optional).
+    :param samples: The approximate number of peptide pairs to score.
+    :param seed: The random seed, the same seed gives the same null.
+    :return: An EmpiricalNull object.
+    :raises ValueError: If the length bucket holds fewer than two peptides.
+    """
+
+    position_weight = _internal_checking_weight(position_weight, length)
+    key = (background.fingerprint(), length, tuple(position_weight), substitution_key(substitution), samples, seed)
+    if key in _NULL_CACHE:
+        _NULL_CACHE.move_to_end(key)
+        return _NULL_CACHE[key]
+
+    encoded = background.bucket(length).encoded
+    size = len(encoded)
+    if size < 2:
+        raise ValueError(f"Cannot sample an empirical null from a {length}-mer background of {size} peptides, at least 2 are needed.")
+
+    if size * size <= samples:
+        query_rows = subject_rows = np.arange(size)
+    else:
+        # Sorted sampled rows keep memory-mapped reads sequential
+        generator = np.random.default_rng(seed)
+        query_count = min(size, _NULL_QUERIES)
+        query_rows = np.sort(generator.choice(size, size=query_count, replace=False))
+        subject_rows = np.sort(generator.choice(size, size=min(size, max(1, samples // query_count)), replace=False))
+
+    substitution_table = None if substitution is None else substitution_score_table(substitution, position_weight, length)
+    scores = _internal_score_background(encoded[query_rows], encoded[subject_rows], position_weight,
+                                        substitution_table=substitution_table)['relatedness_score']
+
+    # Drop the pairs of a row with itself
+    null = EmpiricalNull(scores[query_rows[:, None] != subject_rows[None, :]])
+    _NULL_CACHE[key] = null
+    while len(_NULL_CACHE) > _NULL_CACHE_SIZE:
+        _NULL_CACHE.popitem(last=False)
+    return null
+
+
+
+class ScoreSummaries:
+    """
+    Running summaries of query scores against a background, kept current as the background changes.
+
+    The summary of a query is computed with one pass over its length bucket when first
+    requested. The summaries subscribe to the background: appended and removed peptides
+    are scored against the summarized queries and merged into, or taken out of, their
+    summaries with the pairwise form of Welford's update (Chan et al.), so the mean and
+    std behind zscore and pvalue are never recomputed from the whole background.
+
+    Attributes:
+        background (xrBackground): The background the queries are scored against.
+        position_weight (List[float]): The position weights used for scoring (None for the defaults).
+        substitution (Substitution): The substitution scheme used for scoring (optional).
+        max_queries (int): The number of query summaries kept.
+    """
+
+    def __init__(self, background:xrBackground, position_weight:List[float] = None, substitution:Substitution = None,
+                 max_queries:int = _SUMMARY_CACHE_SIZE):
+        self.background = background
+        self.position_weight = position_weight
+        self.substitution = substitution
+        self.max_queries = max_queries
+        self._summaries:"OrderedDict[str, Tuple[int, float, float]]" = OrderedDict()
+        background.subscribe(self)
+
+    def __len__(self) -> int:
+        return len(self._summaries)
+
+    def __repr__(self):
+        return f"ScoreSummaries(allele={self.background.allele}, queries_count={len(self)})"
+
+    def _scores(self, queries:List[str], subjects:np.ndarray) -> np.ndarray:
+        """Scores queries of one length against encoded subjects, returning the (Q, N) relatedness scores."""
+
+        length = len(queries[0])
+        position_weight = _internal_checking_weight(self.position_weight, length)
+        substitution_table = None if self.substitution is None else substitution_score_table(self.substitution, position_weight, length)
+        return _internal_score_background(encode_peptides(queries, length=length), subjects, position_weight,
+                                          substitution_table=substitution_table)['relatedness_score']
+
+    def summary(self, query:str) -> Tuple[int, float, float]:
+        """
+        Returns the (count, mean, M2) summary of a query's scores against its length bucket.
+
+        :param query: The query peptide.
+        :return: The number of scores, their mean and their sum of squared deviations from the mean.
+        :raises ValueError: If the background holds no peptide of the query length.
+        """
+
+        if query in self._summaries:
+            self._summaries.move_to_end(query)
+            return self._summaries[query]
+
+        summary = _internal_score_summary(self._scores([query], self.background.bucket(len(query)).encoded)[0])
+        self._summaries[query] = summary
+        while len(self._summaries) > self.max_queries:
+            self._summaries.popitem(last=False)
+        return summary
+
+    def stats(self, query:str) -> Dict[str, float]:
+        """
+        Returns the count, mean and sample standard deviation of a query's scores.
+
+        :param query: The query peptide.
+        :return: A dictionary with 'count', 'mean' and 'std'.
+        """
+
+        count, mean, m2 = self.summary(query)
+        return {'count': count, 'mean': mean if count else np.nan, 'std': float(np.sqrt(m2 / (count - 1))) if count > 1 else np.nan}
+
+    def background_changed(self, background:xrBackground, length:int, added:np.ndarray = None, removed:np.ndarray = None,
+                           keep:np.ndarray = None) -> None:
+        """
+        Updates the summaries of the queries of a changed length bucket with the changed peptides only.
+
+        :param background: The changed background.
+        :param length: The length of the changed bucket.
+        :param added: The residue matrix of the appended rows (optional).
+        :param removed: The residue matrix of the removed rows (optional).
+        :param keep: The mask of the previous rows that were kept (unused).
+        """
+
+        queries = [query for query in self._summaries if len(query) == length]
+        for rows, update in ((removed, _internal_remove_summary), (added, _internal_merge_summary)):
+            if not queries or rows is None or not len(rows):
+                continue
+            for query, scores in zip(queries, self._scores(queries, rows)):
+                self._summaries[query] = update(self._summaries[query], _internal_score_summary(scores))
+
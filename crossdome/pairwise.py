@@ -0,0 +1,158 @@
+# Import needed libraries
+import math
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
+from typing import List, Sequence, Tuple, Union
+
+# Import core objects and the scoring engine
+from crossdome.core_classes import xrBackground
+from crossdome.core_functions import _internal_checking_weight, _internal_pairwise_block, _internal_score_lookup
+from crossdome.encoding import PEPTIDE_LENGTHS, encode_peptides
+from crossdome.substitution import Substitution, substitution_score_table
+
+"""
+All-vs-all comparison of a peptide set.
+
+The symmetric matrix is computed in square blocks of at most block_size pairs,
+only on and above the block diagonal, each block being mirrored into place. Values
+are float32: the relatedness score of cross_compose (lower is more related) or the
+fraction of identical positions. With a threshold, only related pairs are kept, as a
+pair list rather than a sparse matrix, whose implicit zeros would be confused with
+the relatedness score 0 of identical peptides; large sets never materialize the
+dense n x n array.
+"""
+
+# Number of peptide pairs compared per block, a 1024 x 1024 block by default
+_PAIRWISE_BLOCK_SIZE:int = 1 << 20
+
+_PAIRWISE_METRICS = ('relatedness', 'similarity')
+
+
+
+def _pairwise_inputs(peptides:Union[Sequence[str], xrBackground]) -> Tuple[np.ndarray, List[str]]:
+    """Encodes a peptide set of a single length, returning the residue matrix and the labels."""
+
+    if isinstance(peptides, xrBackground):
+        return peptides.encoded, peptides.peptides
+    peptides = list(peptides)
+    length = len(peptides[0]) if peptides else 9
+    if length not in PEPTIDE_LENGTHS:
+        raise ValueError(f"CrossDome supports peptides of length {PEPTIDE_LENGTHS.start} to {PEPTIDE_LENGTHS.stop - 1}, "
+                         f"got size {length} instead.")
+    return encode_peptides(peptides, length=length), peptides
+
+
+
+def pairwise_matrix(peptides:Union[Sequence[str], xrBackground], metric:str = 'relatedness', position_weight:List[float] = None,
+                    substitution:Substitution = None, threshold:float = None, block_size:int = _PAIRWISE_BLOCK_SIZE,
+                    workers:int = None) -> pd.DataFrame:
+    """
+    Compares every peptide of a set to every other one.
+
+    :param peptides: A list of peptides of the same length, or a single-length xrBackground.
+    :param metric: 'relatedness' (the cross_compose relatedness score, 0 for identical peptides)
+                   or 'similarity' (the fraction of identical positions, 1 for identical peptides).
+    :param position_weight: A list of position weights (optional, relatedness only).
+    :param substitution: A substitution scheme (optional, relatedness only, see crossdome.substitution).
+    :param threshold: Return only the pairs of distinct peptides with a relatedness score at
+                      or below (or a similarity at or above) this value (optional).
+    :param block_size: Maximum number of pairs compared per block.
+    :param workers: Number of threads computing blocks concurrently (optional).
+    :return: A float32 DataFrame labelled by peptide, with attrs['metric'] set. With a threshold, a
+             DataFrame with one row per related pair instead: the 'left' and 'right' positions of
+             the peptides in the input order (left < right) and the float32 metric value, named
+             after the metric; pairs are sorted by left, then right.
+    :raises ValueError: If the metric is unknown or the peptides are invalid.
+    """
+
+    if metric not in _PAIRWISE_METRICS:
+        raise ValueError(f"Unknown metric {metric}, expected one of {_PAIRWISE_METRICS}.")
+    if metric == 'similarity' and (position_weight is not None or substitution is not None):
+        raise ValueError("Position weights and substitution schemes only apply to the relatedness metric.")
+
+    encoded, labels = _pairwise_inputs(peptides)
+    size, length = encoded.shape
+    position_weight = _internal_checking_weight(position_weight, length)
+    substitution_table = None if substitution is None else substitution_score_table(substitution, position_weight, length)
+    lookup = _internal_score_lookup(position_weight, length).astype(np.float32)
+    columns = np.ascontiguousarray(encoded.T, dtype=np.int16)
+
+    side = max(1, math.isqrt(max(1, block_size)))
+    starts = range(0, size, side)
+    blocks = [(row, column) for row in starts for column in starts if column >= row]
+    dense = np.empty((size, size), dtype=np.float32) if threshold is None else None
+
+    def compute(block:Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        row, column = block
+        row_stop, column_stop = min(size, row + side), min(size, column + side)
+        pairs = _internal_pairwise_block(encoded[row:row_stop], columns[:, column:column_stop], substitution_table)
+        if metric == 'similarity':
+            values = pairs['num_positive'].astype(np.float32) / np.float32(length)
+        elif substitution_table is None:
+            values = lookup[pairs['squared_distance']]
+        else:
+            values = pairs['relatedness_score'].astype(np.float32)
+
+        if dense is not None:
+            dense[row:row_stop, column:column_stop] = values
+            dense[column:column_stop, row:row_stop] = values.T
+            return None
+
+        # Keep related pairs above the diagonal, they are mirrored when assembling
+        related = values >= threshold if metric == 'similarity' else values <= threshold
+        rows, cols = np.nonzero(related)
+        rows, cols = rows + row, cols + column
+        upper = cols > rows
+        return rows[upper], cols[upper], values[related][upper]
+
+    if workers is not None and workers > 1 and len(blocks) > 1:
+        # NumPy releases the GIL in the block kernels, and threads share the output
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(compute, blocks))
+    else:
+        parts = [compute(block) for block in blocks]
+
+    if dense is not None:
+        matrix = pd.DataFrame(dense, index=labels, columns=labels, copy=False)
+        matrix.attrs['metric'] = metric
+        return matrix
+
+    rows = np.concatenate([part[0] for part in parts] or [np.empty(0, dtype=np.int64)]).astype(np.int64)
+    cols = np.concatenate([part[1] for part in parts] or [np.empty(0, dtype=np.int64)]).astype(np.int64)
+    values = np.concatenate([part[2] for part in parts] or [np.empty(0, dtype=np.float32)]).astype(np.float32)
+    order = np.lexsort((cols, rows))
+    pairs = pd.DataFrame({'left': rows[order], 'right': cols[order], metric: values[order]})
+    pairs.attrs['metric'] = metric
+    return pairs
+
+
+
+def cluster_order(matrix:Union[pd.DataFrame, np.ndarray], metric:str = None, method:str = 'average') -> np.ndarray:
+    """
+    Orders peptides by hierarchical clustering of a dense pairwise matrix.
+
+    :param matrix: A square relatedness or similarity matrix, e.g. from pairwise_matrix.
+    :param metric: 'relatedness' or 'similarity' (defaults to matrix.attrs['metric'], else 'similarity').
+    :param method: The scipy linkage method.
+    :return: The row order placing related peptides next to each other.
+    :raises ValueError: If the matrix is not square or the metric is unknown.
+    """
+
+    if metric is None:
+        metric = getattr(matrix, 'attrs', {}).get('metric', 'similarity')
+    if metric not in _PAIRWISE_METRICS:
+        raise ValueError(f"Unknown metric {metric}, expected one of {_PAIRWISE_METRICS}.")
+
+    values = np.asarray(matrix, dtype=np.float64)
+    if values.ndim != 2 or values.shape[0] != values.shape[1]:
+        raise ValueError(f"Cluster ordering needs a square matrix, got shape {values.shape} instead.")
+    if len(values) < 3:
+        return np.arange(len(values))
+
+    distance = values if metric == 'relatedness' else values.max() - values
+    distance = np.maximum((distance + distance.T) / 2, 0.0)
+    np.fill_diagonal(distance, 0.0)
+    return leaves_list(linkage(squareform(distance, checks=False), method=method))
@@ -0,0 +1,324 @@
+# Import needed libraries
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, List, Dict, Tuple, Union, Optional
+
+# Import core objects and the scoring engine
+from crossdome.core_classes import xrBackground, xrResult
+from crossdome.core_functions import (
+    _SCORING_BLOCK_SIZE, _internal_checking_selection, _internal_checking_weight, _internal_score_background,
+    _internal_select_hits, _internal_score_summary, _internal_merge_summary, _internal_build_result, _internal_resolve_null
+)
+from crossdome.encoding import encode_peptides
+from crossdome.profiling import stage
+from crossdome.substitution import Substitution, substitution_score_table
+
+# Number of query-subject pairs held in the shared score buffers per round
+_SHARED_BUFFER_PAIRS:int = 1 << 24
+
+# Shared memory segments attached by the current worker process, keyed by name
+_WORKER_SEGMENTS:Dict[str, Tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+"""
+Multi-core screening for CrossDome.
+
+The encoded background is placed once in shared memory (or memory-mapped by the
+workers when it comes from a binary background file) and split into shards
+that a process pool scores in place. Workers write scores into shared output
+buffers and only send back small per-shard summaries (count, mean, M2) and
+local hit candidates, which are merged into one xrResult per query.
+"""
+
+
+
+class _SharedArray:
+    """
+    A NumPy array living in a named shared memory segment.
+
+    Attributes:
+        segment (SharedMemory): The underlying shared memory segment.
+        array (np.ndarray): The array view over the segment.
+        spec (tuple): The (name, shape, dtype) triple workers use to attach.
+    """
+
+    def __init__(self, shape:Tuple[int, ...], dtype:str, source:np.ndarray = None):
+        size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        self.segment = shared_memory.SharedMemory(create=True, size=size)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.segment.buf)
+        self.spec = (self.segment.name, tuple(shape), np.dtype(dtype).str)
+        if source is not None:
+            self.array[...] = source
+
+    def release(self) -> None:
+        """Drops the array view and frees the segment."""
+        self.array = None
+        self.segment.close()
+        self.segment.unlink()
+
+
+
+class _MappedArray:
+    """
+    A read-only memory-mapped background file, shared through the page cache.
+
+    Attributes:
+        spec (tuple): The (path, shape, dtype, offset) tuple workers use to map the file.
+    """
+
+    def __init__(self, array:np.memmap):
+        self.spec = (array.filename, tuple(array.shape), array.dtype.str, array.offset)
+
+    def release(self) -> None:
+        """Nothing to free, the file mapping belongs to the background."""
+
+
+
+def _attach (spec:tuple) -> np.ndarray:
+    """
+    Attaches the current worker to a shared array, reusing existing attachments.
+
+    :param spec: The (name, shape, dtype) triple of a shared segment, or the
+                 (path, shape, dtype, offset) tuple of a memory-mapped file.
+    :return: The array view over the shared data.
+    """
+
+    name, shape, dtype = spec[:3]
+    if name not in _WORKER_SEGMENTS:
+        if len(spec) == 4:
+            _WORKER_SEGMENTS[name] = (None, np.memmap(name, dtype=dtype, mode="r", offset=spec[3], shape=shape))
+        else:
+            segment = shared_memory.SharedMemory(name=name)
+            _WORKER_SEGMENTS[name] = (segment, np.ndarray(shape, dtype=dtype, buffer=segment.buf))
+    return _WORKER_SEGMENTS[name][1]
+
+
+
+def _detach_except (keep:List[str]) -> None:
+    """Closes the worker's attachments to segments that are no longer in use."""
+
+    for name in [name for name in _WORKER_SEGMENTS if name not in keep]:
+        segment, _ = _WORKER_SEGMENTS.pop(name)
+        if segment is not None:
+            segment.close()
+
+
+
+def _score_shard (background_spec:tuple, score_spec:tuple, positive_spec:tuple, query_numeric:np.ndarray,
+                  start:int, stop:int, position_weight:List[float], block_size:int,
+                  selection:Optional[Dict[str, float]], substitution_table:np.ndarray = None) -> List[Tuple[Tuple[int, float, float], Optional[np.ndarray]]]:
+    """
+    Worker task: scores one background shard against a group of queries.
+
+    :param background_spec: Shared spec of the (N, 9) encoded background.
+    :param score_spec: Shared spec of the (Q, N) relatedness score buffer.
+    :param positive_spec: Shared spec of the (Q, N) positional match buffer.
+    :param query_numeric: Encoded queries, shape (Q, 9).
+    :param start: First background row of the shard.
+    :param stop: End (exclusive) background row of the shard.
+    :param position_weight: Weights for each position in the peptide.
+    :param block_size: Maximum number of query-subject pairs scored per block.
+    :param selection: top_k / max_score / max_mismatches keywords, or None for full results.
+    :param substitution_table: Optional weighted substitution cost table.
+    :return: For each query, the shard (count, mean, M2) summary and local candidate rows.
+    """
+
+    _detach_except([background_spec[0], score_spec[0], positive_spec[0]])
+    background = _attach(background_spec)
+    score_buffer = _attach(score_spec)
+    positive_buffer = _attach(positive_spec)
+
+    queries = query_numeric.shape[0]
+    scores = _internal_score_background(query_numeric, background[start:stop], position_weight, block_size=block_size,
+                                        substitution_table=substitution_table)
+    score_buffer[:queries, start:stop] = scores['relatedness_score']
+    positive_buffer[:queries, start:stop] = scores['num_positive']
+
+    shard = []
+    for index in range(queries):
+        query_scores = {key: value[index] for key, value in scores.items()}
+        candidates = None
+        if selection is not None:
+            candidates = _internal_select_hits(query_scores, **selection) + start
+        shard.append((_internal_score_summary(query_scores['relatedness_score']), candidates))
+    return shard
+
+
+
+def _rank_shard (score_spec:tuple, start:int, stop:int, hits:List[Tuple[int, np.ndarray]]) -> List[np.ndarray]:
+    """
+    Worker task: counts, for every hit, the shard rows that rank before it.
+
+    A row ranks before a hit when its score is lower, or equal with a lower index.
+
+    :param score_spec: Shared spec of the (Q, N) relatedness score buffer.
+    :param start: First background row of the shard.
+    :param stop: End (exclusive) background row of the shard.
+    :param hits: For each query, its buffer row and the global indices of its hits.
+    :return: For each query, the number of shard rows ranking before each hit.
+    """
+
+    score_buffer = _attach(score_spec)
+
+    counts = []
+    for row, rows in hits:
+        if len(rows) == 0:
+            counts.append(np.empty(0, dtype=np.int64))
+            continue
+
+        scores = score_buffer[row, start:stop]
+        hit_scores = score_buffer[row, rows]
+        below = np.flatnonzero(scores <= hit_scores.max())
+        order = below[np.argsort(scores[below], kind='stable')]
+        sorted_scores = scores[order]
+
+        lower = np.searchsorted(sorted_scores, hit_scores, side='left')
+        upper = np.searchsorted(sorted_scores, hit_scores, side='right')
+        tied = np.array([np.searchsorted(order[low:high], hit - start) for low, high, hit in zip(lower, upper, rows)], dtype=np.int64)
+        counts.append(lower + tied)
+    return counts
+
+
+
+class ScreeningPool:
+    """
+    A process pool that screens queries against one shared-memory background.
+
+    The pool can be reused across many calls so the background is copied into
+    shared memory and workers are started only once.
+
+    Attributes:
+        background (xrBackground): The background being screened (a single length bucket).
+        workers (int): The number of worker processes.
+        shards (int): The number of background shards scored per round.
+    """
+
+    def __init__(self, background:xrBackground, workers:int = None, shards_per_worker:int = 4):
+        self.background = background
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.shards = max(1, min(len(background), self.workers * shards_per_worker))
+
+        # Memory-mapped backgrounds are mapped by the workers directly, others are copied once
+        if isinstance(background.encoded, np.memmap) and background.encoded.filename and background.encoded.dtype == np.uint8:
+            self._shared = _MappedArray(background.encoded)
+        else:
+            self._shared = _SharedArray(background.encoded.shape, 'u1', source=background.encoded)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self) -> 'ScreeningPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self):
+        return f"ScreeningPool(allele={self.background.allele}, workers={self.workers}, shards={self.shards})"
+
+    def close(self) -> None:
+        """Shuts the workers down and frees the shared background."""
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._shared.release()
+
+    def compose_many(self, queries:List[str], position_weight:List[float] = None, block_size:int = _SCORING_BLOCK_SIZE,
+                     long_form:bool = False, top_k:int = None, max_score:float = None, max_mismatches:int = None,
+                     substitution:Substitution = None, null:Any = 'normal') -> Union[List[xrResult], xrResult]:
+        """
+        Parallel counterpart of cross_compose_many, with identical arguments and results.
+
+        :param queries: A list of query peptides, of the background peptide length.
+        :param position_weight: A list of position weights (optional).
+        :param block_size: Maximum number of query-subject pairs scored per block in each worker.
+        :param long_form: Return a single xrResult with all queries stacked instead of one per query.
+        :param top_k: Report at most this many of the most related peptides per query (optional).
+        :param max_score: Report peptides with a relatedness score at or below this value (optional).
+        :param max_mismatches: Report peptides with at most this many mismatches (optional).
+        :param substitution: A substitution scheme used for scoring (optional).
+        :param null: 'normal', 'empirical' or an EmpiricalNull, see cross_compose (optional).
+        :return: A list of xrResult objects in query order, or one long-form xrResult.
+        """
+
+        length = self.background.encoded.shape[1]
+        query_numeric = encode_peptides(queries, length=length)
+        _internal_checking_selection(top_k)
+        position_weight = _internal_checking_weight(position_weight, length)
+        null = _internal_resolve_null(null, self.background, length, position_weight, substitution)
+        substitution_table = None if substitution is None else substitution_score_table(substitution, position_weight, length)
+
+        selection = None
+        if top_k is not None or max_score is not None or max_mismatches is not None:
+            selection = {'top_k': top_k, 'max_score': max_score, 'max_mismatches': max_mismatches}
+
+        size = len(self.background)
+        step = max(1, min(len(queries), _SHARED_BUFFER_PAIRS // max(1, size)))
+        bounds = np.linspace(0, size, self.shards + 1).astype(np.int64)
+        shards = [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+        score_buffer = _SharedArray((step, size), 'f8')
+        positive_buffer = _SharedArray((step, size), 'i1')
+        results: List[xrResult] = []
+        try:
+            for offset in range(0, len(queries), step):
+                group = query_numeric[offset:offset + step]
+                with stage('scoring', len(group) * size):
+                    futures = [
+                        self._executor.submit(_score_shard, self._shared.spec, score_buffer.spec, positive_buffer.spec, group,
+                                              start, stop, position_weight, block_size, selection, substitution_table)
+                        for start, stop in shards
+                    ]
+                    shard_results = [future.result() for future in futures]
+                results.extend(self._merge(queries[offset:offset + step], shards, shard_results, score_buffer, positive_buffer, position_weight, selection, null))
+        finally:
+            score_buffer.release()
+            positive_buffer.release()
+
+        if not long_form:
+            return results
+
+        return xrResult.concat(results, query=list(queries), allele=self.background.allele, position_weight=position_weight)
+
+    def _merge(self, queries:List[str], shards:List[Tuple[int, int]], shard_results:list, score_buffer:_SharedArray,
+               positive_buffer:_SharedArray, position_weight:List[float], selection:Optional[Dict[str, float]],
+               null:Any = None) -> List[xrResult]:
+        """Merges per-shard summaries and candidates into one xrResult per query."""
+
+        length = self.background.encoded.shape[1]
+        merged = []
+        for index, query in enumerate(queries):
+            summary = (0, 0.0, 0.0)
+            for shard in shard_results:
+                summary = _internal_merge_summary(summary, shard[index][0])
+
+            scores = {
+                'relatedness_score': score_buffer.array[index],
+                'num_positive': positive_buffer.array[index]
+            }
+
+            rows = None
+            if selection is not None:
+                # The best hits overall are always among the best hits of their own shard, an empty
+                # background having no shard at all
+                candidates = np.sort(np.concatenate([shard[index][1] for shard in shard_results] or [np.empty(0, dtype=np.int64)]))
+                candidate_scores = {
+                    'relatedness_score': scores['relatedness_score'][candidates],
+                    'num_negative': length - scores['num_positive'][candidates].astype(np.int64)
+                }
+                rows = candidates[_internal_select_hits(candidate_scores, **selection)]
+            merged.append((query, scores, rows, summary))
+
+        ranks = [None] * len(merged)
+        if selection is not None:
+            hits = [(index, rows) for index, (_, _, rows, _) in enumerate(merged)]
+            futures = [self._executor.submit(_rank_shard, score_buffer.spec, start, stop, hits) for start, stop in shards]
+            counts = [future.result() for future in futures]
+            ranks = [sum((shard[index] for shard in counts), np.ones(len(rows), dtype=np.int64)) for index, rows in hits]
+
+        results = []
+        for (query, scores, rows, summary), query_ranks in zip(merged, ranks):
+            scores['num_negative'] = (length - scores['num_positive']).astype(np.int8)
+            results.append(_internal_build_result(query, self.background, scores, position_weight,
+                                                  rows=rows, ranks=query_ranks, summary=summary, null=null))
+        return results
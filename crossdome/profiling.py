@@ -0,0 +1,222 @@
+# Import needed libraries
+import contextvars
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+"""
+Optional per-stage instrumentation of CrossDome runs.
+
+Instrumented code wraps each stage (validation, encoding, scoring, statistics,
+DataFrame construction, export, file I/O) in `with stage(name, items):`, items
+counted later being added with `.add(items)` on the entered stage. When no
+Profiler is active, stage returns a shared no-op context, so the cost is one
+context variable lookup per stage rather than per peptide. Activate a Profiler
+with `with profiling() as profiler:` to record wall time, item counts and,
+optionally, peak traced allocations per stage, or pass profile=True to
+cross_compose to get the breakdown in result.analysis['profile'].
+
+Stage times are inclusive: a stage running inside another (e.g. DataFrame
+construction during export) is counted in both.
+"""
+
+# The profiler recording the stages of the current thread or task
+_ACTIVE:contextvars.ContextVar = contextvars.ContextVar("crossdome_profiler", default=None)
+
+# A metrics sink receives the stage name and the record of every finished stage
+MetricsSink = Callable[[str, Dict[str, Any]], None]
+
+
+
+class _NoStage:
+    """The no-op stage returned while profiling is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoStage':
+        return self
+
+    def add(self, items:int) -> None:
+        return None
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NO_STAGE = _NoStage()
+
+
+
+class Profiler:
+    """
+    Accumulates wall time, item counts and peak allocations per stage.
+
+    Attributes:
+        stages (Dict[str, Dict[str, float]]): Per stage 'seconds', 'calls', 'items' and 'peak_bytes', in first-seen order.
+        memory (bool): Whether peak allocations are traced (tracemalloc, noticeably slower).
+        sink (MetricsSink): Called with (name, record) after every stage (optional).
+    """
+
+    def __init__(self, memory:bool = False, sink:MetricsSink = None):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.memory = memory
+        self.sink = sink
+        self._open: List[List[int]] = []
+        self._depth = 0
+        self._started_tracing = False
+
+    def __repr__(self):
+        return f"Profiler(stages={list(self.stages)}, memory={self.memory})"
+
+    def stage(self, name:str, items:int = 0) -> '_Stage':
+        """
+        Returns a context manager timing one run of a stage.
+
+        :param name: The stage name, e.g. 'scoring'.
+        :param items: The number of items processed (peptides, pairs or rows).
+        :return: A context manager.
+        """
+
+        return _Stage(self, name, items)
+
+    def start(self) -> None:
+        """Starts memory tracing when requested and not already running."""
+
+        self._depth += 1
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self) -> None:
+        """Stops the memory tracing started by this profiler, once its outermost activation ends."""
+
+        self._depth -= 1
+        if self._started_tracing and self._depth == 0:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def record(self, name:str, seconds:float, items:int, peak_bytes:Optional[int]) -> None:
+        """
+        Adds one stage run to the totals and forwards it to the sink.
+
+        :param name: The stage name.
+        :param seconds: The wall time of the run.
+        :param items: The number of items processed.
+        :param peak_bytes: The peak traced allocation of the run, None when not traced.
+        """
+
+        totals = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'items': 0, 'peak_bytes': None})
+        totals['seconds'] += seconds
+        totals['calls'] += 1
+        totals['items'] += int(items)
+        if peak_bytes is not None:
+            totals['peak_bytes'] = max(totals['peak_bytes'] or 0, peak_bytes)
+        if self.sink is not None:
+            self.sink(name, {'seconds': seconds, 'items': int(items), 'peak_bytes': peak_bytes})
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns a copy of the per-stage totals, with the item throughput of each stage.
+
+        :return: A dictionary of stage records.
+        """
+
+        return {
+            name: {**totals, 'items_per_second': totals['items'] / totals['seconds'] if totals['seconds'] > 0 else None}
+            for name, totals in self.stages.items()
+        }
+
+
+
+class _Stage:
+    """Times one run of a stage, sharing tracemalloc peaks correctly with enclosing stages."""
+
+    __slots__ = ('profiler', 'name', 'items', 'started', 'frame')
+
+    def __init__(self, profiler:Profiler, name:str, items:int):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+
+    def __enter__(self) -> '_Stage':
+        if tracemalloc.is_tracing() and self.profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.profiler._open:
+                # Keep the enclosing stage's peak before resetting it for this one
+                parent = self.profiler._open[-1]
+                parent[1] = max(parent[1], peak)
+            tracemalloc.reset_peak()
+            self.frame = [current, current]
+            self.profiler._open.append(self.frame)
+        else:
+            self.frame = None
+        self.started = time.perf_counter()
+        return self
+
+    def add(self, items:int) -> None:
+        """Counts items only known once the stage has run, e.g. rows read from a file."""
+
+        self.items += items
+
+    def __exit__(self, *exc_info) -> None:
+        seconds = time.perf_counter() - self.started
+        peak_bytes = None
+        if self.frame is not None:
+            peak = max(self.frame[1], tracemalloc.get_traced_memory()[1])
+            peak_bytes = peak - self.frame[0]
+            self.profiler._open.pop()
+            if self.profiler._open:
+                parent = self.profiler._open[-1]
+                parent[1] = max(parent[1], peak)
+        self.profiler.record(self.name, seconds, self.items, peak_bytes)
+
+
+
+def stage(name:str, items:int = 0) -> Any:
+    """
+    Times a stage on the active profiler, a no-op when profiling is disabled.
+
+    :param name: The stage name.
+    :param items: The number of items processed.
+    :return: A context manager.
+    """
+
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        return _NO_STAGE
+    return profiler.stage(name, items)
+
+
+
+def active_profiler() -> Optional[Profiler]:
+    """Returns the active profiler, or None when profiling is disabled."""
+
+    return _ACTIVE.get()
+
+
+
+class profiling:
+    """
+    Activates a profiler for the enclosed code.
+
+    with profiling(memory=True) as profiler:
+        cross_write(cross_compose(query, background), "hits.csv")
+    print(profiler.report())
+
+    :param profiler: A Profiler to record into, True or None for a new one.
+    :param memory: Trace peak allocations (for a new profiler).
+    :param sink: A metrics sink (for a new profiler).
+    """
+
+    def __init__(self, profiler:Any = None, memory:bool = False, sink:MetricsSink = None):
+        self.profiler = profiler if isinstance(profiler, Profiler) else Profiler(memory=memory, sink=sink)
+        self._token = None
+
+    def __enter__(self) -> Profiler:
+        self.profiler.start()
+        self._token = _ACTIVE.set(self.profiler)
+        return self.profiler
+
+    def __exit__(self, *exc_info) -> None:
+        _ACTIVE.reset(self._token)
+        self.profiler.stop()
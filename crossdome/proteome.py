@@ -0,0 +1,246 @@
+# Import needed libraries
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Import core objects and encoding helpers
+from crossdome.core_classes import xrBackground, xrResult, _checking_lengths
+from crossdome.encoding import _BYTE_TO_CODE, INVALID_RESIDUE, encode_peptides, pack_peptides
+from crossdome.profiling import stage
+from crossdome.utils import read_fasta
+
+"""
+Proteome digestion into backgrounds with k-mer provenance.
+
+Protein records are streamed and encoded in chunks of about chunk_size residues,
+separated by an invalid residue so no window spans two proteins. Every window of
+each requested length without a non-standard residue is packed into an integer key
+(crossdome.encoding.pack_peptides) together with its position in the concatenated
+proteome. A stable sort of the keys then gives the deduplicated k-mers, which become
+the background rows in key order, and the occurrences of each k-mer, stored as
+uint32 positions in CSR layout. A protein and offset are recovered from a position
+by a binary search over the protein start positions, so the index costs 4 bytes per
+occurrence plus 8 bytes per distinct k-mer, and no peptide string is ever built.
+"""
+
+# Residues encoded per digestion chunk
+_DIGEST_CHUNK_SIZE:int = 1 << 22
+
+
+
+def _unpack_keys(keys:np.ndarray, length:int) -> np.ndarray:
+    """Unpacks keys of pack_peptides back into a (N, length) residue code matrix."""
+
+    shifts = np.uint64(5) * np.arange(length - 1, -1, -1, dtype=np.uint64)
+    return ((keys[:, None] >> shifts) & np.uint64(31)).astype(np.uint8)
+
+
+
+def _chunks(records:Iterable[Tuple[str, str]], chunk_size:int) -> Iterator[Tuple[List[str], np.ndarray, np.ndarray]]:
+    """Groups protein records into encoded chunks, yielding (identifiers, residue codes, protein starts in the chunk)."""
+
+    identifiers, sequences, size = [], [], 0
+    for header, sequence in records:
+        identifiers.append(header.split()[0] if header.strip() else header)
+        sequences.append(sequence)
+        size += len(sequence) + 1
+        if size >= chunk_size:
+            yield identifiers, *_encode_chunk(sequences)
+            identifiers, sequences, size = [], [], 0
+    if sequences:
+        yield identifiers, *_encode_chunk(sequences)
+
+
+
+def _encode_chunk(sequences:List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encodes proteins joined by one separator residue, returning the codes and the start of each protein."""
+
+    raw = np.frombuffer("*".join(sequences).upper().encode("ascii", errors="replace"), dtype=np.uint8)
+    sizes = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+    starts = np.concatenate([[0], np.cumsum(sizes + 1)[:-1]]).astype(np.int64)
+    return _BYTE_TO_CODE[raw], starts
+
+
+
+class ProteomeIndex:
+    """
+    A background of the distinct k-mers of a proteome, with the source proteins of every k-mer.
+
+    Attributes:
+        background (xrBackground): The distinct k-mers, one bucket per length, rows in key order.
+        proteins (List[str]): The protein identifiers, the first word of each FASTA header.
+        protein_starts (np.ndarray): The position of each protein in the concatenated proteome.
+        lengths (List[int]): The k-mer lengths.
+    """
+
+    def __init__(self, background:xrBackground, proteins:List[str], protein_starts:np.ndarray, keys:Dict[int, np.ndarray],
+                 offsets:Dict[int, np.ndarray], positions:Dict[int, np.ndarray]):
+        self.background = background
+        self.proteins = proteins
+        self.protein_starts = protein_starts
+        self.lengths = list(keys)
+        self._keys, self._offsets, self._positions = keys, offsets, positions
+
+    @classmethod
+    def from_sequences(cls, records:Iterable[Tuple[str, str]], lengths:Iterable[int] = (9,), allele:str = "proteome",
+                       chunk_size:int = _DIGEST_CHUNK_SIZE) -> 'ProteomeIndex':
+        """
+        Digests protein sequences into all their k-mers of the given lengths.
+
+        K-mers containing a residue outside of the standard amino acids are skipped.
+
+        :param records: An iterable of (header, sequence) tuples, e.g. from crossdome.utils.read_fasta.
+        :param lengths: The k-mer lengths (8 to 11).
+        :param allele: The allele of the background.
+        :param chunk_size: The number of residues encoded per chunk.
+        :return: A ProteomeIndex.
+        :raises ValueError: If a length is not supported or no k-mer is found.
+        """
+
+        lengths = _checking_lengths(lengths)
+        proteins: List[str] = []
+        starts: List[np.ndarray] = []
+        parts: Dict[int, List[Tuple[np.ndarray, np.ndarray]]] = {length: [] for length in lengths}
+        origin = 0
+
+        with stage('digestion') as timing:
+            for identifiers, codes, chunk_starts in _chunks(records, chunk_size):
+                proteins.extend(identifiers)
+                starts.append(chunk_starts + origin)
+                invalid = np.concatenate([[0], np.cumsum(codes == INVALID_RESIDUE, dtype=np.int64)])
+                for length in lengths:
+                    if len(codes) < length:
+                        continue
+                    valid = np.flatnonzero(invalid[length:] == invalid[:-length])
+                    keys = pack_peptides(sliding_window_view(codes, length)[valid])
+                    parts[length].append((keys, valid + origin))
+                # The separator after the last protein keeps positions unique across chunks
+                origin += len(codes) + 1
+                timing.add(len(codes))
+
+        protein_starts = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+        position_type = np.uint32 if origin <= np.iinfo(np.uint32).max else np.int64
+        buckets, index_keys, index_offsets, index_positions = {}, {}, {}, {}
+        with stage('kmer_index'):
+            for length, chunks in parts.items():
+                if not chunks:
+                    continue
+                keys = np.concatenate([chunk[0] for chunk in chunks])
+                positions = np.concatenate([chunk[1] for chunk in chunks]).astype(position_type)
+                parts[length] = None
+
+                # A stable sort keeps the occurrences of each k-mer in proteome order
+                order = np.argsort(keys, kind='stable')
+                keys, positions = keys[order], positions[order]
+                del order
+                first = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+                index_keys[length] = keys[first]
+                index_offsets[length] = np.append(first, len(keys)).astype(np.int64)
+                index_positions[length] = positions
+                buckets[length] = _unpack_keys(index_keys[length], length)
+
+        if not buckets:
+            raise ValueError(f"No k-mer of length {', '.join(map(str, lengths))} found in the proteome.")
+        background = xrBackground.from_encoded(allele, buckets, validate=False)
+        return cls(background, proteins, protein_starts, index_keys, index_offsets, index_positions)
+
+    @classmethod
+    def from_fasta(cls, file_path:str, lengths:Iterable[int] = (9,), allele:str = "proteome",
+                   chunk_size:int = _DIGEST_CHUNK_SIZE) -> 'ProteomeIndex':
+        """
+        Digests a (possibly compressed) proteome FASTA file into all its k-mers.
+
+        :param file_path: The file path of the FASTA file.
+        :param lengths: The k-mer lengths (8 to 11).
+        :param allele: The allele of the background.
+        :param chunk_size: The number of residues encoded per chunk.
+        :return: A ProteomeIndex.
+        """
+
+        return cls.from_sequences(read_fasta(file_path), lengths=lengths, allele=allele, chunk_size=chunk_size)
+
+    def __len__(self) -> int:
+        return len(self.background)
+
+    def __repr__(self):
+        return f"ProteomeIndex(proteins_count={len(self.proteins)}, kmers_count={len(self)}, lengths={self.lengths})"
+
+    def _rows(self, peptides:Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the length and the k-mer row of each peptide within its length, -1 when not in the proteome."""
+
+        peptides = list(peptides)
+        sizes = np.fromiter(map(len, peptides), dtype=np.int64, count=len(peptides))
+        rows = np.full(len(peptides), -1, dtype=np.int64)
+        for length in self.lengths:
+            selected = np.flatnonzero(sizes == length)
+            if not selected.size:
+                continue
+            keys = pack_peptides(encode_peptides([peptides[position] for position in selected], length=length))
+            found = np.minimum(np.searchsorted(self._keys[length], keys), len(self._keys[length]) - 1)
+            rows[selected] = np.where(self._keys[length][found] == keys, found, -1)
+        return sizes, rows
+
+    def occurrences(self, peptides:Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Finds every occurrence of peptides in the proteome.
+
+        :param peptides: The peptides.
+        :return: Three arrays with one entry per occurrence: the index of the peptide, the index of its
+                 protein in proteins and the 0-based offset of the peptide in the protein.
+        :raises ValueError: If a peptide contains non-standard amino acids.
+        """
+
+        sizes, rows = self._rows(peptides)
+        owners, positions = [], []
+        for length in self.lengths:
+            selected = np.flatnonzero((sizes == length) & (rows >= 0))
+            starts, stops = self._offsets[length][rows[selected]], self._offsets[length][rows[selected] + 1]
+            counts = stops - starts
+            # Gather the CSR ranges of all selected k-mers at once
+            gather = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts) + np.arange(counts.sum())
+            owners.append(np.repeat(selected, counts))
+            positions.append(self._positions[length][gather].astype(np.int64))
+
+        owners = np.concatenate(owners or [np.empty(0, dtype=np.int64)])
+        positions = np.concatenate(positions or [np.empty(0, dtype=np.int64)])
+        order = np.argsort(owners, kind='stable')
+        owners, positions = owners[order], positions[order]
+        proteins = np.searchsorted(self.protein_starts, positions, side='right') - 1
+        return owners, proteins, positions - self.protein_starts[proteins]
+
+    def sources(self, peptides:Sequence[str]) -> pd.DataFrame:
+        """
+        Lists the source proteins of peptides.
+
+        :param peptides: The peptides.
+        :return: A DataFrame with one row per occurrence: peptide, protein and offset (0-based).
+        """
+
+        peptides = list(peptides)
+        owners, proteins, offsets = self.occurrences(peptides)
+        return pd.DataFrame({
+            'peptide': np.asarray(peptides, dtype=object)[owners],
+            'protein': np.asarray(self.proteins, dtype=object)[proteins],
+            'offset': offsets
+        })
+
+    def annotate(self, result:xrResult, column:str = 'source_proteins') -> xrResult:
+        """
+        Traces every hit of a result to its source proteins.
+
+        :param result: An xrResult, e.g. from cross_compose against this index's background.
+        :param column: The name of the column of ';'-separated protein identifiers.
+        :return: A new xrResult with the protein column and the number of distinct source proteins in 'source_count'.
+        """
+
+        with stage('provenance', len(result)):
+            owners, proteins, _ = self.occurrences(result.column('subject'))
+            pairs = pd.DataFrame({'hit': owners, 'protein': np.asarray(self.proteins, dtype=object)[proteins]}).drop_duplicates()
+            grouped = pairs.groupby('hit', sort=False)['protein']
+            labels = np.full(len(result), None, dtype=object)
+            counts = np.zeros(len(result), dtype=np.int64)
+            joined = grouped.agg(";".join)
+            labels[joined.index.to_numpy()] = joined.to_numpy(dtype=object)
+            counts[joined.index.to_numpy()] = grouped.size().reindex(joined.index).to_numpy()
+            return result.mutate(**{column: labels, 'source_count': counts})
@@ -1,23 +1,164 @@
 # File library imports, for dependencies 
 import numpy as np 
-from typing import List 
+from typing import Any, List, Sequence, Tuple, Union 
+
+from crossdome.core_classes import xrBackground
+from crossdome.encoding import _BYTE_TO_CODE, INVALID_RESIDUE, PEPTIDE_LENGTHS
+
+# Anything accepted as a bulk peptide input: strings, an xrBackground or an encoded (N, L) matrix
+Peptides = Union[str, Sequence[str], xrBackground, np.ndarray]
+
+# Number of query-subject pairs compared per block in the bulk functions
+_QUANT_BLOCK_SIZE:int = 1 << 22
+
+
+
+def _residue_matrix(peptides:Peptides, length:int = None) -> Tuple[np.ndarray, bool]:
+    """
+    Converts a bulk peptide input to a residue matrix.
+
+    Strings are kept as Unicode code points so any character compares exactly like
+    the per-pair string functions; backgrounds and arrays are used as residue codes.
+
+    :param peptides: A peptide, a list of peptides, an xrBackground or an encoded matrix.
+    :param length: The expected peptide length (defaults to the length of the first peptide),
+                   selects the length bucket of a mixed-length xrBackground.
+    :return: The (N, length) matrix and whether it holds residue codes (True) or code points (False).
+    :raises ValueError: If the length is not supported or a peptide is not of the expected length.
+    """
+
+    if isinstance(peptides, xrBackground):
+        return (peptides.encoded if length is None else peptides.bucket(length).encoded), True
+    if isinstance(peptides, np.ndarray) and peptides.dtype == np.uint8:
+        return np.atleast_2d(peptides), True
+
+    peptides = [peptides] if isinstance(peptides, str) else list(peptides)
+    if length is None:
+        length = len(peptides[0]) if peptides else 9
+    if length not in PEPTIDE_LENGTHS:
+        raise ValueError(f"CrossDome supports peptides of length {PEPTIDE_LENGTHS.start} to {PEPTIDE_LENGTHS.stop - 1}, "
+                         f"got size {length} instead.")
+    invalid = [peptide for peptide in peptides if len(peptide) != length]
+    if invalid:
+        raise ValueError(f"Both query and candidate peptides must be {length}-mers, got {invalid[0]}.")
+
+    if not peptides:
+        return np.empty((0, length), dtype=np.uint32), False
+    return np.array(peptides, dtype=f"U{length}").view(np.uint32).reshape(len(peptides), length), False
+
+
+
+def _common_residues(queries:Peptides, background:Peptides) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Brings queries and background to the same residue representation.
+
+    :param queries: The query peptides.
+    :param background: The background peptides.
+    :return: The query and background residue matrices, comparable element-wise.
+    """
+
+    query_residues, query_codes = _residue_matrix(queries)
+    subject_residues, subject_codes = _residue_matrix(background, length=query_residues.shape[1])
+
+    # Map code points to residue codes when the other side is encoded, unknown characters never match
+    if query_codes and not subject_codes:
+        subject_residues = np.where(subject_residues < 256, _BYTE_TO_CODE[np.minimum(subject_residues, 255)], INVALID_RESIDUE).astype(np.uint8)
+    elif subject_codes and not query_codes:
+        query_residues = np.where(query_residues < 256, _BYTE_TO_CODE[np.minimum(query_residues, 255)], INVALID_RESIDUE).astype(np.uint8)
+
+    return query_residues, subject_residues
+
+
+
+def _internal_mismatch_counts(query_residues:np.ndarray, subject_residues:np.ndarray) -> np.ndarray:
+    """
+    Counts the mismatches between two prepared residue matrices (see _common_residues).
+
+    :param query_residues: The (Q, L) query residue matrix.
+    :param subject_residues: The (N, L) background residue matrix, in the same representation.
+    :return: A (Q, N) int8 matrix of mismatch counts.
+    """
+
+    mismatches = np.zeros((query_residues.shape[0], subject_residues.shape[0]), dtype=np.int8)
+
+    # Positions are compared column-wise so temporaries stay (Q, block)
+    step = max(1, _QUANT_BLOCK_SIZE // max(1, query_residues.shape[0]))
+    for start in range(0, subject_residues.shape[0], step):
+        block = subject_residues[start:start + step]
+        for position in range(query_residues.shape[1]):
+            mismatches[:, start:start + step] += block[:, position][None, :] != query_residues[:, position][:, None]
+    return mismatches
+
+
+
+def mismatch_matrix(queries:Peptides, background:Peptides) -> np.ndarray:
+    """
+    Computes the number of mismatches between every query and every background peptide.
+
+    :param queries: A query peptide, a list of queries, or an encoded matrix.
+    :param background: A list of peptides, an xrBackground or an encoded matrix.
+    :return: A (Q, N) int8 matrix of mismatch counts.
+    """
+
+    return _internal_mismatch_counts(*_common_residues(queries, background))
+
+
+
+def similarity_matrix(queries:Peptides, background:Peptides) -> np.ndarray:
+    """
+    Computes the similarity score between every query and every background peptide.
+
+    :param queries: A query peptide, a list of queries, or an encoded matrix.
+    :param background: A list of peptides, an xrBackground or an encoded matrix.
+    :return: A (Q, N) float matrix of similarity scores (0 to 1).
+    """
+
+    mismatches = mismatch_matrix(queries, background)
+    length = _residue_matrix(queries)[0].shape[1]
+    return (length - mismatches) / length
+
+
+
+def mismatch_histogram(queries:Peptides, background:Peptides) -> np.ndarray:
+    """
+    Counts, for every query, how many background peptides have 0, 1, ..., L mismatches.
+
+    The background is processed in blocks, so memory stays bounded for any background size.
+
+    :param queries: A query peptide, a list of queries, or an encoded matrix.
+    :param background: A list of peptides, an xrBackground or an encoded matrix.
+    :return: A (Q, L + 1) int64 matrix of counts.
+    """
+
+    query_residues, subject_residues = _common_residues(queries, background)
+    queries_count, length = query_residues.shape
+    histogram = np.zeros(queries_count * (length + 1), dtype=np.int64)
+    offsets = (np.arange(queries_count) * (length + 1))[:, None]
+
+    step = max(1, _QUANT_BLOCK_SIZE // max(1, queries_count))
+    for start in range(0, subject_residues.shape[0], step):
+        mismatches = _internal_mismatch_counts(query_residues, subject_residues[start:start + step])
+        histogram += np.bincount((mismatches + offsets).ravel(), minlength=histogram.size)
+    return histogram.reshape(queries_count, length + 1)
+
 
 
 def peptide_similarity(query:str, candidate:str) -> float:
     """
     Computes a similarity score between two peptides based on matching amino acids.
     
-    :param query: The query peptide sequence (9-mer).
-    :param candidate: The candidate peptide sequence (9-mer).
+    :param query: The query peptide sequence (8 to 11 residues).
+    :param candidate: The candidate peptide sequence, of the same length as the query.
     :return: A float representing the similarity score (0 to 1).
     """
     
-    if (len(query) != 9) or (len(candidate) != 9):
+    if (len(query) not in PEPTIDE_LENGTHS) or (len(candidate) != len(query)):
         # Base case 
-        raise ValueError(f"Both query: {query} and candidate: {candidate} peptides must be 9-mers.")
+        raise ValueError(f"Both query: {query} and candidate: {candidate} peptides must be {PEPTIDE_LENGTHS.start} to "
+                         f"{PEPTIDE_LENGTHS.stop - 1}-mers of the same length.")
     
     # Parse matches
-    matches:int = np.sum([q == c for (q, c) in zip(query, candidate)])
+    matches:int = len(query) - peptide_mismatch_count(query, candidate)
     # Return matches
     return matches / len(query)
 
@@ -27,35 +168,36 @@ def peptide_mismatch_count(query:str, candidate:str) -> int:
     """
     Computes the number of mismatches between two peptide sequences.
     
-    :param query: The query peptide sequence (9-mer).
-    :param candidate: The candidate peptide sequence (9-mer).
+    :param query: The query peptide sequence (8 to 11 residues).
+    :param candidate: The candidate peptide sequence, of the same length as the query.
     :return: An integer representing the number of mismatches.
     """
     
-    if (len(query) != 9) or (len(candidate) != 9):
+    if (len(query) not in PEPTIDE_LENGTHS) or (len(candidate) != len(query)):
         # Base case 
-        raise ValueError(f"Both query: {query} and candidate: {candidate} peptides must be 9-mers.")
+        raise ValueError(f"Both query: {query} and candidate: {candidate} peptides must be {PEPTIDE_LENGTHS.start} to "
+                         f"{PEPTIDE_LENGTHS.stop - 1}-mers of the same length.")
     
-    # Parse mismatches
-    mismatches:int = np.sum([q != c for (q, c) in zip(query, candidate)])
+    # Parse mismatches, through the bulk comparison of one query and one candidate
+    mismatches:int = int(_internal_mismatch_counts(*_common_residues(query, [candidate]))[0, 0])
     
     # Return mismatches
     return mismatches
 
 
 
-def overall_similarity(query:str, background:List[str]) -> float:
+def overall_similarity(query:str, background:Peptides) -> float:
     """
     Computes the overall average similarity score between a query peptide
     and a list of background peptides.
     
-    :param query: The query peptide sequence (9-mer).
-    :param background: A list of candidate peptide sequences.
+    :param query: The query peptide sequence (8 to 11 residues).
+    :param background: A list of candidate peptide sequences, an xrBackground or an encoded matrix.
     :return: A float representing the average similarity score.
     """
     
     # Parse similarities
-    similarities:List[float] = [peptide_similarity(query, candidate) for candidate in background]
+    similarities:np.ndarray = similarity_matrix(query, background)[0]
     # Calc avg for similarities
     average_similarity:float = np.mean(similarities)
     
@@ -63,16 +205,25 @@ def overall_similarity(query:str, background:List[str]) -> float:
 
 
 
-def mismatch_distribution(query:str, background:List[str]) -> List[int]:
+def mismatch_distribution(query:str, background:Peptides, index:Any = None, max_mismatches:int = None) -> List[int]:
     """
     Computes the distribution of mismatches between a query peptide and a background of peptides.
     
+    With a SegmentIndex (see crossdome.index) only the background peptides within
+    max_mismatches of the query are visited, in background order.
+    
     :param query: The query peptide sequence.
-    :param background: A list of candidate peptide sequences.
-    :return: A list of integers representing the mismatch counts for each peptide in the background.
+    :param background: A list of candidate peptide sequences, an xrBackground or an encoded matrix (ignored when an index is given).
+    :param index: A SegmentIndex over the background (optional).
+    :param max_mismatches: The mismatch radius used with the index (defaults to the index radius).
+    :return: A list of integers representing the mismatch counts for each (matching) peptide in the background.
     """
     
-    mismatch_counts:List[int] = [peptide_mismatch_count(query, candidate) for candidate in background]
+    if index is not None:
+        _, mismatches = index.search(query, max_mismatches)
+        return mismatches.tolist()
+    
+    mismatch_counts:List[int] = mismatch_matrix(query, background)[0].tolist()
     return mismatch_counts
 
 
@@ -86,9 +237,8 @@ def peptide_distance(query:str, candidate:str) -> float:
     :return: A float representing the weighted distance.
     """
     
-    if len(query) != 9 or len(candidate) != 9:
-        raise ValueError("Both query and candidate peptides must be 9-mers.")
+    if len(query) not in PEPTIDE_LENGTHS or len(candidate) != len(query):
+        raise ValueError(f"Both query and candidate peptides must be {PEPTIDE_LENGTHS.start} to {PEPTIDE_LENGTHS.stop - 1}-mers of the same length.")
     
-    distances:List[float] = [1 if q != c else 0 for q, c in zip(query, candidate)]
-    weighted_distance:float = np.sum(distances) 
+    weighted_distance:float = float(peptide_mismatch_count(query, candidate))
     return weighted_distance
\ No newline at end of file
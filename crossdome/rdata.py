@@ -0,0 +1,341 @@
+# Import needed libraries
+import bz2
+import gzip
+import lzma
+import struct
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+"""
+Native reader for R data files (.rda / .RData) written by save().
+
+Only the parts of the R serialization format needed for datasets are supported:
+atomic vectors, lists, pairlists, symbols, attributes, factors and data frames,
+in XDR (binary) encoding, versions 2 and 3, with gzip, bzip2 or xz compression.
+This is enough to read the bio-database files shipped with the R package
+without requiring an R installation.
+"""
+
+# SEXP type codes
+_NILSXP, _SYMSXP, _LISTSXP, _CLOSXP, _ENVSXP, _PROMSXP, _LANGSXP = 0, 1, 2, 3, 4, 5, 6
+_CHARSXP, _LGLSXP, _INTSXP, _REALSXP, _CPLXSXP, _STRSXP = 9, 10, 13, 14, 15, 16
+_DOTSXP, _VECSXP, _EXPRSXP, _RAWSXP, _S4SXP = 17, 19, 20, 24, 25
+
+# Pseudo types used only in serialized streams
+_REFSXP, _NILVALUE_SXP, _GLOBALENV_SXP, _UNBOUNDVALUE_SXP, _MISSINGARG_SXP, _BASENAMESPACE_SXP = 255, 254, 253, 252, 251, 250
+_NAMESPACESXP, _PACKAGESXP, _PERSISTSXP, _EMPTYENV_SXP, _BASEENV_SXP = 249, 248, 247, 242, 241
+_ATTRLANGSXP, _ATTRLISTSXP, _ALTREP_SXP = 240, 239, 238
+
+# R's integer NA
+_NA_INTEGER:int = -2 ** 31
+
+
+
+class RObject:
+    """
+    A deserialized R object that has no direct Python counterpart.
+
+    Attributes:
+        type (int): The SEXP type code.
+        value (Any): The payload (tag/value pairs, vector items, ...).
+        attributes (dict): The R attributes of the object.
+    """
+
+    def __init__(self, type:int, value:Any = None, attributes:Optional[Dict[str, Any]] = None):
+        self.type = type
+        self.value = value
+        self.attributes = attributes or {}
+
+    def __repr__(self):
+        return f"RObject(type={self.type}, attributes={list(self.attributes)})"
+
+
+
+class RVector:
+    """
+    An R vector with its attributes, before conversion to Python objects.
+
+    Attributes:
+        type (int): The SEXP type code.
+        data (Any): A NumPy array for atomic vectors, a list for strings and lists.
+        attributes (dict): The R attributes of the vector.
+    """
+
+    def __init__(self, type:int, data:Any, attributes:Optional[Dict[str, Any]] = None):
+        self.type = type
+        self.data = data
+        self.attributes = attributes or {}
+
+
+
+class _Reader:
+    """Sequential XDR reader over a decompressed R serialization stream."""
+
+    def __init__(self, buffer:bytes):
+        self.buffer = buffer
+        self.offset = 0
+        self.references:List[Any] = []
+
+    def read_int(self) -> int:
+        value = struct.unpack_from(">i", self.buffer, self.offset)[0]
+        self.offset += 4
+        return value
+
+    def read_array(self, dtype:str, count:int) -> np.ndarray:
+        array = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=self.offset)
+        self.offset += count * array.itemsize
+        return array
+
+    def read_bytes(self, count:int) -> bytes:
+        value = self.buffer[self.offset:self.offset + count]
+        self.offset += count
+        return value
+
+    def read_length(self) -> int:
+        length = self.read_int()
+        if length == -1:
+            upper, lower = self.read_int(), self.read_int()
+            length = (upper << 32) + (lower & 0xFFFFFFFF)
+        return length
+
+    def read_attributes(self, has_attributes:bool) -> Dict[str, Any]:
+        if not has_attributes:
+            return {}
+        attributes = self.read_item()
+        return attributes.value if isinstance(attributes, RObject) else {}
+
+    def read_item(self) -> Any:
+        flags = self.read_int()
+        type = flags & 0xFF
+        has_attributes = bool(flags & (1 << 9))
+        has_tag = bool(flags & (1 << 10))
+
+        if type == _NILVALUE_SXP:
+            return None
+        if type == _REFSXP:
+            index = flags >> 8
+            return self.references[(index or self.read_int()) - 1]
+        if type in (_GLOBALENV_SXP, _EMPTYENV_SXP, _BASEENV_SXP, _BASENAMESPACE_SXP, _UNBOUNDVALUE_SXP, _MISSINGARG_SXP):
+            return RObject(type)
+        if type in (_NAMESPACESXP, _PACKAGESXP, _PERSISTSXP):
+            # Stored as a string vector preceded by a zero
+            self.read_int()
+            info = [self.read_item() for _ in range(self.read_int())]
+            value = RObject(type, info)
+            self.references.append(value)
+            return value
+
+        if type == _SYMSXP:
+            value = self.read_item()
+            self.references.append(value)
+            return value
+
+        if type in (_LISTSXP, _LANGSXP, _CLOSXP, _PROMSXP, _DOTSXP, _ATTRLANGSXP, _ATTRLISTSXP):
+            # Pairlists are read iteratively, R chains them through the CDR
+            pairs:Dict[str, Any] = {}
+            attributes = {}
+            position = 0
+            while True:
+                if has_attributes:
+                    attributes = self.read_attributes(True)
+                tag = self.read_item() if has_tag else None
+                pairs[tag if isinstance(tag, str) else str(position)] = self.read_item()
+                position += 1
+
+                flags = self.read_int()
+                type = flags & 0xFF
+                if type not in (_LISTSXP, _LANGSXP, _ATTRLISTSXP, _ATTRLANGSXP):
+                    self.offset -= 4
+                    self.read_item()
+                    break
+                has_attributes = bool(flags & (1 << 9))
+                has_tag = bool(flags & (1 << 10))
+            return RObject(_LISTSXP, pairs, attributes)
+
+        if type == _ENVSXP:
+            environment = RObject(_ENVSXP)
+            self.references.append(environment)
+            self.read_int()
+            enclosure, frame, table, attributes = self.read_item(), self.read_item(), self.read_item(), self.read_item()
+            environment.value = {'enclosure': enclosure, 'frame': frame, 'table': table}
+            environment.attributes = attributes.value if isinstance(attributes, RObject) else {}
+            return environment
+
+        if type == _CHARSXP:
+            length = self.read_int()
+            if length == -1:
+                return None
+            encoding = 'latin-1' if flags & (1 << 14) else 'utf-8'
+            return self.read_bytes(length).decode(encoding, errors='replace')
+
+        if type in (_LGLSXP, _INTSXP):
+            data = self.read_array(">i4", self.read_length())
+            return RVector(type, data, self.read_attributes(has_attributes))
+        if type == _REALSXP:
+            data = self.read_array(">f8", self.read_length())
+            return RVector(type, data, self.read_attributes(has_attributes))
+        if type == _CPLXSXP:
+            data = self.read_array(">f8", 2 * self.read_length())
+            return RVector(type, data[0::2] + 1j * data[1::2], self.read_attributes(has_attributes))
+        if type == _RAWSXP:
+            data = np.frombuffer(self.read_bytes(self.read_length()), dtype=np.uint8)
+            return RVector(type, data, self.read_attributes(has_attributes))
+        if type == _STRSXP:
+            data = [self.read_item() for _ in range(self.read_length())]
+            return RVector(type, data, self.read_attributes(has_attributes))
+        if type in (_VECSXP, _EXPRSXP):
+            data = [self.read_item() for _ in range(self.read_length())]
+            return RVector(type, data, self.read_attributes(has_attributes))
+        if type == _S4SXP:
+            return RObject(type, None, self.read_attributes(has_attributes))
+
+        if type == _ALTREP_SXP:
+            return self.read_altrep()
+
+        raise ValueError(f"Unsupported R object type {type} at offset {self.offset}.")
+
+    def read_altrep(self) -> Any:
+        info, state, attributes = self.read_item(), self.read_item(), self.read_item()
+        attributes = attributes.value if isinstance(attributes, RObject) else {}
+        name = list(info.value.values())[0] if isinstance(info, RObject) else None
+
+        if name in ("compact_intseq", "compact_realseq"):
+            length, start, step = state.data[:3]
+            data = start + step * np.arange(int(length))
+            return RVector(_INTSXP if name == "compact_intseq" else _REALSXP, data, attributes)
+        if name == "deferred_string":
+            source = list(state.value.values())[0]
+            return RVector(_STRSXP, [None if _is_na(item) else _format_number(item) for item in source.data], attributes)
+        if name and name.startswith("wrap_"):
+            wrapped = state.data[0]
+            wrapped.attributes = attributes or wrapped.attributes
+            return wrapped
+        raise ValueError(f"Unsupported ALTREP class {name}.")
+
+
+
+def _is_na (value:Any) -> bool:
+    return value == _NA_INTEGER or (isinstance(value, float) and np.isnan(value))
+
+
+
+def _format_number (value:Any) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+
+def _names (attributes:Dict[str, Any]) -> Optional[List[str]]:
+    names = attributes.get("names")
+    return names.data if isinstance(names, RVector) else None
+
+
+
+def _classes (attributes:Dict[str, Any]) -> List[str]:
+    classes = attributes.get("class")
+    return classes.data if isinstance(classes, RVector) else []
+
+
+
+def _convert_vector (vector:RVector) -> Any:
+    """
+    Converts an atomic R vector to a NumPy array, a pandas Categorical or a list.
+
+    :param vector: The R vector.
+    :return: The converted Python object.
+    """
+
+    if vector.type == _STRSXP:
+        return np.array(vector.data, dtype=object)
+
+    if "factor" in _classes(vector.attributes):
+        levels = vector.attributes["levels"].data
+        codes = vector.data.astype(np.int64) - 1
+        codes[vector.data == _NA_INTEGER] = -1
+        return pd.Categorical.from_codes(codes, categories=levels, ordered="ordered" in _classes(vector.attributes))
+
+    if vector.type == _LGLSXP:
+        if (vector.data == _NA_INTEGER).any():
+            return np.where(vector.data == _NA_INTEGER, None, vector.data.astype(bool)).astype(object)
+        return vector.data.astype(bool)
+
+    if vector.type == _INTSXP:
+        if (vector.data == _NA_INTEGER).any():
+            return np.where(vector.data == _NA_INTEGER, np.nan, vector.data.astype(np.float64))
+        return vector.data.astype(np.int32)
+
+    if vector.type == _REALSXP:
+        return vector.data.astype(np.float64)
+
+    return np.array(vector.data)
+
+
+
+def convert_r_object (value:Any) -> Any:
+    """
+    Converts a deserialized R object to its natural Python counterpart.
+
+    Data frames become pandas DataFrames, named lists become dictionaries and
+    atomic vectors become NumPy arrays (or Categoricals for factors).
+
+    :param value: The deserialized R object.
+    :return: The converted Python object.
+    """
+
+    if not isinstance(value, RVector):
+        return value
+
+    if value.type in (_VECSXP, _EXPRSXP):
+        names = _names(value.attributes)
+        if "data.frame" in _classes(value.attributes):
+            columns = {name: convert_r_object(column) for name, column in zip(names, value.data)}
+            dataframe = pd.DataFrame(columns)
+            row_names = value.attributes.get("row.names")
+            if isinstance(row_names, RVector) and row_names.type == _STRSXP:
+                dataframe.index = row_names.data
+            return dataframe
+        items = [convert_r_object(item) for item in value.data]
+        return dict(zip(names, items)) if names else items
+
+    return _convert_vector(value)
+
+
+
+def read_rdata (file_path:str) -> Dict[str, Any]:
+    """
+    Reads every object saved in an R data file.
+
+    :param file_path: The file path of the .rda / .RData file.
+    :return: A dictionary mapping object names to converted Python objects.
+    :raises ValueError: If the file is not an XDR R data file of a supported version.
+    """
+
+    with open(file_path, "rb") as handle:
+        raw = handle.read()
+
+    if raw[:2] == b"\x1f\x8b":
+        raw = gzip.decompress(raw)
+    elif raw[:3] == b"BZh":
+        raw = bz2.decompress(raw)
+    elif raw[:6] == b"\xfd7zXZ\x00":
+        raw = lzma.decompress(raw)
+
+    if raw[:5] not in (b"RDX2\n", b"RDX3\n"):
+        raise ValueError(f"File {file_path} is not an R data file.")
+    if raw[5:7] != b"X\n":
+        raise ValueError(f"File {file_path} is not XDR encoded, only binary R data files are supported.")
+
+    reader = _Reader(raw)
+    reader.offset = 7
+    version = reader.read_int()
+    reader.read_int()
+    reader.read_int()
+    if version == 3:
+        reader.read_bytes(reader.read_int())
+    elif version != 2:
+        raise ValueError(f"Unsupported R serialization version {version}.")
+
+    objects = reader.read_item()
+    if not isinstance(objects, RObject):
+        return {}
+    return {name: convert_r_object(value) for name, value in objects.value.items()}
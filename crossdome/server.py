@@ -0,0 +1,479 @@
+# Import needed libraries
+import argparse
+import asyncio
+import functools
+import io
+import json
+import sys
+import pandas as pd
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+# Import core objects and functions
+from crossdome.core_classes import xrBackground, xrResult
+from crossdome.core_functions import _internal_checking_peptide, cross_compose_many
+from crossdome.export import _require_pyarrow
+
+"""
+A long-lived local scoring service.
+
+The server keeps one xrBackground per allele resident and answers HTTP/1.1
+requests over TCP or a Unix socket. Queries arriving concurrently for the same
+allele, length and options are coalesced into micro-batches: the first query of
+a batch waits at most batch_window seconds for others to join, and a batch is
+scored as soon as it holds max_batch queries. Batches are scored in a thread so
+the event loop keeps accepting requests.
+
+Endpoints:
+    POST /score     {"allele": ..., "queries": [...], "format": "json" | "arrow", options...}
+    GET  /alleles   The resident alleles and their background sizes.
+    GET  /stats     Request, query and batch counters.
+    GET  /health    Liveness check.
+
+Usage:
+    python -m crossdome.server --background hla_a0101.xrbg --port 8765
+"""
+
+# Options accepted with each /score request, and their JSON types
+_SCORE_OPTIONS = {'position_weight': list, 'top_k': int, 'max_score': (int, float), 'max_mismatches': int,
+                  'substitution': str, 'null': str}
+
+# Largest accepted request body
+_MAX_REQUEST_BYTES:int = 16 << 20
+
+_ARROW_CONTENT_TYPE:str = "application/vnd.apache.arrow.stream"
+_HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+                 500: "Internal Server Error"}
+
+
+
+class _RequestError(Exception):
+    """A request the server cannot read, answered with an error status before closing the connection."""
+
+    def __init__(self, status:int, message:str):
+        super().__init__(message)
+        self.status = status
+
+
+
+class _Batch:
+    """Queries waiting to be scored together, with the futures of their requests."""
+
+    __slots__ = ('queries', 'futures', 'timer')
+
+    def __init__(self):
+        self.queries: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+
+def _to_records(result:xrResult) -> List[Dict[str, Any]]:
+    """Converts a result into JSON-safe records, NaN becoming null."""
+
+    frame = result.to_dataframe()
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict(orient='records')
+
+
+
+def _to_arrow(results:List[xrResult]) -> bytes:
+    """Serializes results as one long-form Arrow IPC stream."""
+
+    pyarrow = _require_pyarrow()
+    table = pyarrow.Table.from_pandas(xrResult.concat(results).to_dataframe(), preserve_index=False)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+
+class ScoringServer:
+    """
+    An asyncio scoring server with request micro-batching.
+
+    Attributes:
+        backgrounds (Dict[str, xrBackground]): The resident backgrounds, keyed by allele.
+        batch_window (float): Longest time, in seconds, a query waits for its batch to fill.
+        max_batch (int): Queries per batch at which scoring starts without waiting.
+        stats (Dict[str, int]): Request, query and batch counters.
+    """
+
+    def __init__(self, backgrounds:Union[Dict[str, xrBackground], List[xrBackground]], batch_window:float = 0.005,
+                 max_batch:int = 256):
+        if not isinstance(backgrounds, dict):
+            backgrounds = {background.allele: background for background in backgrounds}
+        if batch_window < 0:
+            raise ValueError(f"batch_window must be non-negative, got {batch_window} instead.")
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be at least 1, got {max_batch} instead.")
+
+        self.backgrounds = backgrounds
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.stats = {'requests': 0, 'queries': 0, 'batches': 0, 'largest_batch': 0, 'errors': 0}
+        self._pending: Dict[tuple, _Batch] = {}
+        # References to the scoring tasks in flight, which the loop only holds weakly
+        self._tasks: Set[asyncio.Task] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def __repr__(self):
+        return f"ScoringServer(alleles={sorted(self.backgrounds)}, batch_window={self.batch_window}, max_batch={self.max_batch})"
+
+    @property
+    def address(self) -> Any:
+        """The (host, port) or socket path the server listens on."""
+
+        if self._server is None:
+            return None
+        return self._server.sockets[0].getsockname()
+
+    async def start(self, host:str = "127.0.0.1", port:int = 0, path:str = None) -> 'ScoringServer':
+        """
+        Starts listening, on a Unix socket when path is given and on TCP otherwise.
+
+        :param host: The TCP host.
+        :param port: The TCP port, 0 picks a free one (see address).
+        :param path: A Unix socket path (optional).
+        :return: The server itself.
+        """
+
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host=host, port=port)
+        return self
+
+    async def serve_forever(self) -> None:
+        """Serves requests until cancelled."""
+
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """Stops listening, flushes the pending batches and waits for the batches being scored."""
+
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def score(self, allele:str, queries:List[str], **options:Any) -> List[xrResult]:
+        """
+        Scores queries through the micro-batcher, e.g. from a handler in the same loop.
+
+        :param allele: The allele of the background to score against.
+        :param queries: The query peptides.
+        :param options: Scoring and selection options of cross_compose_many.
+        :return: One xrResult per query, in order.
+        :raises KeyError: If no background is resident for the allele.
+        :raises ValueError: If a query or an option is invalid.
+        """
+
+        if allele not in self.backgrounds:
+            raise KeyError(f"No background loaded for allele {allele}.")
+        for name in options:
+            if name not in _SCORE_OPTIONS:
+                raise ValueError(f"Unknown option {name}, expected one of {sorted(_SCORE_OPTIONS)}.")
+
+        # Invalid queries fail their own request rather than the batch they would join
+        for query in queries:
+            _internal_checking_peptide(query)
+        options_key = tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in options.items()))
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for query in queries:
+            key = (allele, len(query), options_key)
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = _Batch()
+                batch.timer = loop.call_later(self.batch_window, self._flush, key)
+            future = loop.create_future()
+            batch.queries.append(query)
+            batch.futures.append(future)
+            futures.append(future)
+            if len(batch.queries) >= self.max_batch:
+                self._flush(key)
+
+        self.stats['requests'] += 1
+        self.stats['queries'] += len(queries)
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self, key:tuple) -> None:
+        """Closes a pending batch and schedules its scoring."""
+
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        self.stats['batches'] += 1
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch.queries))
+        task = asyncio.ensure_future(self._run(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key:tuple, batch:_Batch) -> None:
+        """Scores a batch in a worker thread and resolves the futures of its queries."""
+
+        allele, _, options_key = key
+        options = {name: list(value) if isinstance(value, tuple) else value for name, value in options_key}
+        compose = functools.partial(cross_compose_many, batch.queries, self.backgrounds[allele], **options)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, compose)
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        """Serves the HTTP requests of one connection, keeping it alive when asked to."""
+
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except _RequestError as e:
+                    self.stats['errors'] += 1
+                    _write_response(writer, e.status, *_json_response(e.status, {'error': str(e)})[1:], keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, content_type, payload = await self._respond(method, target, body)
+                keep_alive = headers.get('connection', '').lower() == 'keep-alive'
+                _write_response(writer, status, content_type, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method:str, target:str, body:bytes) -> Tuple[int, str, bytes]:
+        """Routes one request, returning the status, content type and body of the response."""
+
+        try:
+            if target == '/health' and method == 'GET':
+                return _json_response(200, {'status': 'ok'})
+            if target == '/alleles' and method == 'GET':
+                return _json_response(200, {allele: len(background) for allele, background in self.backgrounds.items()})
+            if target == '/stats' and method == 'GET':
+                return _json_response(200, self.stats)
+            if target == '/score':
+                if method != 'POST':
+                    return _json_response(405, {'error': "Use POST for /score."})
+                return await self._respond_score(body)
+            return _json_response(404, {'error': f"Unknown endpoint {method} {target}."})
+        except KeyError as e:
+            self.stats['errors'] += 1
+            return _json_response(404, {'error': str(e.args[0]) if e.args else str(e)})
+        except (ValueError, TypeError) as e:
+            self.stats['errors'] += 1
+            return _json_response(400, {'error': str(e)})
+        except Exception as e:
+            self.stats['errors'] += 1
+            return _json_response(500, {'error': str(e)})
+
+    async def _respond_score(self, body:bytes) -> Tuple[int, str, bytes]:
+        """Answers a /score request."""
+
+        request = json.loads(body or b"{}")
+        if not isinstance(request, dict):
+            raise ValueError("The request body must be a JSON object.")
+        allele = request.pop('allele', None)
+        queries = request.pop('queries', None)
+        if 'query' in request:
+            queries = [request.pop('query')]
+        response_format = request.pop('format', 'json')
+        if allele is None or not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+            raise ValueError("A /score request needs an allele and a list of query strings.")
+        if response_format not in ('json', 'arrow'):
+            raise ValueError(f"Unknown format {response_format}, expected 'json' or 'arrow'.")
+        for name, value in request.items():
+            if name in _SCORE_OPTIONS and value is not None and not isinstance(value, _SCORE_OPTIONS[name]):
+                raise ValueError(f"Option {name} has an invalid type.")
+
+        results = await self.score(allele, [query.upper() for query in queries], **request)
+        if response_format == 'arrow':
+            return 200, _ARROW_CONTENT_TYPE, _to_arrow(results)
+        return _json_response(200, {'allele': allele, 'results': [{'query': result.query, 'hits': _to_records(result)}
+                                                                  for result in results]})
+
+
+
+def _json_response(status:int, payload:Any) -> Tuple[int, str, bytes]:
+    return status, "application/json", json.dumps(payload).encode("utf-8")
+
+
+
+async def _read_request(reader:asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """
+    Reads one HTTP/1.1 request, None when the client closed the connection.
+
+    :raises _RequestError: If the request line or the Content-Length header is invalid (400), or the body
+                           is over the size limit (413).
+    """
+
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise _RequestError(400, "Malformed request line.")
+    method, target, _ = parts
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise _RequestError(400, f"Invalid Content-Length {headers['content-length']!r}.")
+    if length < 0:
+        raise _RequestError(400, f"Invalid Content-Length {length}.")
+    if length > _MAX_REQUEST_BYTES:
+        raise _RequestError(413, f"Request body of {length} bytes exceeds the {_MAX_REQUEST_BYTES} bytes limit.")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+
+def _write_response(writer:asyncio.StreamWriter, status:int, content_type:str, payload:bytes, keep_alive:bool) -> None:
+    head = (f"HTTP/1.1 {status} {_HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + payload)
+
+
+
+class ScoringClient:
+    """
+    A minimal asyncio client of a local ScoringServer.
+
+    Attributes:
+        host (str): The TCP host.
+        port (int): The TCP port.
+        path (str): The Unix socket path, used instead of host and port when given.
+    """
+
+    def __init__(self, host:str = "127.0.0.1", port:int = 8765, path:str = None):
+        self.host = host
+        self.port = port
+        self.path = path
+
+    def __repr__(self):
+        return f"ScoringClient({self.path or f'{self.host}:{self.port}'})"
+
+    async def request(self, method:str, target:str, payload:Any = None) -> Tuple[int, str, bytes]:
+        """
+        Sends one request and reads the full response.
+
+        :param method: 'GET' or 'POST'.
+        :param target: The endpoint, e.g. '/score'.
+        :param payload: A JSON-serializable request body (optional).
+        :return: The status, content type and body of the response.
+        """
+
+        if self.path is not None:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        try:
+            writer.write((f"{method} {target} HTTP/1.1\r\nHost: crossdome\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            headers: Dict[str, str] = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            content = await reader.readexactly(int(headers.get('content-length', 0)))
+        finally:
+            writer.close()
+        return status, headers.get('content-type', ''), content
+
+    async def score(self, allele:str, queries:List[str], format:str = 'json', **options:Any) -> Union[Dict[str, Any], pd.DataFrame]:
+        """
+        Scores queries on the server.
+
+        :param allele: The allele of the background to score against.
+        :param queries: The query peptides.
+        :param format: 'json' for a dictionary, 'arrow' for a long-form DataFrame.
+        :param options: Scoring and selection options of cross_compose_many.
+        :return: The decoded response.
+        :raises IOError: If the server answers with an error.
+        """
+
+        status, content_type, content = await self.request("POST", "/score", {'allele': allele, 'queries': list(queries),
+                                                                              'format': format, **options})
+        if status != 200:
+            raise IOError(f"Scoring server error {status}: {json.loads(content).get('error')}")
+        if content_type == _ARROW_CONTENT_TYPE:
+            pyarrow = _require_pyarrow()
+            return pyarrow.ipc.open_stream(io.BytesIO(content)).read_all().to_pandas()
+        return json.loads(content)
+
+
+
+def main(argv:List[str] = None) -> None:
+    """
+    Runs a scoring server from the command line.
+
+    :param argv: Command-line arguments (defaults to sys.argv).
+    """
+
+    # Imported here, utils is only needed to load backgrounds from files
+    from crossdome.utils import load_background_file
+
+    parser = argparse.ArgumentParser(prog="crossdome.server", description="Serve CrossDome scoring over HTTP.")
+    parser.add_argument("--background", action="append", required=True,
+                        help="Binary background file, or ALLELE=file.csv for a CSV dataset (repeatable).")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host.")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port.")
+    parser.add_argument("--socket", help="Unix socket path, used instead of the TCP host and port.")
+    parser.add_argument("--batch-window", type=float, default=0.005, help="Longest wait, in seconds, for a batch to fill.")
+    parser.add_argument("--max-batch", type=int, default=256, help="Queries per batch at which scoring starts.")
+    args = parser.parse_args(argv)
+
+    backgrounds = []
+    for value in args.background:
+        allele, separator, file_path = value.rpartition("=")
+        backgrounds.append(load_background_file(file_path, allele=allele if separator else None))
+
+    async def serve() -> None:
+        server = await ScoringServer(backgrounds, batch_window=args.batch_window, max_batch=args.max_batch).start(
+            host=args.host, port=args.port, path=args.socket)
+        sys.stderr.write(f"Serving {sorted(server.backgrounds)} on {server.address}\n")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+# Program entry point
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Import needed libraries
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Union
+
+from crossdome.encoding import AMINO_ACIDS
+
+"""
+Substitution matrix scoring schemes for CrossDome.
+
+A similarity matrix S is turned into a residue distance
+d(a, b) = (S(a, a) + S(b, b)) / 2 - S(a, b), which is zero for identical residues.
+Position weights are folded in ahead of time into a (L, 20, 20) table, so
+scoring an encoded background is a gather-and-sum with no per-pair arithmetic.
+Scores are normalized to [0, 1], lower meaning more related, like relatedness_score.
+"""
+
+# BLOSUM62 (Henikoff & Henikoff, 1992) in its customary residue order
+_BLOSUM62_ORDER:str = "ARNDCQEGHILKMFPSTWYV"
+_BLOSUM62_VALUES:List[List[int]] = [
+    [ 4, -1, -2, -2,  0, -1, -1,  0, -2, -1, -1, -1, -1, -2, -1,  1,  0, -3, -2,  0],
+    [-1,  5,  0, -2, -3,  1,  0, -2,  0, -3, -2,  2, -1, -3, -2, -1, -1, -3, -2, -3],
+    [-2,  0,  6,  1, -3,  0,  0,  0,  1, -3, -3,  0, -2, -3, -2,  1,  0, -4, -2, -3],
+    [-2, -2,  1,  6, -3,  0,  2, -1, -1, -3, -4, -1, -3, -3, -1,  0, -1, -4, -3, -3],
+    [ 0, -3, -3, -3,  9, -3, -4, -3, -3, -1, -1, -3, -1, -2, -3, -1, -1, -2, -2, -1],
+    [-1,  1,  0,  0, -3,  5,  2, -2,  0, -3, -2,  1,  0, -3, -1,  0, -1, -2, -1, -2],
+    [-1,  0,  0,  2, -4,  2,  5, -2,  0, -3, -3,  1, -2, -3, -1,  0, -1, -3, -2, -2],
+    [ 0, -2,  0, -1, -3, -2, -2,  6, -2, -4, -4, -2, -3, -3, -2,  0, -2, -2, -3, -3],
+    [-2,  0,  1, -1, -3,  0,  0, -2,  8, -3, -3, -1, -2, -1, -2, -1, -2, -2,  2, -3],
+    [-1, -3, -3, -3, -1, -3, -3, -4, -3,  4,  2, -3,  1,  0, -3, -2, -1, -3, -1,  3],
+    [-1, -2, -3, -4, -1, -2, -3, -4, -3,  2,  4, -2,  2,  0, -3, -2, -1, -2, -1,  1],
+    [-1,  2,  0, -1, -3,  1,  1, -2, -1, -3, -2,  5, -1, -3, -1,  0, -1, -3, -2, -2],
+    [-1, -1, -2, -3, -1,  0, -2, -3, -2,  1,  2, -1,  5,  0, -2, -1, -1, -1, -1,  1],
+    [-2, -3, -3, -3, -2, -3, -3, -3, -1,  0,  0, -3,  0,  6, -4, -2, -2,  1,  3, -1],
+    [-1, -2, -2, -1, -3, -1, -1, -2, -2, -3, -3, -1, -2, -4,  7, -1, -1, -4, -3, -2],
+    [ 1, -1,  1,  0, -1,  0,  0,  0, -1, -2, -2,  0, -1, -2, -1,  4,  1, -3, -2, -2],
+    [ 0, -1,  0, -1, -1, -1, -1, -2, -2, -1, -1, -1, -1, -2, -1,  1,  5, -2, -2,  0],
+    [-3, -3, -4, -4, -2, -2, -3, -2, -2, -3, -2, -3, -1,  1, -4, -3, -2, 11,  2, -3],
+    [-2, -2, -2, -3, -2, -1, -2, -3,  2, -1, -1, -2, -1,  3, -3, -2, -2,  2,  7, -1],
+    [ 0, -3, -3, -3, -1, -2, -2, -3, -3,  3,  1, -2,  1, -1, -2, -2,  0, -3, -1,  4],
+]
+
+# Bundled similarity matrices, reindexed to the AMINO_ACIDS encoding order
+SUBSTITUTION_MATRICES:Dict[str, pd.DataFrame] = {
+    'blosum62': pd.DataFrame(_BLOSUM62_VALUES, index=list(_BLOSUM62_ORDER), columns=list(_BLOSUM62_ORDER)).loc[list(AMINO_ACIDS), list(AMINO_ACIDS)],
+    'identity': pd.DataFrame(np.eye(len(AMINO_ACIDS)), index=list(AMINO_ACIDS), columns=list(AMINO_ACIDS)),
+}
+
+# Anything accepted as a substitution scheme
+Substitution = Union[str, np.ndarray, pd.DataFrame]
+
+
+
+def get_substitution_matrix(scheme:Substitution) -> np.ndarray:
+    """
+    Resolves a substitution scheme to a 20x20 similarity matrix in encoding order.
+
+    :param scheme: A bundled matrix name ('blosum62', 'identity'), a DataFrame labelled
+                   with one-letter residues, or a 20x20 array in AMINO_ACIDS order.
+    :return: A (20, 20) float64 similarity matrix.
+    :raises ValueError: If the scheme is unknown or not a symmetric 20x20 matrix.
+    """
+
+    if isinstance(scheme, str):
+        if scheme.lower() not in SUBSTITUTION_MATRICES:
+            raise ValueError(f"Unknown substitution matrix {scheme}, available: {sorted(SUBSTITUTION_MATRICES)}. "
+                             f"Other matrices (e.g. PMBEC) can be passed as a 20x20 DataFrame or array.")
+        scheme = SUBSTITUTION_MATRICES[scheme.lower()]
+
+    if isinstance(scheme, pd.DataFrame):
+        missing = set(AMINO_ACIDS) - set(scheme.index) | set(AMINO_ACIDS) - set(scheme.columns)
+        if missing:
+            raise ValueError(f"Substitution matrix is missing residues {sorted(missing)}.")
+        scheme = scheme.loc[list(AMINO_ACIDS), list(AMINO_ACIDS)].to_numpy()
+
+    matrix = np.asarray(scheme, dtype=np.float64)
+    if matrix.shape != (len(AMINO_ACIDS), len(AMINO_ACIDS)):
+        raise ValueError(f"Substitution matrix must be {len(AMINO_ACIDS)}x{len(AMINO_ACIDS)}, got {matrix.shape} instead.")
+    if not np.allclose(matrix, matrix.T):
+        raise ValueError("Substitution matrix must be symmetric.")
+    return matrix
+
+
+
+def substitution_key(scheme:Substitution) -> tuple:
+    """
+    Turns a substitution scheme into a hashable key, e.g. for caches.
+
+    :param scheme: A substitution scheme, see get_substitution_matrix, or None for the default distance.
+    :return: A tuple identifying the scheme.
+    """
+
+    if scheme is None:
+        return ('distance',)
+    if isinstance(scheme, str):
+        return ('matrix', scheme.lower())
+    return ('matrix', get_substitution_matrix(scheme).tobytes())
+
+
+
+def substitution_distance(scheme:Substitution) -> np.ndarray:
+    """
+    Converts a similarity matrix into a residue distance matrix.
+
+    :param scheme: A substitution scheme, see get_substitution_matrix.
+    :return: A (20, 20) distance matrix, zero on the diagonal.
+    """
+
+    matrix = get_substitution_matrix(scheme)
+    diagonal = np.diag(matrix)
+    return np.maximum((diagonal[:, None] + diagonal[None, :]) / 2 - matrix, 0.0)
+
+
+
+def substitution_score_table(scheme:Substitution, position_weight:List[float] = None, length:int = 9) -> np.ndarray:
+    """
+    Precomputes the weighted, normalized per-position substitution costs.
+
+    :param scheme: A substitution scheme, see get_substitution_matrix.
+    :param position_weight: Weights for each position in the peptide.
+    :param length: The peptide length.
+    :return: A (length, 20, 20) table; a peptide pair scores sum_i table[i, query_i, subject_i].
+    """
+
+    weights = np.ones(length) if position_weight is None else np.asarray(position_weight, dtype=np.float64)
+    if weights.shape != (length,):
+        raise ValueError(f"position_weight must have {length} values, got {weights.size} instead.")
+
+    distance = substitution_distance(scheme)
+    normalizer = weights.sum() * distance.max()
+    if normalizer <= 0:
+        raise ValueError("Substitution scheme and position weights give a zero maximum distance.")
+    return weights[:, None, None] * distance[None, :, :] / normalizer
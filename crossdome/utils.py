@@ -1,7 +1,34 @@
 # Import needed libraries for this program 
 import pandas as pd 
+import numpy as np
+import hashlib
+import json
 import os 
-from typing import List 
+from typing import List, Dict, Any, Iterable, Iterator, Tuple, Union
+
+from crossdome.core_classes import xrBackground
+from crossdome.encoding import AMINO_ACIDS
+from crossdome.export import _COMPRESSION_EXTENSIONS, _CSV_OPENERS, write_results
+from crossdome.profiling import stage
+from crossdome.rdata import read_rdata
+
+# Binary background format: magic, uint32 header size, JSON header, padding, one raw uint8 residue matrix per length bucket
+_BACKGROUND_MAGIC:bytes = b"XRBG0001"
+_BACKGROUND_ALIGNMENT:int = 64
+
+# Query files are streamed in batches of this many peptides
+_QUERY_BATCH_SIZE:int = 1024
+_FASTA_EXTENSIONS = ('.fa', '.fasta', '.faa', '.fas')
+
+# Location of the bio-database files shipped with the R package, and of their columnar cache
+BIO_DATABASE_DIR:str = os.environ.get("CROSSDOME_BIO_DATABASE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bio-database"))
+CACHE_DIR:str = os.environ.get("CROSSDOME_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "crossdome"))
+
+# Non-tissue columns of the HPA expression database
+HPA_ANNOTATION_COLUMNS:List[str] = ['ensembl_id', 'gene_donor', 'Group', 'spec_degree', 'tissues']
+
+# Bio-database tables already loaded by this process, keyed by source file signature
+_BIO_DATABASE_MEMORY:Dict[tuple, pd.DataFrame] = {}
 
 def load_hla_database(file_path:str) -> pd.DataFrame:
     """
@@ -16,7 +43,9 @@ def load_hla_database(file_path:str) -> pd.DataFrame:
     
     try:
         # Attempt to open & load file 
-        df:pd.DataFrame = pd.read_csv(file_path)
+        with stage('load_hla_database') as timing:
+            df:pd.DataFrame = pd.read_csv(file_path)
+            timing.add(len(df))
         # Return the dataframe 
         return df
     except Exception as e:
@@ -42,36 +71,474 @@ def load_background_peptides(df:pd.DataFrame, peptide_column:str = 'peptide') ->
 
 
 
-def save_results_to_csv(result_df:pd.DataFrame, file_path:str) -> None:
+def save_results_to_csv(result_df:Union[pd.DataFrame, Iterable[pd.DataFrame]], file_path:str, columns:List[str] = None) -> None:
     """
     Saves a pandas DataFrame to a CSV file.
     
-    :param result_df: The pandas DataFrame containing the results.
+    The rows are written in bounded chunks, and an iterable of DataFrames is streamed
+    one chunk at a time. A .gz, .bz2 or .xz extension compresses the output.
+    
+    :param result_df: The pandas DataFrame containing the results, or an iterable of DataFrames.
     :param file_path: The file path where the CSV should be saved.
+    :param columns: Write only these columns (optional).
     :return: None
     """
     
     try:
-        result_df.to_csv(file_path, index=False)
+        write_results(result_df, file_path, format='csv', columns=columns)
         print(f"Results successfully saved to {file_path}")
     except Exception as e:
         raise IOError(f"Error saving file {file_path}: {e}")
 
 
 
-def validate_peptide_length(peptides:List[str], expected_length:int = 9) -> List[str]:
+def validate_peptide_length(peptides:List[str], expected_length:Union[int, Iterable[int]] = 9) -> List[str]:
     """
     Validates that all peptides in the list are of the expected length.
     
     :param peptides: A list of peptide strings.
-    :param expected_length: The expected length of the peptides (default is 9-mers).
+    :param expected_length: The expected length of the peptides (default is 9-mers), or a collection
+                            of accepted lengths (e.g. range(8, 12) for class I ligands).
     :return: A list of valid peptides.
     :raises ValueError: If any peptide is not of the expected length.
     """
     
-    invalid_peptides = [p for p in peptides if len(p) != expected_length]
+    accepted = {expected_length} if isinstance(expected_length, int) else set(expected_length)
+    invalid_peptides = [p for p in peptides if len(p) not in accepted]
     
     if invalid_peptides:
         raise ValueError(f"Some peptides are not of length {expected_length}: {invalid_peptides}")
     
-    return peptides
\ No newline at end of file
+    return peptides
+
+
+
+def _background_checksum(encoded:np.ndarray) -> str:
+    """
+    Computes the content checksum stored in binary background headers.
+    
+    :param encoded: The (N, L) uint8 residue matrix.
+    :return: A hex digest of the matrix bytes.
+    """
+    
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(encoded).data)
+    return digest.hexdigest()
+
+
+
+def save_background_binary(background:xrBackground, file_path:str) -> None:
+    """
+    Saves an xrBackground to the binary background format.
+    
+    The file holds a small JSON header (allele, count, alphabet and, for each
+    peptide length bucket, its length, count and checksum) followed by the raw uint8
+    residue matrix of each bucket, each aligned so it can be memory-mapped.
+    Single-length backgrounds also record 'length' and 'checksum' at the top level.
+    
+    :param background: The xrBackground to save.
+    :param file_path: The file path where the background should be saved.
+    :return: None
+    """
+    
+    buckets = {length: np.ascontiguousarray(encoded, dtype=np.uint8) for length, encoded in background.buckets.items()}
+    header:Dict[str, Any] = {
+        'allele': background.allele,
+        'count': int(sum(encoded.shape[0] for encoded in buckets.values())),
+        'alphabet': AMINO_ACIDS,
+        'buckets': [{'length': length, 'count': int(encoded.shape[0]), 'checksum': _background_checksum(encoded)}
+                    for length, encoded in buckets.items()]
+    }
+    if len(buckets) == 1:
+        header['length'] = header['buckets'][0]['length']
+        header['checksum'] = header['buckets'][0]['checksum']
+    
+    payload = json.dumps(header).encode("utf-8")
+    prefix = len(_BACKGROUND_MAGIC) + 4 + len(payload)
+    padding = -prefix % _BACKGROUND_ALIGNMENT
+    
+    try:
+        with stage('save_background_binary', header['count']), open(file_path, "wb") as handle:
+            handle.write(_BACKGROUND_MAGIC)
+            handle.write(len(payload).to_bytes(4, "little"))
+            handle.write(payload)
+            handle.write(b"\0" * padding)
+            for position, encoded in enumerate(buckets.values()):
+                # Pad between buckets only, single-length files keep the original layout
+                if position:
+                    handle.write(b"\0" * (-handle.tell() % _BACKGROUND_ALIGNMENT))
+                handle.write(encoded.data)
+    except Exception as e:
+        raise IOError(f"Error saving file {file_path}: {e}")
+
+
+
+def read_background_header(file_path:str) -> Dict[str, Any]:
+    """
+    Reads the header of a binary background file without touching the residue data.
+    
+    :param file_path: The file path of the binary background.
+    :return: The header dictionary, including the 'offset' of the first residue matrix
+             and the 'offset' of each length bucket.
+    """
+    
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File {file_path} does not exist.")
+    
+    with open(file_path, "rb") as handle:
+        if handle.read(len(_BACKGROUND_MAGIC)) != _BACKGROUND_MAGIC:
+            raise IOError(f"File {file_path} is not a CrossDome binary background.")
+        size = int.from_bytes(handle.read(4), "little")
+        header:Dict[str, Any] = json.loads(handle.read(size).decode("utf-8"))
+    
+    prefix = len(_BACKGROUND_MAGIC) + 4 + size
+    header['offset'] = prefix + (-prefix % _BACKGROUND_ALIGNMENT)
+    
+    # Files written before length buckets hold a single matrix described at the top level
+    if 'buckets' not in header:
+        header['buckets'] = [{'length': header['length'], 'count': header['count'], 'checksum': header['checksum']}]
+    
+    offset = header['offset']
+    for bucket in header['buckets']:
+        bucket['offset'] = offset
+        nbytes = bucket['count'] * bucket['length']
+        offset += nbytes + (-nbytes % _BACKGROUND_ALIGNMENT)
+    return header
+
+
+
+def load_background_binary(file_path:str, mmap:bool = True, verify:bool = False) -> xrBackground:
+    """
+    Loads a binary background file into an xrBackground.
+    
+    With mmap the residue matrices are mapped read-only straight from disk, so loading
+    is near-instant and pages are shared by every process mapping the same file.
+    
+    :param file_path: The file path of the binary background.
+    :param mmap: Memory-map the residue matrices instead of reading them into memory.
+    :param verify: Recompute the checksums and validate every residue code (full pass).
+    :return: An xrBackground backed by the file contents.
+    """
+    
+    header = read_background_header(file_path)
+    
+    if header['alphabet'] != AMINO_ACIDS:
+        raise ValueError(f"File {file_path} uses alphabet {header['alphabet']}, expected {AMINO_ACIDS}.")
+    
+    buckets:Dict[int, np.ndarray] = {}
+    with stage('load_background_binary', header['count']):
+        for bucket in header['buckets']:
+            shape = (bucket['count'], bucket['length'])
+            if bucket['count'] == 0:
+                encoded = np.empty(shape, dtype=np.uint8)
+            elif mmap:
+                encoded = np.memmap(file_path, dtype=np.uint8, mode="r", offset=bucket['offset'], shape=shape)
+            else:
+                encoded = np.fromfile(file_path, dtype=np.uint8, count=shape[0] * shape[1], offset=bucket['offset']).reshape(shape)
+        
+            if verify and _background_checksum(encoded) != bucket['checksum']:
+                raise IOError(f"Checksum mismatch in {file_path}, the file is corrupted.")
+            buckets[bucket['length']] = encoded
+    
+    return xrBackground.from_encoded(header['allele'], buckets, validate=verify)
+
+
+
+def convert_csv_to_background(csv_path:str, file_path:str, allele:str, peptide_column:str = 'peptide', deduplicate:bool = False,
+                              lengths:Iterable[int] = (9,)) -> xrBackground:
+    """
+    Converts a CSV peptide dataset into the binary background format.
+    
+    :param csv_path: The file path of the CSV file containing the HLA database.
+    :param file_path: The file path where the binary background should be saved.
+    :param allele: The MHC Class I allele of the background.
+    :param peptide_column: The column name in the CSV containing the peptides.
+    :param deduplicate: Drop repeated peptides before saving.
+    :param lengths: The peptide lengths of the dataset, one bucket is stored per length.
+    :return: The converted xrBackground.
+    """
+    
+    peptides = load_background_peptides(load_hla_database(csv_path), peptide_column)
+    background = xrBackground(allele=allele, peptides=peptides, deduplicate=deduplicate, lengths=lengths)
+    save_background_binary(background, file_path)
+    return background
+
+
+
+def load_background_file(file_path:str, allele:str = None, peptide_column:str = 'peptide', deduplicate:bool = False,
+                         lengths:Iterable[int] = None, mmap:bool = True) -> xrBackground:
+    """
+    Loads a background from a binary background file or a CSV peptide dataset.
+    
+    Binary files are recognized by their magic bytes whatever their extension.
+    
+    :param file_path: The file path of the background.
+    :param allele: The MHC Class I allele (required for CSV files, read from the header for binary ones).
+    :param peptide_column: The column name in the CSV containing the peptides.
+    :param deduplicate: Drop repeated CSV peptides.
+    :param lengths: The CSV peptide lengths, inferred from the peptides when not given.
+    :param mmap: Memory-map binary residue matrices.
+    :return: An xrBackground.
+    """
+    
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File {file_path} does not exist.")
+    with open(file_path, "rb") as handle:
+        is_binary = handle.read(len(_BACKGROUND_MAGIC)) == _BACKGROUND_MAGIC
+    if is_binary:
+        return load_background_binary(file_path, mmap=mmap)
+    
+    if allele is None:
+        raise ValueError(f"An allele is required to load the CSV background {file_path}.")
+    peptides = load_background_peptides(load_hla_database(file_path), peptide_column)
+    if lengths is None:
+        lengths = sorted(set(map(len, peptides)))
+    return xrBackground(allele=allele, peptides=peptides, deduplicate=deduplicate, lengths=lengths)
+
+
+
+def _open_text(file_path:str) -> Any:
+    """Opens a text file for reading, decompressing .gz, .bz2 and .xz files."""
+    
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File {file_path} does not exist.")
+    compression = _COMPRESSION_EXTENSIONS.get(os.path.splitext(file_path.lower())[1])
+    return _CSV_OPENERS.get(compression, open)(file_path, "rt")
+
+
+
+def read_fasta(file_path:str) -> Iterator[Tuple[str, str]]:
+    """
+    Streams the records of a (possibly compressed) FASTA file.
+    
+    :param file_path: The file path of the FASTA file.
+    :return: An iterator of (header, sequence) tuples, sequences in upper case.
+    """
+    
+    header, sequence = None, []
+    with _open_text(file_path) as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(sequence).upper()
+                header, sequence = line[1:].strip(), []
+            elif header is None:
+                raise ValueError(f"File {file_path} is not a FASTA file, sequence found before the first header.")
+            else:
+                sequence.append(line)
+    if header is not None:
+        yield header, "".join(sequence).upper()
+
+
+
+def read_query_peptides(file_path:str, peptide_column:str = 'peptide', batch_size:int = _QUERY_BATCH_SIZE) -> Iterator[List[str]]:
+    """
+    Streams query peptides from a CSV or FASTA file in batches.
+    
+    FASTA files (.fa, .fasta, .faa, .fas, optionally compressed) hold one peptide per record;
+    other files are read as CSV, possibly compressed. Empty records and blank or missing cells
+    are skipped, so a batch may hold fewer than batch_size peptides.
+    
+    :param file_path: The file path of the queries.
+    :param peptide_column: The column name in the CSV containing the peptides.
+    :param batch_size: The number of peptides per batch.
+    :return: An iterator of peptide lists.
+    """
+    
+    root, extension = os.path.splitext(file_path.lower())
+    if extension in _COMPRESSION_EXTENSIONS:
+        extension = os.path.splitext(root)[1]
+    
+    if extension in _FASTA_EXTENSIONS:
+        batch: List[str] = []
+        for _, sequence in read_fasta(file_path):
+            if not sequence:
+                continue
+            batch.append(sequence)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+    
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File {file_path} does not exist.")
+    try:
+        chunks = pd.read_csv(file_path, chunksize=batch_size, dtype=str)
+        for chunk in chunks:
+            if peptide_column not in chunk.columns:
+                raise KeyError(f"Column {peptide_column} not found in {file_path}.")
+            peptides = chunk[peptide_column].dropna().str.strip().str.upper()
+            peptides = peptides[peptides != ""].tolist()
+            if peptides:
+                yield peptides
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise IOError(f"Error loading file {file_path}: {e}")
+
+
+
+def _write_columnar_cache(df:pd.DataFrame, file_path:str, signature:List[int]) -> None:
+    """
+    Writes a DataFrame to the columnar cache format (an uncompressed, pickle-free .npz).
+    
+    Numeric columns are stored as raw arrays; text columns as one UTF-8 buffer
+    joined by NUL characters plus a missing value mask.
+    
+    :param df: The DataFrame to cache.
+    :param file_path: The cache file path.
+    :param signature: The (size, mtime) signature of the source file.
+    :return: None
+    """
+    
+    arrays:Dict[str, np.ndarray] = {}
+    columns = []
+    for position, name in enumerate(df.columns):
+        column = df[name]
+        key = f"c{position}"
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            arrays[key] = column.cat.codes.to_numpy()
+            arrays[key + "_levels"] = np.frombuffer("\0".join(map(str, column.cat.categories)).encode("utf-8"), dtype=np.uint8)
+            columns.append({'name': name, 'kind': 'category'})
+        elif pd.api.types.is_numeric_dtype(column.dtype) or pd.api.types.is_bool_dtype(column.dtype):
+            arrays[key] = column.to_numpy()
+            columns.append({'name': name, 'kind': 'numeric'})
+        else:
+            missing = column.isna().to_numpy()
+            arrays[key] = np.frombuffer("\0".join(column.fillna("").astype(str)).encode("utf-8"), dtype=np.uint8)
+            arrays[key + "_na"] = missing
+            columns.append({'name': name, 'kind': 'text'})
+    
+    meta = {'signature': list(signature), 'rows': len(df), 'columns': columns}
+    arrays['__meta__'] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+    
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    temporary = f"{file_path}.{os.getpid()}.tmp.npz"
+    np.savez(temporary, **arrays)
+    os.replace(temporary, file_path)
+
+
+
+def _read_columnar_cache(file_path:str, signature:List[int]) -> Any:
+    """
+    Reads a DataFrame from the columnar cache if it matches the source signature.
+    
+    :param file_path: The cache file path.
+    :param signature: The (size, mtime) signature of the source file.
+    :return: The cached DataFrame, or None when the cache is missing or stale.
+    """
+    
+    if not os.path.exists(file_path):
+        return None
+    
+    try:
+        with np.load(file_path, allow_pickle=False) as arrays:
+            meta = json.loads(arrays['__meta__'].tobytes().decode("utf-8"))
+            if meta['signature'] != list(signature):
+                return None
+            
+            data = {}
+            for position, column in enumerate(meta['columns']):
+                key = f"c{position}"
+                if column['kind'] == 'numeric':
+                    data[column['name']] = arrays[key]
+                elif column['kind'] == 'category':
+                    levels = arrays[key + "_levels"].tobytes().decode("utf-8").split("\0")
+                    data[column['name']] = pd.Categorical.from_codes(arrays[key], categories=levels)
+                else:
+                    values = np.array(arrays[key].tobytes().decode("utf-8").split("\0"), dtype=object) if meta['rows'] else np.empty(0, dtype=object)
+                    values[arrays[key + "_na"]] = None
+                    data[column['name']] = values
+            return pd.DataFrame(data)
+    except Exception:
+        # A corrupted or foreign cache file is simply rebuilt
+        return None
+
+
+
+def load_bio_database(name:str, cache_dir:str = None, use_cache:bool = True) -> pd.DataFrame:
+    """
+    Loads one of the bundled bio-database datasets (e.g. 'hpa_database', 'mage_off_targets').
+    
+    The .rda file is parsed natively once and then written to a columnar cache;
+    later loads read the cache (or this process's memory) in milliseconds. The
+    cache is rebuilt automatically when the source file changes.
+    
+    :param name: The dataset name, or a path to an .rda file.
+    :param cache_dir: Directory of the columnar cache (defaults to CACHE_DIR).
+    :param use_cache: Read and write the columnar cache.
+    :return: A pandas DataFrame with the dataset.
+    """
+    
+    file_path = name if name.endswith((".rda", ".RData")) else os.path.join(BIO_DATABASE_DIR, f"{name}.rda")
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File {file_path} does not exist.")
+    
+    stat = os.stat(file_path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    memory_key = (os.path.abspath(file_path), *signature)
+    if use_cache and memory_key in _BIO_DATABASE_MEMORY:
+        return _BIO_DATABASE_MEMORY[memory_key].copy()
+    
+    dataset = os.path.splitext(os.path.basename(file_path))[0]
+    cache_path = os.path.join(cache_dir or CACHE_DIR, f"{dataset}.npz")
+    
+    with stage('load_bio_database_cache') as timing:
+        df = _read_columnar_cache(cache_path, signature) if use_cache else None
+        timing.add(0 if df is None else len(df))
+    if df is None:
+        try:
+            with stage('load_bio_database_rdata'):
+                objects = read_rdata(file_path)
+        except Exception as e:
+            raise IOError(f"Error loading file {file_path}: {e}")
+        
+        df = objects.get(dataset, next(iter(objects.values()), None))
+        if not isinstance(df, pd.DataFrame):
+            raise IOError(f"File {file_path} does not contain a data frame.")
+        
+        if use_cache:
+            try:
+                _write_columnar_cache(df, cache_path, signature)
+            except OSError:
+                # A read-only cache location only costs speed
+                pass
+    
+    if use_cache:
+        _BIO_DATABASE_MEMORY[memory_key] = df
+        return df.copy()
+    return df
+
+
+
+def load_expression_table(cache_dir:str = None) -> pd.DataFrame:
+    """
+    Loads the bundled HPA tissue expression table.
+    
+    :param cache_dir: Directory of the columnar cache (defaults to CACHE_DIR).
+    :return: A DataFrame indexed by Ensembl gene id, with the gene symbol,
+             one column per tissue and the HPA specificity annotations.
+    """
+    
+    df = load_bio_database("hpa_database", cache_dir=cache_dir)
+    return df.set_index('ensembl_id')
+
+
+
+def load_off_target_backgrounds(cache_dir:str = None) -> Dict[str, xrBackground]:
+    """
+    Loads the bundled MAGE off-target peptides as one background per allele.
+    
+    :param cache_dir: Directory of the columnar cache (defaults to CACHE_DIR).
+    :return: A dictionary mapping each HLA allele to its xrBackground.
+    """
+    
+    df = load_bio_database("mage_off_targets", cache_dir=cache_dir)
+    return {
+        allele: xrBackground(allele=allele, peptides=group['peptide_sequence'].tolist(), deduplicate=True,
+                             lengths=group['peptide_sequence'].str.len().unique())
+        for allele, group in df.groupby('hla_allele', sort=True)
+    }
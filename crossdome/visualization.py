@@ -1,80 +1,320 @@
-# Import needed libraries 
-import matplotlib.pyplot as plt 
-import seaborn as sns 
-import pandas as pd 
-from typing import List 
+# Import needed libraries
+import os
+import re
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from typing import Any, Iterable, Iterator, List, Sequence, Tuple, Union
 
+from crossdome.core_classes import xrResult
+from crossdome.pairwise import cluster_order
 
+"""
+Plots of CrossDome results.
 
-def plot_similarity_heatmap(similarity_matrix:pd.DataFrame, title:str = "Peptide Similarity Heatmap") -> None:
+Distributions are aggregated with np.bincount or np.histogram before anything is
+drawn, so a plot costs the same for a hundred hits as for millions, and the plotting
+functions accept an xrResult directly, reading its columns without building the
+DataFrame. Given a file_path, a figure is rendered with the non-interactive Agg
+canvas and saved, never touching the pyplot state or a display, which is what
+headless workers need; without one it is shown with pyplot as before.
+plot_query_reports renders one report figure per query in parallel batches,
+including queries without any hit.
+"""
+
+# Largest heatmap whose cells are annotated by default
+_ANNOTATED_HEATMAP_SIZE:int = 25
+
+# Number of report figures rendered per worker task
+_REPORT_BATCH_SIZE:int = 32
+
+# Values accepted by the distribution plots: a result, an array or a list
+Values = Union[xrResult, np.ndarray, Sequence[float]]
+
+
+
+def _figure(figsize:Tuple[float, float], file_path:str = None) -> Tuple[Figure, Any]:
+    """Creates a figure and its axes, detached from pyplot on the Agg canvas when rendered to a file."""
+
+    if file_path is None:
+        figure = plt.figure(figsize=figsize)
+    else:
+        figure = Figure(figsize=figsize)
+        FigureCanvasAgg(figure)
+    return figure, figure.add_subplot()
+
+
+
+def _render(figure:Figure, file_path:str = None, dpi:int = 100) -> Figure:
+    """Saves the figure to file_path, or shows it with pyplot when no path is given."""
+
+    if file_path is None:
+        plt.show()
+    else:
+        figure.savefig(file_path, dpi=dpi, bbox_inches='tight')
+    return figure
+
+
+
+def _values(values:Values, column:str) -> np.ndarray:
+    """Returns the values to aggregate, reading the column of a result."""
+
+    if isinstance(values, xrResult):
+        return values.column(column)
+    return np.asarray(values)
+
+
+
+def _mismatch_counts(values:np.ndarray) -> np.ndarray:
+    """Counts the peptides with 0, 1, 2, ... mismatches."""
+
+    values = np.asarray(values, dtype=np.int64)
+    if values.size and values.min() < 0:
+        raise ValueError("Mismatch counts must be non-negative.")
+    return np.bincount(values)
+
+
+
+def _score_histogram(values:np.ndarray, bins:int) -> Tuple[np.ndarray, np.ndarray]:
+    """Histograms the finite scores, returning the counts and the bin edges."""
+
+    values = np.asarray(values, dtype=np.float64)
+    return np.histogram(values[np.isfinite(values)], bins=bins)
+
+
+
+def _draw_mismatches(axis:Any, counts:np.ndarray) -> None:
+    """Draws one bar per number of mismatches."""
+
+    axis.bar(np.arange(len(counts)), counts, color='skyblue')
+    axis.set_xlabel("Number of Mismatches")
+    axis.set_ylabel("Number of Peptides")
+
+
+
+def _draw_histogram(axis:Any, counts:np.ndarray, edges:np.ndarray) -> None:
+    """Draws precomputed histogram counts as adjacent bars."""
+
+    axis.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color='green', edgecolor='black', alpha=0.7)
+    axis.set_xlabel("Relatedness Score")
+    axis.set_ylabel("Frequency")
+
+
+
+def plot_similarity_heatmap(similarity_matrix:pd.DataFrame, title:str = "Peptide Similarity Heatmap", cluster:bool = False,
+                            annot:bool = None, file_path:str = None, dpi:int = 100) -> Figure:
     """
     Plots a heatmap of the similarity scores between peptides.
-    
-    :param similarity_matrix: A pandas DataFrame where each entry is a similarity score between peptides.
+
+    :param similarity_matrix: A pandas DataFrame where each entry is a similarity score between peptides,
+                              e.g. from crossdome.pairwise.pairwise_matrix.
     :param title: The title of the heatmap plot.
-    :return: None
+    :param cluster: Reorder the peptides by hierarchical clustering of the matrix.
+    :param annot: Write the values in the cells (defaults to small matrices only).
+    :param file_path: Save the figure to this file instead of showing it (optional).
+    :param dpi: The resolution of the saved figure.
+    :return: The matplotlib Figure.
     """
-    
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(similarity_matrix, annot=True, cmap="coolwarm", linewidths=.5)
-    plt.title(title)
-    plt.show()
 
+    if cluster:
+        order = cluster_order(similarity_matrix)
+        similarity_matrix = similarity_matrix.iloc[order, order]
+    if annot is None:
+        annot = len(similarity_matrix) <= _ANNOTATED_HEATMAP_SIZE
 
+    figure, axis = _figure((10, 8), file_path)
+    sns.heatmap(similarity_matrix, annot=annot, cmap="coolwarm", linewidths=.5 if annot else 0, ax=axis)
+    axis.set_title(title)
+    return _render(figure, file_path, dpi)
 
-def plot_mismatch_distribution(mismatch_counts:List[int], title:str = "Mismatch Distribution") -> None:
+
+
+def plot_mismatch_distribution(mismatch_counts:Values, title:str = "Mismatch Distribution", file_path:str = None,
+                               dpi:int = 100) -> Figure:
     """
     Plots a bar plot showing the distribution of mismatch counts between peptides.
-    
-    :param mismatch_counts: A list of mismatch counts for each peptide comparison.
+
+    The counts are aggregated with np.bincount, one bar per number of mismatches.
+
+    :param mismatch_counts: The mismatch count of each peptide comparison, as a list, an array
+                            or an xrResult (its num_negative column).
     :param title: The title of the bar plot.
-    :return: None
+    :param file_path: Save the figure to this file instead of showing it (optional).
+    :param dpi: The resolution of the saved figure.
+    :return: The matplotlib Figure.
+    :raises ValueError: If a mismatch count is negative.
     """
-    
-    plt.figure(figsize=(8, 6))
-    plt.bar(range(len(mismatch_counts)), mismatch_counts, color='skyblue')
-    plt.xlabel("Peptide Index")
-    plt.ylabel("Number of Mismatches")
-    plt.title(title)
-    plt.show()
 
+    counts = _mismatch_counts(_values(mismatch_counts, 'num_negative'))
+    figure, axis = _figure((8, 6), file_path)
+    _draw_mismatches(axis, counts)
+    axis.set_title(title)
+    return _render(figure, file_path, dpi)
 
 
-def plot_relatedness_score_distribution(scores:List[float], title:str = "Relatedness Score Distribution") -> None:
+
+def plot_relatedness_score_distribution(scores:Values, title:str = "Relatedness Score Distribution", bins:int = 10,
+                                        file_path:str = None, dpi:int = 100) -> Figure:
     """
     Plots a histogram of the relatedness scores between peptides.
-    
-    :param scores: A list of relatedness scores between peptides.
+
+    The scores are aggregated with np.histogram before drawing, missing scores are ignored.
+
+    :param scores: The relatedness scores, as a list, an array or an xrResult (its relatedness_score column).
     :param title: The title of the histogram.
-    :return: None
+    :param bins: The number of bins.
+    :param file_path: Save the figure to this file instead of showing it (optional).
+    :param dpi: The resolution of the saved figure.
+    :return: The matplotlib Figure.
     """
-    
-    plt.figure(figsize=(8, 6))
-    plt.hist(scores, bins=10, color='green', edgecolor='black', alpha=0.7)
-    plt.xlabel("Relatedness Score")
-    plt.ylabel("Frequency")
-    plt.title(title)
-    plt.show()
 
+    counts, edges = _score_histogram(_values(scores, 'relatedness_score'), bins)
+    figure, axis = _figure((8, 6), file_path)
+    _draw_histogram(axis, counts, edges)
+    axis.set_title(title)
+    return _render(figure, file_path, dpi)
 
 
-def plot_peptide_expression(expression_df:pd.DataFrame, peptide:str, title:str = "Peptide Expression Profile") -> None:
+
+def plot_peptide_expression(expression_df:pd.DataFrame, peptide:str, title:str = "Peptide Expression Profile",
+                            file_path:str = None, dpi:int = 100) -> Figure:
     """
     Plots the gene expression profile for a specific peptide across tissues.
-    
-    :param expression_df: A pandas DataFrame where each row represents a tissue and its expression level.
+
+    :param expression_df: A pandas DataFrame where each row represents a tissue and its expression level,
+                          e.g. from ExpressionIndex.profile_table.
     :param peptide: The specific peptide whose expression profile is being plotted.
     :param title: The title of the bar plot.
-    :return: None
+    :param file_path: Save the figure to this file instead of showing it (optional).
+    :param dpi: The resolution of the saved figure.
+    :return: The matplotlib Figure.
     """
-    
+
     if peptide not in expression_df.columns:
         raise KeyError(f"Peptide {peptide} not found in the DataFrame.")
-    
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x=expression_df.index, y=expression_df[peptide], color='blue')
-    plt.xlabel("Tissues")
-    plt.ylabel("Expression Level")
-    plt.title(title)
-    plt.xticks(rotation=90)
-    plt.show()
\ No newline at end of file
+
+    figure, axis = _figure((10, 6), file_path)
+    sns.barplot(x=expression_df.index, y=expression_df[peptide], color='blue', ax=axis)
+    axis.set_xlabel("Tissues")
+    axis.set_ylabel("Expression Level")
+    axis.set_title(title)
+    axis.tick_params(axis='x', rotation=90)
+    return _render(figure, file_path, dpi)
+
+
+
+def _split_queries(results:Union[xrResult, Iterable[xrResult]]) -> Iterator[Tuple[str, str, np.ndarray, np.ndarray]]:
+    """
+    Yields (query, allele, relatedness scores, mismatch counts) per query, splitting long-form results.
+
+    Every query of a long-form result is yielded, in order, even when it has no hit.
+    """
+
+    for result in [results] if isinstance(results, xrResult) else results:
+        scores, mismatches = result.column('relatedness_score'), result.column('num_negative')
+        if not isinstance(result.query, (list, tuple)):
+            yield result.query, result.allele, scores, mismatches
+            continue
+
+        # The query position of each row, exact for array-backed results; rows of a DataFrame-backed
+        # result go by query name, to the first query of that name
+        queries = list(result.query)
+        if result._store is not None and len(result._store['queries']) == len(queries):
+            owners = result._query_rows(result._positions()).astype(np.int64)
+        else:
+            names, first = np.unique(np.asarray(queries, dtype=object), return_index=True)
+            found = pd.Index(names).get_indexer(result.column('query'))
+            owners = np.where(found >= 0, first[found], -1)
+
+        order = np.argsort(owners, kind='stable')
+        bounds = np.searchsorted(owners[order], np.arange(len(queries) + 1))
+        for position, query in enumerate(queries):
+            rows = order[bounds[position]:bounds[position + 1]]
+            yield query, result.allele, scores[rows], mismatches[rows]
+
+
+
+def _report_names(keys:List[Tuple[str, str]]) -> List[str]:
+    """
+    Names the report files of (query, allele) pairs, unique within a call.
+
+    A query appearing once is named after itself; repeated queries get their allele,
+    then a counter when query and allele are both repeated.
+    """
+
+    counts = pd.Series([query for query, _ in keys]).value_counts()
+    names = [f"{query}_{allele}" if counts[query] > 1 and allele else query for query, allele in keys]
+    names = [re.sub(r'[^A-Za-z0-9._-]+', '_', name) for name in names]
+
+    seen, unique = {}, []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        unique.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    # A counter suffix could match another name, repeat until every name is unique
+    return unique if len(set(unique)) == len(unique) else _report_names([(name, None) for name in unique])
+
+
+
+def _render_reports(tasks:List[Tuple[str, str, np.ndarray, np.ndarray, np.ndarray, int]]) -> List[str]:
+    """Renders a batch of report figures from their aggregated counts, returning the file paths."""
+
+    paths = []
+    for file_path, title, counts, edges, mismatches, dpi in tasks:
+        figure = Figure(figsize=(12, 5))
+        FigureCanvasAgg(figure)
+        score_axis, mismatch_axis = figure.subplots(1, 2)
+        _draw_histogram(score_axis, counts, edges)
+        _draw_mismatches(mismatch_axis, mismatches)
+        figure.suptitle(title)
+        figure.savefig(file_path, dpi=dpi, bbox_inches='tight')
+        paths.append(file_path)
+    return paths
+
+
+
+def plot_query_reports(results:Union[xrResult, Iterable[xrResult]], directory:str, bins:int = 10, workers:int = None,
+                       batch_size:int = _REPORT_BATCH_SIZE, format:str = 'png', dpi:int = 100) -> List[str]:
+    """
+    Saves one report figure per query: the relatedness score histogram next to the mismatch distribution.
+
+    The distributions are aggregated in the calling process, so only a few counts per query are
+    sent to the worker processes, which render the figures in batches of batch_size. Every query
+    gets a figure, an empty one when it has no hit. Figures are named after their query; a query
+    repeated in the results, e.g. screened against several alleles, is suffixed with its allele
+    (characters other than letters, digits, '.', '_' and '-' becoming '_'), then with a counter.
+
+    :param results: An xrResult, long-form results being split by query, or an iterable of xrResult
+                    objects such as the list returned by cross_compose_many.
+    :param directory: The directory the figures are saved to, created if missing.
+    :param bins: The number of bins of the score histograms.
+    :param workers: The number of worker processes rendering figures (defaults to rendering in-process).
+    :param batch_size: The number of figures rendered per worker task.
+    :param format: The image format, also used as the file extension, e.g. 'png', 'svg' or 'pdf'.
+    :param dpi: The resolution of the figures.
+    :return: The file paths of the figures, in query order.
+    :raises ValueError: If batch_size is not positive.
+    """
+
+    if batch_size < 1:
+        raise ValueError(f"The batch size must be positive, got {batch_size} instead.")
+    os.makedirs(directory, exist_ok=True)
+
+    reports = list(_split_queries(results))
+    names = _report_names([(query, allele) for query, allele, _, _ in reports])
+    tasks = []
+    for name, (query, allele, scores, mismatches) in zip(names, reports):
+        counts, edges = _score_histogram(scores, bins)
+        title = f"{query} ({allele}, {len(scores):,} hits)" if allele else f"{query} ({len(scores):,} hits)"
+        tasks.append((os.path.join(directory, f"{name}.{format}"), title, counts, edges, _mismatch_counts(mismatches), dpi))
+    batches = [tasks[start:start + batch_size] for start in range(0, len(tasks), batch_size)]
+
+    if workers is None or workers <= 1 or len(batches) <= 1:
+        parts = [_render_reports(batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            parts = list(executor.map(_render_reports, batches))
+    return [file_path for part in parts for file_path in part]
@@ -1,14 +1,213 @@
 # Import needed libraries
 import argparse
-from crossdome.core_functions import cross_compose
-from crossdome.utils import load_hla_database, save_results_to_csv
-from crossdome.visualization import plot_similarity_heatmap
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List
 
-def main():
-    # Argument parser for command-line inputs? 
-    pass
+from crossdome.core_classes import xrBackground, xrResult
+from crossdome.core_functions import _internal_checking_peptide, cross_compose_many
+from crossdome.export import write_results
+from crossdome.parallel import ScreeningPool
+from crossdome.utils import load_background_file, read_query_peptides
+
+"""
+Command-line batch screening with CrossDome.
+
+Queries are streamed from a CSV or FASTA file in batches, screened against a
+background loaded from a CSV dataset or a binary background file, and the hits
+of every batch are appended to the output file as soon as they are ready, so
+memory stays bounded whatever the number of queries. Queries are validated before
+anything is written, so an invalid query never leaves a partial output file;
+with --skip-invalid, invalid queries are reported and skipped instead.
+
+Usage:
+    python main.py --queries queries.fasta --background hla_a0101.xrbg --output hits.csv.gz --workers 8 --top-k 50
+    python main.py --queries queries.csv --background peptides.csv --allele HLA-A*01:01 --output hits.parquet
+"""
+
+
+
+def _parse_weights(value:str) -> List[float]:
+    """Parses a comma-separated list of position weights."""
+
+    try:
+        return [float(weight) for weight in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Position weights must be comma-separated numbers, got {value} instead.")
+
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the command-line argument parser.
+
+    :return: An argparse.ArgumentParser.
+    """
+
+    parser = argparse.ArgumentParser(prog="crossdome", description="Screen query peptides against an HLA background for cross-reactivity.")
+    parser.add_argument("--queries", required=True, help="CSV or FASTA file of query peptides (optionally .gz, .bz2 or .xz).")
+    parser.add_argument("--query-column", default="peptide", help="Column of the query peptides in a CSV file.")
+    parser.add_argument("--background", required=True, help="Binary background file or CSV peptide dataset.")
+    parser.add_argument("--allele", help="Allele of a CSV background.")
+    parser.add_argument("--peptide-column", default="peptide", help="Column of the background peptides in a CSV file.")
+    parser.add_argument("--deduplicate", action="store_true", help="Drop repeated peptides of a CSV background.")
+    parser.add_argument("--output", required=True, help="Output file, .csv (optionally compressed), .parquet or .arrow.")
+    parser.add_argument("--columns", help="Comma-separated output columns (defaults to every column).")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes sharing the background.")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Queries read and screened per batch.")
+    parser.add_argument("--top-k", type=int, help="Report at most this many hits per query.")
+    parser.add_argument("--max-score", type=float, help="Report hits with a relatedness score at or below this value.")
+    parser.add_argument("--max-mismatches", type=int, help="Report hits with at most this many mismatches.")
+    parser.add_argument("--position-weight", type=_parse_weights, help="Comma-separated position weights, one per query residue.")
+    parser.add_argument("--substitution", help="Substitution matrix used for scoring, e.g. blosum62.")
+    parser.add_argument("--null", choices=("normal", "empirical"), default="normal", help="Null distribution of the statistics.")
+    parser.add_argument("--align", action="store_true", help="Also score background peptides of other lengths, anchor-aligned.")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="Skip and report invalid queries instead of failing before the screen starts.")
+    parser.add_argument("--quiet", action="store_true", help="Do not report progress.")
+    return parser
+
+
+
+def screen_batches(batches:Iterable[List[str]], background:xrBackground, workers:int = 1, align:bool = False,
+                   **options:Any) -> Iterator[xrResult]:
+    """
+    Screens batches of queries, yielding one long-form result per batch.
+
+    With several workers, one ScreeningPool is started per query length on first use and
+    reused by every later batch, so the background is shared with the workers only once.
+
+    :param batches: An iterable of query peptide lists.
+    :param background: The background to screen against.
+    :param workers: The number of worker processes.
+    :param align: Score peptides of other lengths, aligned on their anchors.
+    :param options: Scoring and selection options of cross_compose_many.
+    :return: An iterator of long-form xrResult objects, in batch order.
+    """
+
+    if align and workers > 1:
+        raise ValueError("Aligned scoring across peptide lengths does not support workers.")
+
+    pools: Dict[int, ScreeningPool] = {}
+    try:
+        for batch in batches:
+            if workers <= 1:
+                yield cross_compose_many(batch, background, long_form=True, align=align, **options)
+                continue
+
+            # One pool per length bucket, results are put back in query order
+            results: List[xrResult] = [None] * len(batch)
+            for length in sorted(set(map(len, batch))):
+                members = [position for position, query in enumerate(batch) if len(query) == length]
+                if length not in pools:
+                    pools[length] = ScreeningPool(background.bucket(length), workers=workers)
+                for position, result in zip(members, pools[length].compose_many([batch[position] for position in members], **options)):
+                    results[position] = result
+            yield xrResult.concat(results, query=batch, allele=background.allele)
+    finally:
+        for pool in pools.values():
+            pool.close()
+
+
+
+def _valid_batches(batches:Iterable[List[str]], progress:Dict[str, float], stream:Any = None) -> Iterator[List[str]]:
+    """Drops invalid queries from the batches, counting and reporting them."""
+
+    for batch in batches:
+        valid = []
+        for query in batch:
+            try:
+                _internal_checking_peptide(query)
+            except ValueError as e:
+                progress['skipped'] += 1
+                if stream is not None:
+                    stream.write(f"\rSkipped query {query}: {e}\n")
+                continue
+            valid.append(query)
+        if valid:
+            yield valid
+
+
+
+def _check_queries(batches:Iterable[List[str]]) -> None:
+    """
+    Validates every query of a file before screening.
+
+    :param batches: An iterable of query peptide lists.
+    :raises ValueError: At the first invalid query, with its position in the file.
+    """
+
+    position = 0
+    for batch in batches:
+        for query in batch:
+            position += 1
+            try:
+                _internal_checking_peptide(query)
+            except ValueError as e:
+                raise ValueError(f"Invalid query {position} ({query}), nothing was screened: {e}")
+
+
+
+def _report_progress(results:Iterable[xrResult], progress:Dict[str, float], stream:Any = None) -> Iterator[xrResult]:
+    """Passes results through, counting queries and rows and reporting the throughput."""
+
+    for result in results:
+        progress['queries'] += len(result.query)
+        progress['rows'] += len(result)
+        if stream is not None:
+            elapsed = max(time.perf_counter() - progress['started'], 1e-9)
+            stream.write(f"\rScreened {progress['queries']:,} queries, {progress['rows']:,} rows "
+                         f"({progress['queries'] / elapsed:,.1f} queries/s)")
+            stream.flush()
+        yield result
+
+
+
+def main(argv:List[str] = None) -> int:
+    """
+    Runs a batch screen from the command line.
+
+    :param argv: Command-line arguments (defaults to sys.argv).
+    :return: The exit status.
+    """
+
+    args = build_parser().parse_args(argv)
+    if args.batch_size < 1:
+        build_parser().error("--batch-size must be at least 1.")
+    stream = None if args.quiet else sys.stderr
+
+    try:
+        background = load_background_file(args.background, allele=args.allele, peptide_column=args.peptide_column,
+                                          deduplicate=args.deduplicate)
+        if stream is not None:
+            stream.write(f"Loaded {background}\n")
+
+        options = {'position_weight': args.position_weight, 'top_k': args.top_k, 'max_score': args.max_score,
+                   'max_mismatches': args.max_mismatches, 'substitution': args.substitution, 'null': args.null}
+        progress = {'queries': 0, 'rows': 0, 'skipped': 0, 'started': time.perf_counter()}
+        batches = read_query_peptides(args.queries, peptide_column=args.query_column, batch_size=args.batch_size)
+        if args.skip_invalid:
+            batches = _valid_batches(batches, progress, stream)
+        else:
+            # A first pass over the queries, so a late invalid query does not abort a half-written screen
+            _check_queries(batches)
+            batches = read_query_peptides(args.queries, peptide_column=args.query_column, batch_size=args.batch_size)
+        results = screen_batches(batches, background, workers=args.workers, align=args.align, **options)
+        columns = args.columns.split(",") if args.columns else None
+        write_results(_report_progress(results, progress, stream), args.output, columns=columns)
+    except (ValueError, KeyError, IOError, ImportError) as e:
+        if stream is not None:
+            stream.write("\n")
+        sys.stderr.write(f"crossdome: error: {e}\n")
+        return 1
+
+    if stream is not None:
+        elapsed = time.perf_counter() - progress['started']
+        skipped = f", skipped {progress['skipped']:,} invalid queries" if progress['skipped'] else ""
+        stream.write(f"\nWrote {progress['rows']:,} rows for {progress['queries']:,} queries to {args.output} in {elapsed:.2f}s{skipped}\n")
+    return 0
 
 
 # Program entry point
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
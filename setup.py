@@ -20,6 +20,9 @@ setup(
         "pytest",
         "scipy"
     ],
+    extras_require={  # Optional dependencies
+        "parquet": ["pyarrow"]
+    },
     classifiers=[  # Categorization
         "Programming Language :: Python :: 3.12",
         "License :: OSI Approved :: MIT License",
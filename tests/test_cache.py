@@ -0,0 +1,127 @@
+# Import needed libraries & packages
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+
+# Import core and cache functions
+from crossdome.cache import ResultCache
+from crossdome.core_functions import cross_compose, cross_compose_many
+from crossdome.index import SegmentIndex
+
+"""
+Unit tests for the result cache in the CrossDome project.
+
+Tested Functions:
+    - ResultCache: In-memory and on-disk memoization of screening results.
+    - cross_compose / cross_compose_many: Scoring only the queries missing from the cache.
+"""
+
+class TestResultCache (unittest.TestCase):
+    """
+    Unit tests for the result cache in CrossDome.
+
+    Methods:
+
+    setUp(): Prepares a background and queries.
+    test_memory_tier(): Tests hits, misses and that cached results equal fresh ones.
+    test_invalidation(): Tests that changed backgrounds and options miss.
+    test_eviction(): Tests the size-bounded LRU eviction.
+    test_disk_tier(): Tests that entries survive in the on-disk tier.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        self.background = xrBackground(allele="HLA-A*01:01", peptides=["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLY"])
+        self.queries    = ["EVDPIGHLY", "ESDPIVAQY"]
+
+    def test_memory_tier (self):
+        """
+        Tests that repeated queries are answered from memory with identical results.
+        """
+
+        cache = ResultCache()
+        first = cross_compose_many(self.queries, self.background, top_k=2, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+        second = cross_compose_many(self.queries + ["EVDPIGHFY"], self.background, top_k=2, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+        for left, right in zip(first, second):
+            pd.testing.assert_frame_equal(left.result, right.result)
+
+        single = cross_compose(self.queries[0], self.background, top_k=2, cache=cache)
+        pd.testing.assert_frame_equal(single.result, first[0].result)
+        self.assertEqual(cache.stats['hits'], 3)
+
+        index = SegmentIndex(self.background, max_mismatches=2)
+        for _ in range(2):
+            hits = cross_compose(self.queries[0], self.background, max_mismatches=1, index=index, cache=cache)
+        self.assertEqual(hits.result['subject'].tolist(), ["EVDPIGLLY", "EVDPIGHFY"])
+        self.assertEqual(cache.hits, 4)
+
+    def test_invalidation (self):
+        """
+        Tests that other weights, options or background contents never reuse an entry.
+        """
+
+        cache = ResultCache()
+        cross_compose(self.queries[0], self.background, cache=cache)
+        cross_compose(self.queries[0], self.background, position_weight=[2.0] + [1.0] * 8, cache=cache)
+        cross_compose(self.queries[0], self.background, substitution='blosum62', cache=cache)
+
+        changed = xrBackground(allele="HLA-A*01:01", peptides=["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLF"])
+        result = cross_compose(self.queries[0], changed, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        self.assertEqual(result.result['subject'].tolist(), changed.peptides)
+
+        same = xrBackground(allele="HLA-A*01:01", peptides=list(self.background.peptides))
+        cross_compose(self.queries[0], same, cache=cache)
+        self.assertEqual(cache.hits, 1)
+
+    def test_eviction (self):
+        """
+        Tests that the in-memory tier stays within max_bytes, dropping the oldest entries.
+        """
+
+        cache = ResultCache()
+        cross_compose(self.queries[0], self.background, cache=cache)
+        entry_bytes = cache.nbytes
+
+        cache = ResultCache(max_bytes=entry_bytes * 2)
+        cross_compose_many(self.queries + ["EVDPIGHFY"], self.background, cache=cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+
+        cross_compose(self.queries[0], self.background, cache=cache)
+        self.assertEqual(cache.misses, 4)
+        with self.assertRaises(ValueError):
+            ResultCache(max_bytes=-1)
+
+    def test_disk_tier (self):
+        """
+        Tests that a new cache over the same directory answers from disk.
+        """
+
+        with tempfile.TemporaryDirectory() as directory:
+            expected = cross_compose_many(self.queries, self.background, cache=ResultCache(directory=directory))
+
+            cache = ResultCache(directory=directory)
+            results = cross_compose_many(self.queries, self.background, cache=cache)
+            self.assertEqual((cache.hits, cache.disk_hits, cache.misses), (2, 2, 0))
+            for left, right in zip(expected, results):
+                pd.testing.assert_frame_equal(left.result, right.result)
+                self.assertEqual(left.analysis['score_summary'], right.analysis['score_summary'])
+
+            cache.clear(disk=True)
+            self.assertNotIn(ResultCache.key(self.queries[0], self.background, [1.0] * 9), cache)
+            self.assertEqual(len(cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,11 @@ import pandas as pd
 from crossdome.core_classes import xrBackground, xrResult
 
 # Import core functions 
-from crossdome.core_functions import cross_compose, calculate_relatedness, cross_pair_summary, cross_write, cross_substitution_matrix
+from crossdome.core_functions import cross_compose, cross_compose_many, calculate_relatedness, cross_pair_summary, cross_write, cross_substitution_matrix
+from crossdome.core_functions import _internal_related_distance
+from crossdome.index import SegmentIndex
+from crossdome.null import ScoreSummaries, empirical_null
+from crossdome.quant import mismatch_distribution
 
 """
 Unit tests for the core functions in the CrossDome project.
@@ -17,6 +21,8 @@ Tested Functions:
     - cross_compose: Compares a query peptide against a background set of peptides.
     - cross_pair_summary: Provides a summary of relatedness scores for a query and background peptides.
     - calculate_relatedness: Calculates the relatedness score between two peptides.
+    - cross_compose_many: Screens batches of queries, serially or in a process pool.
+    - xrBackground.append / xrBackground.remove: Incremental background updates.
 
 The tests ensure that these functions behave as expected and return valid results.
 """
@@ -29,6 +35,19 @@ class TestCoreFunctions (unittest.TestCase):
     
     setUp(): Prepares data for use in the tests.
     test_cross_compose(): Tests the cross_compose function to ensure proper output.
+    test_cross_compose_matches_reference(): Tests the vectorized engine against the per-pair reference.
+    test_background_validation(): Tests background validation and deduplication.
+    test_cross_compose_many(): Tests batched screening against per-query results.
+    test_cross_compose_ranking(): Tests that ranks follow sorted relatedness scores.
+    test_cross_compose_selection(): Tests the top_k and threshold modes.
+    test_cross_compose_workers(): Tests that the process-pool mode matches the single-process engine.
+    test_cross_compose_index(): Tests the segment index pre-filter.
+    test_cross_compose_substitution(): Tests substitution-matrix scoring.
+    test_cross_compose_mixed_lengths(): Tests length-bucketed backgrounds.
+    test_result_views(): Tests the array-backed result views.
+    test_cross_compose_empirical_null(): Tests the empirical null statistics.
+    test_background_updates(): Tests appending and removing peptides, and the index kept in sync.
+    test_cross_compose_index_summaries(): Tests the statistics of an index search maintained across updates.
     test_cross_pair_summary(): Tests the cross_pair_summary function for correctness.
     test_calculate_relatedness(): Tests the calculate_relatedness function for valid scores.
     """
@@ -57,6 +76,310 @@ class TestCoreFunctions (unittest.TestCase):
         self.assertEqual(len(result.result), len(self.background_peptides))
         self.assertTrue("relatedness_score" in result.result.columns)
         
+    def test_cross_compose_matches_reference (self):
+        """
+        Tests that the vectorized scoring engine reproduces the per-pair
+        reference implementation exactly, with and without position weights.
+        """
+        
+        weights = [0.5, 1.0, 2.0, 1.0, 1.5, 1.0, 0.25, 1.0, 3.0]
+        for position_weight in (None, weights):
+            result = cross_compose(self.query, self.background, position_weight=position_weight)
+            expected = [
+                _internal_related_distance(np.array(list(self.query)), np.array(list(element)), position_weight or [1.0] * 9)
+                for element in self.background_peptides
+            ]
+            np.testing.assert_array_equal(result.result['relatedness_score'].to_numpy(), expected)
+            self.assertEqual(result.result['num_positive'].tolist(), [5, 8, 8])
+            self.assertEqual(result.result['num_negative'].tolist(), [4, 1, 1])
+    
+    def test_background_validation (self):
+        """
+        Tests that the background rejects wrong lengths and non-standard amino acids
+        at construction, and that deduplication keeps the first occurrence order.
+        """
+        
+        with self.assertRaises(ValueError):
+            xrBackground(allele="HLA-A*01:01", peptides=["EVDPIGHLY", "EVDPIGHLX"])
+        with self.assertRaises(ValueError):
+            xrBackground(allele="HLA-A*01:01", peptides=["EVDPIGHLY", "EVDPIGHL"])
+        
+        background = xrBackground(allele="HLA-A*01:01", peptides=self.background_peptides * 2 + ["EVDPIGHLY"], deduplicate=True)
+        self.assertEqual(background.peptides, self.background_peptides + ["EVDPIGHLY"])
+        self.assertEqual(background.encoded.shape, (4, 9))
+        self.assertEqual(background.encoded.dtype, np.uint8)
+        self.assertEqual(background.stats['database'], 4)
+        
+    def test_cross_compose_many (self):
+        """
+        Tests that batched screening matches per-query cross_compose results,
+        independently of the block size, and that long-form output stacks queries.
+        """
+        
+        queries = ["EVDPIGHLY", "ESDPIVAQY", "KVAELVHFL"]
+        for block_size in (1, 4, 1 << 20):
+            results = cross_compose_many(queries, self.background, block_size=block_size)
+            self.assertEqual([result.query for result in results], queries)
+            for query, result in zip(queries, results):
+                pd.testing.assert_frame_equal(result.result, cross_compose(query, self.background).result)
+        
+        long_form = cross_compose_many(queries, self.background, long_form=True)
+        self.assertEqual(len(long_form.result), len(queries) * len(self.background_peptides))
+        self.assertEqual(long_form.result['query'].unique().tolist(), queries)
+        
+    def test_cross_compose_ranking (self):
+        """
+        Tests that ranks follow sorted relatedness scores rather than row order.
+        """
+        
+        result = cross_compose(self.query, self.background).result
+        expected = result['relatedness_score'].rank(method='first').astype(int).tolist()
+        self.assertEqual(result['rank'].tolist(), expected)
+        self.assertEqual(result.loc[result['rank'] == 1, 'percentile_rank'].item(), 0.0)
+        self.assertEqual(result['percentile_rank'].max(), 100.0)
+    
+    def test_cross_compose_selection (self):
+        """
+        Tests the top_k and threshold modes:
+        - Only the selected hits are returned, best score first.
+        - Statistics and ranks are still computed over the full background.
+        """
+        
+        full = cross_compose(self.query, self.background).result.sort_values('rank')
+        
+        top = cross_compose(self.query, self.background, top_k=2).result
+        self.assertEqual(top['subject'].tolist(), full['subject'].head(2).tolist())
+        np.testing.assert_allclose(top['zscore'], full['zscore'].head(2))
+        self.assertEqual(top['rank'].tolist(), [1, 2])
+        
+        within = cross_compose(self.query, self.background, max_mismatches=1).result
+        self.assertEqual(sorted(within['subject']), ["EVDPIGHFY", "EVDPIGLLY"])
+        
+        strict = cross_compose(self.query, self.background, max_score=-1.0).result
+        self.assertEqual(len(strict), 0)
+        
+        with self.assertRaises(ValueError):
+            cross_compose(self.query, self.background, top_k=0)
+        
+    def test_cross_compose_workers (self):
+        """
+        Tests that the process-pool mode merges shards into the same results
+        as the single-process engine, for full and top_k outputs, and for an empty background.
+        """
+        
+        queries = ["EVDPIGHLY", "ESDPIVAQY"]
+        for top_k in (None, 2):
+            serial = cross_compose_many(queries, self.background, top_k=top_k)
+            parallel = cross_compose_many(queries, self.background, top_k=top_k, workers=2)
+            for left, right in zip(serial, parallel):
+                pd.testing.assert_frame_equal(left.result, right.result)
+        
+        # An empty background has no shard to merge
+        empty = xrBackground.from_encoded("HLA-A*01:01", np.zeros((0, 9), dtype=np.uint8))
+        for selection in ({'top_k': 2}, {'max_score': 1.0}):
+            serial = cross_compose_many(queries, empty, **selection)
+            parallel = cross_compose_many(queries, empty, workers=2, **selection)
+            for left, right in zip(serial, parallel):
+                self.assertEqual(len(right), 0)
+                pd.testing.assert_frame_equal(left.result, right.result)
+        
+    def test_cross_compose_index (self):
+        """
+        Tests that the segment index pre-filter finds exactly the peptides within
+        the mismatch radius, for cross_compose and mismatch_distribution.
+        """
+        
+        index = SegmentIndex(self.background, max_mismatches=2)
+        result = cross_compose(self.query, self.background, max_mismatches=1, index=index).result
+        full = cross_compose(self.query, self.background, max_mismatches=1).result
+        self.assertEqual(result['subject'].tolist(), full['subject'].tolist())
+        np.testing.assert_array_equal(result['relatedness_score'], full['relatedness_score'])
+        
+        self.assertEqual(mismatch_distribution(self.query, self.background_peptides, index=index), [1, 1])
+        with self.assertRaises(ValueError):
+            index.search(self.query, max_mismatches=3)
+        
+    def test_cross_compose_substitution (self):
+        """
+        Tests substitution-matrix scoring:
+        - The identity matrix reduces the score to the fraction of mismatches.
+        - BLOSUM62 scores a perfect match as 0 and ranks conservative substitutions first.
+        - Malformed matrices raise a ValueError.
+        """
+        
+        identity = cross_compose(self.query, self.background, substitution='identity').result
+        np.testing.assert_allclose(identity['relatedness_score'], identity['num_negative'] / 9)
+        
+        background = xrBackground(allele="HLA-A*01:01", peptides=["EVDPIGHLY", "EVDPIGHIY", "EVDPIGHWY"])
+        blosum = cross_compose(self.query, background, substitution='blosum62').result
+        self.assertEqual(blosum['relatedness_score'].iloc[0], 0.0)
+        self.assertEqual(blosum['rank'].tolist(), [1, 2, 3])
+        
+        with self.assertRaises(ValueError):
+            cross_compose(self.query, self.background, substitution=np.ones((20, 19)))
+        with self.assertRaises(ValueError):
+            cross_compose(self.query, self.background, substitution='pam30')
+        
+    def test_cross_compose_mixed_lengths (self):
+        """
+        Tests length-bucketed backgrounds:
+        - Peptides are split into one encoded bucket per length.
+        - A query is scored only against its own length bucket, like a single-length background.
+        - Batches of mixed-length queries are returned in query order.
+        - With align, every bucket is scored on anchor-aligned positions.
+        """
+        
+        decamers = ["EVDPAIGHLY", "ASDPIGHLLY"]
+        background = xrBackground(allele="HLA-A*01:01", peptides=decamers + self.background_peptides, lengths=range(8, 12))
+        self.assertEqual(background.lengths, [8, 9, 10, 11])
+        self.assertEqual(background.bucket(10).encoded.shape, (2, 10))
+        self.assertEqual(background.peptides, self.background_peptides + decamers)
+        self.assertEqual(background.take_peptides([4, 0]), ["ASDPIGHLLY", "ESDPIVAQY"])
+        with self.assertRaises(ValueError):
+            background.encoded
+        with self.assertRaises(ValueError):
+            xrBackground(allele="HLA-A*01:01", peptides=["EVDPIGHLY", "EVDPIGHLLLLY"], lengths=(9, 10))
+        
+        expected = cross_compose(self.query, self.background).result
+        pd.testing.assert_frame_equal(cross_compose(self.query, background).result, expected)
+        
+        results = cross_compose_many(["EVDPAIGHLY", self.query], background)
+        self.assertEqual([result.query for result in results], ["EVDPAIGHLY", self.query])
+        self.assertEqual(results[0].result['subject'].tolist(), decamers)
+        self.assertEqual(results[0].result['num_negative'].tolist(), [0, 6])
+        with self.assertRaises(ValueError):
+            cross_compose("EVDPIGHLLY", self.background)
+        with self.assertRaises(ValueError):
+            cross_compose("EVDPIGHLLY", background, position_weight=[1.0] * 9)
+        
+        # EVDPIGHLY matches EVDPAIGHLY on both anchor halves, the central insertion is skipped
+        aligned = cross_compose(self.query, background, align=True).result
+        self.assertEqual(aligned['subject'].tolist(), background.peptides)
+        self.assertEqual(aligned['num_negative'].tolist()[:3], expected['num_negative'].tolist())
+        self.assertEqual(aligned['num_negative'].tolist()[3:], [0, 5])
+        
+    def test_result_views (self):
+        """
+        Tests the array-backed xrResult:
+        - filter, select and mutate return views matching the equivalent DataFrame operations.
+        - String filters support @variables and backtick-quoted names.
+        - Views do not share the metadata dictionaries of their parent.
+        - Columns can be read without building the DataFrame.
+        - Long-form results stack the per-query arrays.
+        """
+        
+        result = cross_compose(self.query, self.background)
+        frame = result.to_dataframe()
+        
+        filtered = result.filter("num_negative <= 1 and relatedness_score > 0")
+        expected = frame.query("num_negative <= 1 and relatedness_score > 0")
+        pd.testing.assert_frame_equal(filtered.result, expected.reset_index(drop=True))
+        self.assertEqual(len(result), 3)
+        self.assertIsNone(result._frame)
+        
+        self.assertEqual(result.filter(result.column('rank') == 1).column('subject').tolist(), ["EVDPIGLLY"])
+        
+        # Query strings resolve @variables in the caller and backtick-quoted names, like DataFrame.query
+        limit = 1
+        for source in (result, xrResult(result.query, frame, result.allele)):
+            self.assertEqual(source.filter("`rank` <= @limit").column('subject').tolist(), ["EVDPIGLLY"])
+            self.assertEqual(len(source.filter("relatedness_score < @limit and num_negative >= 1")), 2)
+        self.assertEqual(result.filter(lambda hits: hits.column('num_positive') < 6).column('subject').tolist(), ["ESDPIVAQY"])
+        
+        selected = result.select(['subject', 'rank']).mutate(strong=lambda hits: hits.column('rank') <= 2, tag="x")
+        self.assertEqual(selected.columns, ['subject', 'rank', 'strong', 'tag'])
+        self.assertEqual(selected.filter("strong").result['tag'].tolist(), ["x", "x"])
+        with self.assertRaises(KeyError):
+            result.select(['missing'])
+        
+        # Views copy the metadata dictionaries of their parent
+        result.analysis['source'] = "parent"
+        analysis = dict(result.analysis)
+        view = result.filter("rank <= 2")
+        view.analysis['score_summary'] = {}
+        view.expression['tissue'] = 1.0
+        self.assertEqual(result.analysis, analysis)
+        self.assertEqual(result.expression, {})
+        self.assertEqual(view.analysis['source'], "parent")
+        
+        long_form = cross_compose_many([self.query, "ESDPIVAQY"], self.background, long_form=True, top_k=2)
+        self.assertEqual(long_form.column('query').tolist(), [self.query] * 2 + ["ESDPIVAQY"] * 2)
+        self.assertEqual(long_form.filter("query == 'ESDPIVAQY'").column('rank').tolist(), [1, 2])
+
+    def test_cross_compose_empirical_null (self):
+        """
+        Tests the empirical null:
+        - The null is sampled once per background and reused from the cache.
+        - Small backgrounds are scored exhaustively, without pairing a peptide with itself.
+        - P-values and percentile ranks are lookups into the sorted null scores.
+        - Index pre-filtered results get statistics, the normal default is unchanged.
+        """
+
+        null = empirical_null(self.background)
+        self.assertIs(empirical_null(self.background), null)
+        self.assertEqual(len(null), 3 * 2)
+        self.assertTrue(np.all(np.diff(null.scores) >= 0))
+        self.assertTrue(np.all(null.scores > 0))
+        with self.assertRaises(ValueError):
+            empirical_null(xrBackground(allele="HLA-A*01:01", peptides=[self.query]))
+
+        result = cross_compose(self.query, self.background, null='empirical').result
+        below = np.searchsorted(null.scores, result['relatedness_score'], side='right')
+        np.testing.assert_allclose(result['pvalue'], (below + 1) / (len(null) + 1))
+        np.testing.assert_allclose(result['zscore'], (result['relatedness_score'] - null.mean) / null.std)
+
+        index = SegmentIndex(self.background, max_mismatches=2)
+        hits = cross_compose(self.query, self.background, max_mismatches=1, index=index, null='empirical').result
+        self.assertFalse(hits['pvalue'].isna().any())
+        self.assertTrue(cross_compose(self.query, self.background, max_mismatches=1, index=index).result['pvalue'].isna().all())
+
+        pd.testing.assert_frame_equal(cross_compose(self.query, self.background, null='normal').result,
+                                      cross_compose(self.query, self.background).result)
+        with self.assertRaises(ValueError):
+            cross_compose(self.query, self.background, null='gamma')
+
+    def test_background_updates (self):
+        """
+        Tests that appending and removing peptides updates the buckets, the statistics and a
+        subscribed segment index exactly as rebuilding them would.
+        """
+        
+        index = SegmentIndex(self.background, max_mismatches=2)
+        fingerprint = self.background.fingerprint()
+        self.assertEqual(self.background.append(["EVDPIGHLF", "ESDPIVAQY"], deduplicate=True), 1)
+        self.assertEqual(len(self.background), 4)
+        self.assertEqual(self.background.stats['database'], 4)
+        self.assertNotEqual(self.background.fingerprint(), fingerprint)
+        self.assertEqual(self.background.remove(["EVDPIGHFY", "AAAAAAAAA"]), 1)
+        self.assertEqual(sorted(self.background.peptides), ["ESDPIVAQY", "EVDPIGHLF", "EVDPIGLLY"])
+        self.assertEqual(len(self.background.bucket(9)), 3)
+        
+        rebuilt = SegmentIndex(xrBackground(allele="HLA-A*01:01", peptides=self.background.peptides), max_mismatches=2)
+        for max_mismatches in (0, 1, 2):
+            self.assertEqual(sorted(self.background.peptides[row] for row in index.search(self.query, max_mismatches)[0]),
+                             sorted(rebuilt.background.peptides[row] for row in rebuilt.search(self.query, max_mismatches)[0]))
+        with self.assertRaises(ValueError):
+            self.background.append(["EVDPIGHL"])
+        
+    def test_cross_compose_index_summaries (self):
+        """
+        Tests that score summaries give an index search the statistics of the full background,
+        kept up to date across background updates.
+        """
+        
+        index = SegmentIndex(self.background, max_mismatches=2)
+        summaries = ScoreSummaries(self.background)
+        summaries.summary(self.query)
+        self.background.append(["EVDPIGHLF", "KLDPIGHLY"])
+        self.background.remove(["ESDPIVAQY"])
+        
+        result = cross_compose(self.query, self.background, max_mismatches=1, index=index, summaries=summaries)
+        full = cross_compose(self.query, self.background).result.set_index('subject')
+        frame = result.result
+        np.testing.assert_allclose(frame['zscore'], full.loc[frame['subject'], 'zscore'])
+        with self.assertRaises(ValueError):
+            cross_compose(self.query, self.background, summaries=summaries)
+
     def test_cross_pair_summary(self):
         """
         Tests the cross_pair_summary function to verify:
@@ -0,0 +1,116 @@
+# Import needed libraries & packages
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+import pandas as pd
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+
+# Import core and export functions
+from crossdome.core_functions import cross_compose, cross_compose_many, cross_write
+from crossdome.export import ResultWriter, write_results
+
+"""
+Unit tests for the streaming result export in the CrossDome project.
+
+Tested Functions:
+    - ResultWriter: Chunked CSV, compressed CSV, Parquet and Arrow output.
+    - cross_write: Single results and iterables of results.
+"""
+
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+class TestExport (unittest.TestCase):
+    """
+    Unit tests for the result export in CrossDome.
+
+    Methods:
+
+    setUp(): Prepares a temporary directory and screening results.
+    test_csv_chunks(): Tests that chunked CSV output equals the concatenated results.
+    test_selected_columns(): Tests writing a subset of the columns.
+    test_arrow_formats(): Tests Parquet and Arrow IPC output.
+    test_arrow_empty_first_chunk(): Tests Arrow output whose first chunk holds no hit.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        self.directory  = tempfile.TemporaryDirectory()
+        self.background = xrBackground(allele="HLA-A*01:01", peptides=["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLY"])
+        self.results    = cross_compose_many(["EVDPIGHLY", "ESDPIVAQY"], self.background)
+        self.expected   = pd.concat([result.result for result in self.results], ignore_index=True)
+
+    def tearDown (self):
+        """
+        Removes the temporary directory.
+        """
+
+        self.directory.cleanup()
+
+    def test_csv_chunks (self):
+        """
+        Tests that results streamed in small chunks, plain or gzip compressed, read back as one table.
+        """
+
+        for name in ("results.csv", "results.csv.gz"):
+            path = os.path.join(self.directory.name, name)
+            with ResultWriter(path, chunk_rows=2) as writer:
+                for result in self.results:
+                    writer.write(result)
+            self.assertEqual(writer.rows, 6)
+            pd.testing.assert_frame_equal(pd.read_csv(path), pd.read_csv(io.StringIO(self.expected.to_csv(index=False))))
+
+        path = os.path.join(self.directory.name, "single.csv")
+        cross_write(cross_compose("EVDPIGHLY", self.background), path)
+        self.assertEqual(len(pd.read_csv(path)), 3)
+
+    def test_selected_columns (self):
+        """
+        Tests that only the selected columns are written, in order, and that missing ones raise a KeyError.
+        """
+
+        path = os.path.join(self.directory.name, "columns.csv")
+        cross_write(iter(self.results), path, columns=['subject', 'relatedness_score'])
+        self.assertEqual(pd.read_csv(path).columns.tolist(), ['subject', 'relatedness_score'])
+
+        with self.assertRaises(KeyError):
+            write_results(self.results, path, columns=['missing'])
+        with self.assertRaises(ValueError):
+            ResultWriter(path, format='xlsx')
+
+    @unittest.skipUnless(_HAS_PYARROW, "pyarrow is not installed")
+    def test_arrow_formats (self):
+        """
+        Tests that Parquet and Arrow IPC files hold every chunk.
+        """
+
+        for name in ("results.parquet", "results.arrow"):
+            path = os.path.join(self.directory.name, name)
+            self.assertEqual(write_results(self.results, path), 6)
+            loaded = pd.read_parquet(path) if name.endswith("parquet") else pd.read_feather(path)
+            self.assertEqual(loaded['subject'].tolist(), self.expected['subject'].tolist())
+            self.assertEqual(loaded['rank'].tolist(), self.expected['rank'].tolist())
+
+    @unittest.skipUnless(_HAS_PYARROW, "pyarrow is not installed")
+    def test_arrow_empty_first_chunk (self):
+        """
+        Tests that a first chunk without hits does not fix the query and subject columns to the null type.
+        """
+
+        results = cross_compose_many(["AAAAAAAAA", "EVDPIGHLY"], self.background, max_mismatches=1)
+        self.assertEqual(len(results[0]), 0)
+        for name in ("empty.parquet", "empty.arrow"):
+            path = os.path.join(self.directory.name, name)
+            cross_write(iter(results), path)
+            loaded = pd.read_parquet(path) if name.endswith("parquet") else pd.read_feather(path)
+            self.assertEqual(loaded['subject'].tolist(), results[1].result['subject'].tolist())
+            self.assertEqual(loaded['query'].tolist(), ["EVDPIGHLY"] * len(results[1]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# Import needed libraries & packages
+import unittest
+import numpy as np
+import pandas as pd
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+
+# Import core and expression functions
+from crossdome.core_functions import cross_compose, cross_compose_many
+from crossdome.expression import ExpressionIndex
+
+"""
+Unit tests for the expression annotation in the CrossDome project.
+
+Tested Functions:
+    - ExpressionIndex: Peptide to source gene to tissue expression lookups.
+    - ExpressionIndex.annotate: Expression columns joined onto result hits.
+"""
+
+class TestExpressionIndex (unittest.TestCase):
+    """
+    Unit tests for the CrossDome expression index.
+
+    Methods:
+
+    setUp(): Prepares an expression table, a peptide to gene mapping and a background.
+    test_lookup(): Tests gene and symbol lookups, shared peptides and missing peptides.
+    test_annotate(): Tests the expression columns of array-backed and DataFrame results.
+    test_bundled_table(): Tests an index over the bundled HPA table.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        self.expression = pd.DataFrame({'gene_donor': ["MAGEA3", "TTN", "ALB"], 'Liver': [0.0, 1.5, 900.0],
+                                        'Testis': [120.0, 2.0, np.nan], 'Heart Muscle': [0.0, 300.0, 0.5]},
+                                       index=pd.Index(["ENSG01", "ENSG02", "ENSG03"], name='ensembl_id'))
+        self.mapping = pd.DataFrame({'peptide': ["EVDPIGHLY", "ESDPIVAQY", "ESDPIVAQY", "KVAELVHFL", "EVDPIGHLY"],
+                                     'gene': ["MAGEA3", "ENSG02", "ALB", "UNKNOWN", "MAGEA3"]})
+        self.index = ExpressionIndex.from_dataframe(self.mapping, expression=self.expression)
+        self.background = xrBackground("HLA-A*01:01", ["EVDPIGHLY", "ESDPIVAQY", "KVAELVHFL", "EVDPIGHFY"])
+
+    def test_lookup (self):
+        """
+        Tests gene and symbol lookups, shared peptides and missing peptides.
+        """
+
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.tissues, ['Liver', 'Testis', 'Heart Muscle'])
+        self.assertEqual(self.index.source_genes(["EVDPIGHLY", "ESDPIVAQY", "KVAELVHFL", "AAAAAAAAA"]).tolist(),
+                         ["MAGEA3", "ENSG02;ALB", "UNKNOWN", None])
+
+        profiles = self.index.lookup(["EVDPIGHLY", "ESDPIVAQY", "KVAELVHFL"])
+        self.assertEqual(profiles.dtype, np.float32)
+        np.testing.assert_array_equal(profiles[0], [0.0, 120.0, 0.0])
+        # Shared peptides take the per-tissue maximum, ignoring missing values
+        np.testing.assert_array_equal(profiles[1], [900.0, 2.0, 300.0])
+        self.assertTrue(np.isnan(profiles[2]).all())
+
+        table = self.index.profile_table(["EVDPIGHLY"], tissues=["Testis"])
+        self.assertEqual(table.loc["Testis", "EVDPIGHLY"], 120.0)
+        with self.assertRaises(KeyError):
+            self.index.lookup(["EVDPIGHLY"], tissues=["Brain"])
+        with self.assertRaises(KeyError):
+            ExpressionIndex.from_dataframe(self.mapping, gene_column='symbol', expression=self.expression)
+        with self.assertRaises(ValueError):
+            ExpressionIndex(["EVDPIGHLY"], [], expression=self.expression)
+
+    def test_annotate (self):
+        """
+        Tests the expression columns of array-backed and DataFrame results.
+        """
+
+        result = cross_compose("EVDPIGHLY", self.background)
+        annotated = self.index.annotate(result, tissues=["Liver", "Testis"])
+        frame = annotated.result
+        self.assertEqual(list(frame.columns[-3:]), ['gene', 'Liver', 'Testis'])
+
+        expected = self.index.lookup(frame['subject'], tissues=["Liver", "Testis"])
+        np.testing.assert_array_equal(frame[['Liver', 'Testis']].to_numpy(), expected)
+        genes = pd.Series(self.index.source_genes(frame['subject']))
+        self.assertEqual(frame['gene'].fillna("").tolist(), genes.fillna("").tolist())
+
+        # Long-form and DataFrame-backed results are annotated the same way
+        long_form = cross_compose_many(["EVDPIGHLY", "KVAELVHFL"], self.background, long_form=True)
+        annotated = self.index.annotate(long_form)
+        self.assertEqual(len(annotated), 8)
+        np.testing.assert_array_equal(annotated.column('Heart Muscle'),
+                                      self.index.lookup(long_form.column('subject'), tissues=["Heart Muscle"])[:, 0])
+
+        result.result = result.to_dataframe()
+        annotated = self.index.annotate(result, tissues=["Liver"])
+        np.testing.assert_array_equal(annotated.result['Liver'].to_numpy(), expected[:, 0])
+
+    def test_bundled_table (self):
+        """
+        Tests an index over the bundled HPA table.
+        """
+
+        index = ExpressionIndex(["EVDPIGHLY", "ESDPIVAQY"], ["TSPAN6", "ENSG00000000419"])
+        self.assertEqual(len(index.genes), 20090)
+        self.assertIn('Liver', index.tissues)
+        profiles = index.profile_table(["EVDPIGHLY", "ESDPIVAQY"], tissues=["Liver"])
+        self.assertAlmostEqual(profiles.loc["Liver", "EVDPIGHLY"], 59.0, places=4)
+        self.assertAlmostEqual(profiles.loc["Liver", "ESDPIVAQY"], 43.0, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,12 @@ This file includes basic checks to ensure that the testing environment is set up
 
 """
 
+import subprocess
+import sys
 import unittest
 
+import crossdome
+
 class TestInitialization(unittest.TestCase):
     """
     A basic test case to verify that the test environment is set up correctly.
@@ -22,5 +26,35 @@ class TestInitialization(unittest.TestCase):
         """
         self.assertTrue(True, "Environment is set up correctly.")
 
+class TestLazyImport(unittest.TestCase):
+    """
+    Tests that the package imports its submodules on first access only.
+    
+    Methods:
+        test_import_is_light(): Verifies that importing the package loads no plotting or statistics library.
+        test_public_names(): Verifies that every public name resolves to its submodule's object.
+    """
+
+    def test_import_is_light(self):
+        """
+        Imports the package in a fresh interpreter and lists the heavy modules it loaded.
+        """
+        probe = "import sys, crossdome; print([name for name in ('matplotlib', 'seaborn', 'scipy', 'crossdome.core_functions') if name in sys.modules])"
+        output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "[]")
+
+    def test_public_names(self):
+        """
+        Resolves every public name, the submodules and an unknown name.
+        """
+        from crossdome.core_functions import cross_compose
+        self.assertIs(crossdome.cross_compose, cross_compose)
+        for name in crossdome.__all__:
+            self.assertTrue(callable(getattr(crossdome, name)), name)
+        self.assertIn('plot_query_reports', dir(crossdome))
+        self.assertEqual(crossdome.visualization.__name__, "crossdome.visualization")
+        with self.assertRaises(AttributeError):
+            crossdome.not_a_function
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,173 @@
+# Import needed libraries & packages
+import contextlib
+import importlib.util
+import io
+import os
+import tempfile
+import unittest
+import pandas as pd
+
+# Import core objects and functions
+from crossdome.core_classes import RESULT_COLUMNS, xrBackground
+from crossdome.core_functions import cross_compose_many
+from crossdome.utils import save_background_binary, read_query_peptides
+
+# Import the command-line entry point
+from main import main
+
+"""
+Unit tests for the command-line batch screening in the CrossDome project.
+
+Tested Functions:
+    - main: Streams queries from CSV or FASTA files against CSV or binary backgrounds.
+    - read_query_peptides: Batched query reading.
+"""
+
+class TestMain (unittest.TestCase):
+    """
+    Unit tests for the CrossDome command line.
+
+    Methods:
+
+    setUp(): Writes query and background files to a temporary directory.
+    test_query_files(): Tests batched reading of CSV and FASTA queries.
+    test_screen(): Tests that the written hits equal cross_compose_many results.
+    test_errors(): Tests that invalid inputs exit with status 1.
+    test_blank_queries(): Tests that blank query cells are skipped.
+    test_parquet_without_first_hits(): Tests Parquet output when the first batch has no hit.
+    test_empty_queries(): Tests that a query file without peptides writes a header-only file.
+    test_invalid_queries(): Tests that invalid queries fail before writing, or are skipped with --skip-invalid.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        self.directory  = tempfile.TemporaryDirectory()
+        self.queries    = ["EVDPIGHLY", "ESDPIVAQY", "EVDPAIGHLY"]
+        self.background = xrBackground(allele="HLA-A*01:01", peptides=["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLY", "ASDPIGHLLY"],
+                                       lengths=(9, 10))
+
+        self.query_csv   = self.path("queries.csv")
+        self.query_fasta = self.path("queries.fasta")
+        self.binary      = self.path("background.xrbg")
+        self.csv         = self.path("background.csv")
+        pd.DataFrame({'peptide': self.queries}).to_csv(self.query_csv, index=False)
+        with open(self.query_fasta, "w") as handle:
+            handle.write("".join(f">q{index}\n{query[:5]}\n{query[5:].lower()}\n" for index, query in enumerate(self.queries)))
+        save_background_binary(self.background, self.binary)
+        pd.DataFrame({'peptide': self.background.peptides}).to_csv(self.csv, index=False)
+
+    def tearDown (self):
+        """
+        Removes the temporary directory.
+        """
+
+        self.directory.cleanup()
+
+    def path (self, name:str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def run_main (self, *argv) -> int:
+        with contextlib.redirect_stderr(io.StringIO()):
+            return main(list(argv))
+
+    def test_query_files (self):
+        """
+        Tests that CSV and multi-line FASTA queries are read in batches.
+        """
+
+        for path in (self.query_csv, self.query_fasta):
+            self.assertEqual(list(read_query_peptides(path, batch_size=2)), [self.queries[:2], self.queries[2:]])
+
+    def test_screen (self):
+        """
+        Tests that every background and worker setting writes the same hits as cross_compose_many.
+        """
+
+        expected = cross_compose_many(self.queries, self.background, long_form=True, top_k=2).result
+        runs = [
+            (self.query_csv, ["--background", self.binary]),
+            (self.query_fasta, ["--background", self.csv, "--allele", "HLA-A*01:01", "--batch-size", "1"]),
+            (self.query_csv, ["--background", self.binary, "--workers", "2", "--batch-size", "2"]),
+        ]
+        for index, (queries, options) in enumerate(runs):
+            output = self.path(f"hits{index}.csv.gz")
+            self.assertEqual(self.run_main("--queries", queries, "--output", output, "--top-k", "2", *options), 0)
+            written = pd.read_csv(output)
+            self.assertEqual(written['query'].tolist(), expected['query'].tolist())
+            self.assertEqual(written['subject'].tolist(), expected['subject'].tolist())
+            self.assertEqual(written['rank'].tolist(), expected['rank'].tolist())
+
+    def test_errors (self):
+        """
+        Tests that a missing allele, a missing file or a bad query exit with status 1.
+        """
+
+        output = self.path("hits.csv")
+        self.assertEqual(self.run_main("--queries", self.query_csv, "--background", self.csv, "--output", output), 1)
+        self.assertEqual(self.run_main("--queries", self.path("missing.csv"), "--background", self.binary, "--output", output), 1)
+        self.assertEqual(self.run_main("--queries", self.query_csv, "--query-column", "sequence", "--background", self.binary,
+                                       "--output", output), 1)
+
+    def test_blank_queries (self):
+        """
+        Tests that blank and missing query cells are skipped instead of failing the screen.
+        """
+
+        with open(self.query_csv, "w") as handle:
+            handle.write("peptide,note\nEVDPIGHLY,a\n,b\n   ,c\nesdpivaqy,d\n")
+        self.assertEqual(list(read_query_peptides(self.query_csv, batch_size=2)), [["EVDPIGHLY"], ["ESDPIVAQY"]])
+
+        output = self.path("hits.csv")
+        self.assertEqual(self.run_main("--queries", self.query_csv, "--background", self.binary, "--output", output), 0)
+        self.assertEqual(sorted(set(pd.read_csv(output)['query'])), ["ESDPIVAQY", "EVDPIGHLY"])
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow") is not None, "pyarrow is not installed")
+    def test_parquet_without_first_hits (self):
+        """
+        Tests that a first batch without hits still writes a readable Parquet file.
+        """
+
+        pd.DataFrame({'peptide': ["AAAAAAAAA", "EVDPIGHLY"]}).to_csv(self.query_csv, index=False)
+        output = self.path("hits.parquet")
+        self.assertEqual(self.run_main("--queries", self.query_csv, "--background", self.binary, "--output", output,
+                                       "--max-mismatches", "1", "--batch-size", "1"), 0)
+        self.assertEqual(pd.read_parquet(output)['query'].tolist(), ["EVDPIGHLY"] * 2)
+
+    def test_empty_queries (self):
+        """
+        Tests that a query file without peptides still writes a header-only output file.
+        """
+
+        output = self.path("empty.csv")
+        for content in ("peptide\n", "peptide,note\n,a\n  ,b\n"):
+            with open(self.query_csv, "w") as handle:
+                handle.write(content)
+            self.assertEqual(self.run_main("--queries", self.query_csv, "--background", self.binary, "--output", output), 0)
+            written = pd.read_csv(output)
+            self.assertEqual(len(written), 0)
+            self.assertEqual(written.columns.tolist(), RESULT_COLUMNS)
+
+    def test_invalid_queries (self):
+        """
+        Tests that an invalid query fails the screen before anything is written, unless --skip-invalid is given.
+        """
+
+        pd.DataFrame({'peptide': self.queries + ["EVDPXGHLY"]}).to_csv(self.query_csv, index=False)
+        output = self.path("hits.csv")
+        self.assertEqual(self.run_main("--queries", self.query_csv, "--background", self.binary, "--output", output,
+                                       "--batch-size", "1"), 1)
+        self.assertFalse(os.path.exists(output))
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            status = main(["--queries", self.query_csv, "--background", self.binary, "--output", output, "--batch-size", "1",
+                           "--skip-invalid"])
+        self.assertEqual(status, 0)
+        self.assertIn("skipped 1 invalid queries", stderr.getvalue())
+        self.assertEqual(pd.read_csv(output)['query'].unique().tolist(), self.queries)
+
+if __name__ == '__main__':
+    unittest.main()
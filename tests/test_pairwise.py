@@ -0,0 +1,112 @@
+# Import needed libraries & packages
+import unittest
+import numpy as np
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+
+# Import core and pairwise functions
+from crossdome.core_functions import cross_compose
+from crossdome.pairwise import cluster_order, pairwise_matrix
+from crossdome.quant import similarity_matrix
+
+"""
+Unit tests for the all-vs-all peptide matrices in the CrossDome project.
+
+Tested Functions:
+    - pairwise_matrix: Blocked dense all-vs-all matrices and thresholded pair lists.
+    - cluster_order: Hierarchical ordering of a pairwise matrix.
+"""
+
+class TestPairwise (unittest.TestCase):
+    """
+    Unit tests for the CrossDome pairwise matrices.
+
+    Methods:
+
+    setUp(): Prepares a peptide set.
+    test_dense(): Tests that dense matrices match cross_compose and quant.
+    test_blocks_and_workers(): Tests that block sizes and threads do not change the matrix.
+    test_sparse(): Tests the thresholded pair lists, for both metrics.
+    test_cluster_order(): Tests that related peptides are ordered together.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        self.peptides = ["EVDPIGHLY", "ESDPIVAQY", "EVDPIGHFY", "KVAELVHFL", "EVDPIGLLY", "KVAELVHFM"]
+
+    def test_dense (self):
+        """
+        Tests that rows equal the cross_compose relatedness scores in float32, and similarities the quant ones.
+        """
+
+        matrix = pairwise_matrix(self.peptides)
+        self.assertEqual(matrix.values.dtype, np.float32)
+        self.assertEqual(matrix.attrs['metric'], 'relatedness')
+        background = xrBackground(allele="HLA-A*01:01", peptides=self.peptides)
+        for peptide in self.peptides:
+            expected = cross_compose(peptide, background).result['relatedness_score'].to_numpy(np.float32)
+            np.testing.assert_array_equal(matrix.loc[peptide].to_numpy(), expected)
+        np.testing.assert_array_equal(matrix.values, matrix.values.T)
+
+        similarity = pairwise_matrix(background, metric='similarity')
+        np.testing.assert_allclose(similarity.values, similarity_matrix(self.peptides, self.peptides), rtol=1e-6)
+
+        with self.assertRaises(ValueError):
+            pairwise_matrix(self.peptides, metric='cosine')
+        with self.assertRaises(ValueError):
+            pairwise_matrix(self.peptides + ["EVDPIGHLLY"])
+
+    def test_blocks_and_workers (self):
+        """
+        Tests that small blocks, threads and substitution scoring give the same symmetric matrices.
+        """
+
+        expected = pairwise_matrix(self.peptides, substitution='blosum62')
+        for block_size, workers in ((4, None), (4, 3), (1, 2)):
+            matrix = pairwise_matrix(self.peptides, substitution='blosum62', block_size=block_size, workers=workers)
+            np.testing.assert_array_equal(matrix.values, expected.values)
+
+    def test_sparse (self):
+        """
+        Tests that the thresholded output lists exactly the related pairs of distinct peptides of the dense matrix,
+        identical peptides (relatedness score 0) included.
+        """
+
+        dense = pairwise_matrix(self.peptides, metric='similarity').values
+        for block_size in (4, 1 << 20):
+            related = pairwise_matrix(self.peptides, metric='similarity', threshold=0.8, block_size=block_size)
+            left, right = np.nonzero(np.triu(dense >= 0.8, k=1))
+            self.assertEqual(related['left'].tolist(), left.tolist())
+            self.assertEqual(related['right'].tolist(), right.tolist())
+            np.testing.assert_array_equal(related['similarity'].to_numpy(), dense[left, right])
+        self.assertEqual(len(related), 3)
+
+        peptides = self.peptides + ["EVDPIGHLY"]
+        dense = pairwise_matrix(peptides).values
+        for block_size in (4, 1 << 20):
+            related = pairwise_matrix(peptides, threshold=1.0, block_size=block_size)
+            left, right = np.nonzero(np.triu(dense <= 1.0, k=1))
+            self.assertEqual(list(zip(related['left'], related['right'])), list(zip(left.tolist(), right.tolist())))
+            np.testing.assert_array_equal(related['relatedness'].to_numpy(), dense[left, right])
+        identical = related[(related['left'] == 0) & (related['right'] == len(peptides) - 1)]
+        self.assertEqual(identical['relatedness'].tolist(), [0.0])
+        self.assertEqual(related.attrs['metric'], 'relatedness')
+
+    def test_cluster_order (self):
+        """
+        Tests that cluster ordering places the E... and KVAELV families in contiguous runs.
+        """
+
+        matrix = pairwise_matrix(self.peptides)
+        order = [self.peptides[index] for index in cluster_order(matrix)]
+        families = [peptide[0] for peptide in order]
+        self.assertEqual(sorted(order), sorted(self.peptides))
+        self.assertEqual(sum(left != right for left, right in zip(families, families[1:])), 1)
+        self.assertEqual(cluster_order(matrix.values[:2, :2]).tolist(), [0, 1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# Import needed libraries & packages
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+
+# Import core and profiling functions
+from crossdome.core_functions import cross_compose, cross_compose_many, cross_write
+from crossdome.profiling import Profiler, active_profiler, profiling, stage
+from crossdome.utils import load_background_binary, save_background_binary
+
+"""
+Unit tests for the optional instrumentation in the CrossDome project.
+
+Tested Functions:
+    - cross_compose / cross_compose_many: The profile option.
+    - profiling: Stage recording across scoring, DataFrame construction, export and I/O.
+"""
+
+class TestProfiling (unittest.TestCase):
+    """
+    Unit tests for the CrossDome instrumentation.
+
+    Methods:
+
+    setUp(): Prepares a background.
+    test_profile_option(): Tests the stage breakdown stored in result.analysis.
+    test_profiling_context(): Tests stages recorded outside cross_compose and the metrics sink.
+    test_memory(): Tests peak allocation tracing.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        self.query      = "EVDPIGHLY"
+        self.background = xrBackground(allele="HLA-A*01:01", peptides=["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLY"])
+
+    def test_profile_option (self):
+        """
+        Tests that profile=True records the stages of a run, and that profiling is off by default.
+        """
+
+        result = cross_compose(self.query, self.background, profile=True)
+        profile = result.analysis['profile']
+        self.assertEqual(list(profile)[:3], ['validation', 'null', 'encoding'])
+        self.assertEqual(profile['scoring']['items'], 3)
+        self.assertEqual(profile['statistics']['calls'], 1)
+        self.assertGreaterEqual(profile['scoring']['seconds'], 0)
+
+        self.assertNotIn('profile', cross_compose(self.query, self.background).analysis)
+        self.assertIsNone(active_profiler())
+        with stage('unused') as timing:
+            timing.add(1)
+
+        results = cross_compose_many([self.query, "ESDPIVAQY"], self.background, profile=True)
+        self.assertEqual(results[0].analysis['profile']['scoring']['items'], 6)
+        self.assertIs(results[0].analysis['profile'], results[1].analysis['profile'])
+
+    def test_profiling_context (self):
+        """
+        Tests that an active profiler records DataFrame construction, export and binary I/O,
+        and forwards every stage to its sink.
+        """
+
+        records = []
+        with tempfile.TemporaryDirectory() as directory, profiling(sink=lambda name, record: records.append(name)) as profiler:
+            path = os.path.join(directory, "background.xrbg")
+            save_background_binary(self.background, path)
+            load_background_binary(path)
+            cross_write(cross_compose(self.query, self.background), os.path.join(directory, "hits.csv"))
+
+        for name in ('save_background_binary', 'load_background_binary', 'scoring', 'dataframe', 'export'):
+            self.assertIn(name, profiler.stages)
+            self.assertIn(name, records)
+        self.assertEqual(profiler.stages['export']['items'], 3)
+        self.assertIsNone(active_profiler())
+
+    def test_memory (self):
+        """
+        Tests that memory=True reports the peak allocation of each stage and stops tracing afterwards.
+        """
+
+        profiler = Profiler(memory=True)
+        with profiling(profiler):
+            with stage('outer'):
+                with stage('inner'):
+                    buffer = bytearray(1 << 20)
+                del buffer
+        self.assertGreaterEqual(profiler.stages['inner']['peak_bytes'], 1 << 20)
+        self.assertGreaterEqual(profiler.stages['outer']['peak_bytes'], 1 << 20)
+        self.assertFalse(tracemalloc.is_tracing())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# Import needed libraries & packages
+import gzip
+import os
+import tempfile
+import unittest
+import numpy as np
+
+# Import core functions and the proteome index
+from crossdome.core_functions import cross_compose
+from crossdome.proteome import ProteomeIndex
+
+"""
+Unit tests for the proteome k-mer index in the CrossDome project.
+
+Tested Functions:
+    - ProteomeIndex.from_fasta: Streaming digestion of a FASTA file into a background.
+    - ProteomeIndex.sources: Source proteins and offsets of peptides.
+    - ProteomeIndex.annotate: Source proteins of result hits.
+"""
+
+class TestProteomeIndex (unittest.TestCase):
+    """
+    Unit tests for the CrossDome proteome index.
+
+    Methods:
+
+    setUp(): Writes a small compressed proteome FASTA file.
+    test_digestion(): Tests that the background holds every distinct valid k-mer, whatever the chunk size.
+    test_sources(): Tests the protein and offset of every occurrence.
+    test_annotate(): Tests the source proteins of cross_compose hits.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        self.records = [("sp|P04637|P53_HUMAN", "MEEPQSDPSVEPPLSQETFSDLWKLLPEN"),
+                        ("sp|P43357|MAGA3_HUMAN", "AAEVDPIGHLYAAXMEEPQSDPS"),
+                        ("tr|Q00001|TEST", "EVDPIGHLY")]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.file_path = os.path.join(directory.name, "proteome.fasta.gz")
+        with gzip.open(self.file_path, "wt") as handle:
+            for identifier, sequence in self.records:
+                handle.write(f">{identifier} description\n{sequence[:10]}\n{sequence[10:]}\n")
+
+    def _kmers (self, length):
+        """Lists the distinct valid k-mers of the records."""
+
+        return {sequence[start:start + length] for _, sequence in self.records
+                for start in range(len(sequence) - length + 1) if "X" not in sequence[start:start + length]}
+
+    def test_digestion (self):
+        """
+        Tests that the background holds every distinct valid k-mer, whatever the chunk size.
+        """
+
+        index = ProteomeIndex.from_fasta(self.file_path, lengths=(9, 10))
+        self.assertEqual(index.proteins, [identifier for identifier, _ in self.records])
+        self.assertEqual(index.lengths, [9, 10])
+        for length in (9, 10):
+            peptides = index.background.bucket(length).peptides
+            self.assertEqual(len(peptides), len(set(peptides)))
+            self.assertEqual(set(peptides), self._kmers(length))
+
+        chunked = ProteomeIndex.from_fasta(self.file_path, lengths=(9, 10), chunk_size=8)
+        self.assertEqual(chunked.background.peptides, index.background.peptides)
+        self.assertEqual(chunked.sources(["MEEPQSDPS"]).values.tolist(), index.sources(["MEEPQSDPS"]).values.tolist())
+
+        with self.assertRaises(ValueError):
+            ProteomeIndex.from_sequences([("short", "MEEP")])
+
+    def test_sources (self):
+        """
+        Tests the protein and offset of every occurrence.
+        """
+
+        index = ProteomeIndex.from_fasta(self.file_path)
+        sources = index.sources(["EVDPIGHLY", "AAAAAAAAA", "MEEPQSDPS", "MEEPQSDPSV"])
+        self.assertEqual(sources.values.tolist(), [
+            ["EVDPIGHLY", "sp|P43357|MAGA3_HUMAN", 2], ["EVDPIGHLY", "tr|Q00001|TEST", 0],
+            ["MEEPQSDPS", "sp|P04637|P53_HUMAN", 0], ["MEEPQSDPS", "sp|P43357|MAGA3_HUMAN", 14]
+        ])
+        for peptide, protein, offset in sources.values:
+            sequence = dict(self.records)[protein]
+            self.assertEqual(sequence[offset:offset + len(peptide)], peptide)
+
+    def test_annotate (self):
+        """
+        Tests the source proteins of cross_compose hits.
+        """
+
+        index = ProteomeIndex.from_fasta(self.file_path)
+        result = index.annotate(cross_compose("EVDPIGHLY", index.background, top_k=3))
+        frame = result.result
+        self.assertEqual(frame.loc[0, 'subject'], "EVDPIGHLY")
+        self.assertEqual(frame.loc[0, 'source_proteins'], "sp|P43357|MAGA3_HUMAN;tr|Q00001|TEST")
+        self.assertEqual(frame['source_count'].tolist()[0], 2)
+        self.assertTrue(np.all(frame['source_count'].to_numpy() >= 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
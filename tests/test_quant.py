@@ -0,0 +1,101 @@
+# Import needed libraries & packages 
+import unittest 
+import numpy as np 
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+
+# Import quantitative functions 
+from crossdome.quant import peptide_mismatch_count, peptide_similarity, overall_similarity, mismatch_distribution, peptide_distance
+from crossdome.quant import mismatch_matrix, similarity_matrix, mismatch_histogram
+
+"""
+Unit tests for the quantitative functions in the CrossDome project.
+These tests check that the array-native functions agree with the per-pair string functions.
+
+Tested Functions:
+    - mismatch_matrix / similarity_matrix: Bulk query-by-background comparisons.
+    - mismatch_histogram: Per-query counts of background peptides by mismatch number.
+    - overall_similarity / mismatch_distribution: String API on top of the bulk functions.
+"""
+
+class TestQuant (unittest.TestCase):
+    """
+    Unit tests for the quantitative functions in CrossDome.
+    
+    Methods:
+    
+    setUp(): Prepares data for use in the tests.
+    test_bulk_matches_pairwise(): Tests bulk functions against per-pair results.
+    test_peptide_lengths(): Tests 8 to 11-mers and per-length comparison of mixed-length backgrounds.
+    test_mismatch_histogram(): Tests histogram counts for several queries.
+    """
+    
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+        
+        self.queries:list        = ["EVDPIGHLY", "KVAELVHFL"]
+        self.background_peptides = ["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLY", "KVAELVHFL"]
+        self.background          = xrBackground(allele="HLA-A*01:01", peptides=self.background_peptides)
+    
+    def test_bulk_matches_pairwise (self):
+        """
+        Tests that string, encoded and xrBackground inputs give the per-pair results.
+        """
+        
+        expected = [[peptide_mismatch_count(query, candidate) for candidate in self.background_peptides] for query in self.queries]
+        for background in (self.background_peptides, self.background, self.background.encoded):
+            np.testing.assert_array_equal(mismatch_matrix(self.queries, background), expected)
+        
+        similarities = [[peptide_similarity(query, candidate) for candidate in self.background_peptides] for query in self.queries]
+        np.testing.assert_allclose(similarity_matrix(self.queries, self.background), similarities)
+        
+        self.assertEqual(mismatch_distribution(self.queries[0], self.background_peptides), expected[0])
+        self.assertEqual(peptide_distance(self.queries[0], self.background_peptides[0]), float(expected[0][0]))
+        self.assertAlmostEqual(overall_similarity(self.queries[0], self.background), np.mean(similarities[0]))
+        
+        with self.assertRaises(ValueError):
+            mismatch_matrix("EVDPIGHL", self.background)
+    
+    def test_peptide_lengths (self):
+        """
+        Tests that 8 to 11-mers are supported, other lengths rejected, and mixed-length backgrounds
+        compared per length bucket.
+        """
+        
+        self.assertEqual(peptide_mismatch_count("EVDPAIGHLY", "EVDPIGHLLY"), 4)
+        self.assertAlmostEqual(peptide_similarity("EVDPIGHY", "EVDPIGHL"), 7 / 8)
+        with self.assertRaises(ValueError):
+            peptide_similarity("EVDPIGHLY", "EVDPAIGHLY")
+        
+        background = xrBackground(allele="HLA-A*01:01", peptides=self.background_peptides + ["EVDPAIGHLY"], lengths=(9, 10))
+        np.testing.assert_array_equal(mismatch_matrix(self.queries, background), mismatch_matrix(self.queries, self.background))
+        self.assertEqual(mismatch_distribution("EVDPIGHLLY", background), [4])
+        
+        # Unsupported lengths are rejected by the bulk functions as by the per-pair ones
+        for function, query, candidates in ((mismatch_distribution, "ABC", ["ABD"]), (overall_similarity, "ABCDE", ["ABCDF"]),
+                                            (mismatch_matrix, ["EVDPIGHLYAAA"], ["EVDPIGHLYAAA"])):
+            with self.assertRaises(ValueError):
+                function(query, candidates)
+    
+    def test_mismatch_histogram (self):
+        """
+        Tests that histograms count every background peptide once per query, from strings or encoded peptides.
+        """
+        
+        histogram = mismatch_histogram(self.queries, self.background)
+        self.assertEqual(histogram.shape, (2, 10))
+        self.assertEqual(histogram.sum(axis=1).tolist(), [4, 4])
+        self.assertEqual(histogram[0, :5].tolist(), [0, 2, 0, 0, 1])
+        self.assertEqual(histogram[1, 0], 1)
+        
+        # String queries and backgrounds give the same counts as encoded ones
+        np.testing.assert_array_equal(mismatch_histogram(self.queries, self.background_peptides), histogram)
+        np.testing.assert_array_equal(mismatch_histogram(self.queries[0], self.background.encoded), histogram[:1])
+        self.assertEqual(mismatch_histogram(["EVDPIGHLY", "ESDPIVAQY"], ["EVDPIGHLY", "ESDPIVAQY", "AAAAAAAAA"])[:, :3].tolist(),
+                         [[1, 0, 0], [1, 0, 0]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# Import needed libraries & packages
+import asyncio
+import importlib.util
+import unittest
+import numpy as np
+
+# Import core objects and functions
+from crossdome.core_classes import xrBackground
+from crossdome.core_functions import cross_compose, cross_compose_many
+from crossdome.server import ScoringClient, ScoringServer
+
+"""
+Unit tests for the local scoring server in the CrossDome project.
+
+Tested Functions:
+    - ScoringServer: Micro-batched scoring over HTTP.
+    - ScoringClient: Local client requests in JSON and Arrow.
+"""
+
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+class TestScoringServer (unittest.TestCase):
+    """
+    Unit tests for the CrossDome scoring server.
+
+    Methods:
+
+    setUp(): Prepares a background.
+    test_micro_batching(): Tests that concurrent requests share batches and match cross_compose.
+    test_errors(): Tests the error responses.
+    test_arrow(): Tests Arrow responses.
+    test_request_headers(): Tests the responses to malformed request lines and invalid or oversized Content-Length headers.
+    test_close(): Tests that closing the server waits for the batches in flight.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        self.background = xrBackground(allele="HLA-A*01:01", peptides=["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLY"])
+        self.queries    = ["EVDPIGHLY", "ESDPIVAQY", "EVDPIGHFY", "KVAELVHFL"]
+
+    def serve (self, scenario, **options):
+        """Runs a scenario coroutine against a server on a free local port."""
+
+        async def run():
+            server = await ScoringServer([self.background], **options).start(port=0)
+            try:
+                return await scenario(server, ScoringClient(*server.address[:2]))
+            finally:
+                await server.close()
+        return asyncio.run(run())
+
+    def test_micro_batching (self):
+        """
+        Tests that concurrent single-query requests are coalesced and answered like cross_compose.
+        """
+
+        async def scenario(server, client):
+            responses = await asyncio.gather(*(client.score("HLA-A*01:01", [query], top_k=2) for query in self.queries))
+            return responses, dict(server.stats)
+
+        responses, stats = self.serve(scenario, batch_window=0.2)
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['batches'], 1)
+        for query, response in zip(self.queries, responses):
+            hits = response['results'][0]['hits']
+            expected = cross_compose(query, self.background, top_k=2).result
+            self.assertEqual(response['results'][0]['query'], query)
+            self.assertEqual([hit['subject'] for hit in hits], expected['subject'].tolist())
+            np.testing.assert_allclose([hit['pvalue'] for hit in hits], expected['pvalue'])
+
+        # A full batch is scored without waiting for the window
+        async def full(server, client):
+            await asyncio.wait_for(client.score("HLA-A*01:01", self.queries), timeout=5)
+            return dict(server.stats)
+        self.assertEqual(self.serve(full, batch_window=60, max_batch=2)['batches'], 2)
+
+    def test_errors (self):
+        """
+        Tests that unknown alleles, invalid queries and unknown endpoints get error responses.
+        """
+
+        async def scenario(server, client):
+            statuses = []
+            for payload in ({'allele': "HLA-B*07:02", 'queries': ["EVDPIGHLY"]}, {'allele': "HLA-A*01:01", 'queries': ["EVDPIGHLX"]},
+                            {'allele': "HLA-A*01:01", 'queries': ["EVDPIGHLY"], 'unknown': 1}):
+                statuses.append((await client.request("POST", "/score", payload))[0])
+            statuses.append((await client.request("GET", "/missing"))[0])
+            statuses.append((await client.request("GET", "/health"))[0])
+            with self.assertRaises(IOError):
+                await client.score("HLA-A*01:01", ["EVDPIG"])
+            return statuses
+
+        self.assertEqual(self.serve(scenario), [404, 400, 400, 404, 200])
+
+    @unittest.skipUnless(_HAS_PYARROW, "pyarrow is not installed")
+    def test_arrow (self):
+        """
+        Tests that Arrow responses hold the long-form results.
+        """
+
+        async def scenario(server, client):
+            return await client.score("HLA-A*01:01", self.queries[:2], format='arrow', max_mismatches=1)
+
+        frame = self.serve(scenario)
+        expected = cross_compose_many(self.queries[:2], self.background, long_form=True, max_mismatches=1).result
+        self.assertEqual(frame['query'].tolist(), ["EVDPIGHLY", "EVDPIGHLY", "ESDPIVAQY"])
+        self.assertEqual(frame['subject'].tolist(), expected['subject'].tolist())
+
+    def test_request_headers (self):
+        """
+        Tests that a malformed request line or Content-Length gets a 400 and an oversized body a 413, without reading it.
+        """
+
+        async def send(server, request):
+            reader, writer = await asyncio.open_connection(*server.address[:2])
+            writer.write(request.encode("latin-1"))
+            await writer.drain()
+            status = int((await asyncio.wait_for(reader.readline(), timeout=5)).split()[1])
+            writer.close()
+            return status
+
+        async def scenario(server, client):
+            requests = [f"POST /score HTTP/1.1\r\nHost: crossdome\r\nContent-Length: {header}\r\n\r\n"
+                        for header in ("abc", "-1", str(1 << 40))] + ["GARBAGE\r\n\r\n"]
+            statuses = [await send(server, request) for request in requests]
+            return statuses, (await client.request("GET", "/health"))[0]
+
+        self.assertEqual(self.serve(scenario), ([400, 400, 413, 400], 200))
+
+    def test_close (self):
+        """
+        Tests that close flushes a waiting batch and returns once it is scored.
+        """
+
+        async def run():
+            server = await ScoringServer([self.background], batch_window=60).start(port=0)
+            pending = asyncio.ensure_future(server.score("HLA-A*01:01", self.queries[:2]))
+            await asyncio.sleep(0)
+            await server.close()
+            self.assertEqual(len(server._tasks), 0)
+            return await asyncio.wait_for(pending, timeout=5)
+
+        results = asyncio.run(run())
+        self.assertEqual([result.query for result in results], self.queries[:2])
+
+if __name__ == '__main__':
+    unittest.main()
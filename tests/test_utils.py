@@ -0,0 +1,134 @@
+# Import needed libraries & packages 
+import os
+import tempfile
+import unittest 
+import numpy as np 
+import pandas as pd 
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+
+# Import utility functions 
+from crossdome.utils import save_background_binary, load_background_binary, read_background_header, convert_csv_to_background
+from crossdome.utils import load_bio_database, load_off_target_backgrounds, _BIO_DATABASE_MEMORY
+
+"""
+Unit tests for the utility functions in the CrossDome project.
+These tests cover loading and saving of peptide backgrounds.
+
+Tested Functions:
+    - save_background_binary / load_background_binary: Binary background round trip.
+    - convert_csv_to_background: Conversion from the CSV database format.
+    - load_bio_database / load_off_target_backgrounds: Bundled .rda datasets and their cache.
+"""
+
+class TestUtils (unittest.TestCase):
+    """
+    Unit tests for the utility functions in CrossDome.
+    
+    Methods:
+    
+    setUp(): Prepares a temporary directory and a background for the tests.
+    test_background_binary_roundtrip(): Tests saving and memory-mapping a binary background.
+    test_background_binary_lengths(): Tests saving and mapping a mixed-length background.
+    test_background_binary_corruption(): Tests that checksum verification detects corruption.
+    test_convert_csv_to_background(): Tests conversion from a CSV peptide file.
+    test_load_bio_database(): Tests the native .rda loader and its columnar cache.
+    """
+    
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+        
+        self.directory           = tempfile.TemporaryDirectory()
+        self.background_peptides = ["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLY"]
+        self.background          = xrBackground(allele="HLA-A*01:01", peptides=self.background_peptides)
+        self.path                = os.path.join(self.directory.name, "background.xrbg")
+    
+    def tearDown (self):
+        """
+        Removes the temporary directory.
+        """
+        
+        self.directory.cleanup()
+    
+    def test_background_binary_roundtrip (self):
+        """
+        Tests that a saved background is memory-mapped back with the same allele and peptides.
+        """
+        
+        save_background_binary(self.background, self.path)
+        header = read_background_header(self.path)
+        self.assertEqual(header['count'], 3)
+        self.assertEqual(header['offset'] % 64, 0)
+        
+        for mmap in (True, False):
+            loaded = load_background_binary(self.path, mmap=mmap, verify=True)
+            self.assertEqual(loaded.allele, "HLA-A*01:01")
+            self.assertEqual(loaded.peptides, self.background_peptides)
+            np.testing.assert_array_equal(loaded.encoded, self.background.encoded)
+    
+    def test_background_binary_lengths (self):
+        """
+        Tests that a mixed-length background is saved and mapped back one aligned bucket per length.
+        """
+        
+        peptides = self.background_peptides + ["EVDPAIGHLY", "EVDPIGHY"]
+        background = xrBackground(allele="HLA-A*01:01", peptides=peptides, lengths=(8, 9, 10))
+        save_background_binary(background, self.path)
+        header = read_background_header(self.path)
+        self.assertEqual([bucket['length'] for bucket in header['buckets']], [8, 9, 10])
+        self.assertTrue(all(bucket['offset'] % 64 == 0 for bucket in header['buckets']))
+        
+        loaded = load_background_binary(self.path, verify=True)
+        self.assertEqual(loaded.lengths, [8, 9, 10])
+        self.assertEqual(loaded.peptides, background.peptides)
+        self.assertEqual(loaded.bucket(10).peptides, ["EVDPAIGHLY"])
+    
+    def test_background_binary_corruption (self):
+        """
+        Tests that a modified residue matrix fails checksum verification.
+        """
+        
+        save_background_binary(self.background, self.path)
+        with open(self.path, "r+b") as handle:
+            handle.seek(-1, os.SEEK_END)
+            handle.write(bytes([0]))
+        
+        with self.assertRaises(IOError):
+            load_background_binary(self.path, verify=True)
+    
+    def test_convert_csv_to_background (self):
+        """
+        Tests that a CSV peptide dataset is converted and deduplicated.
+        """
+        
+        csv_path = os.path.join(self.directory.name, "database.csv")
+        pd.DataFrame({'peptide': self.background_peptides * 2}).to_csv(csv_path, index=False)
+        
+        convert_csv_to_background(csv_path, self.path, allele="HLA-A*01:01", deduplicate=True)
+        self.assertEqual(load_background_binary(self.path).peptides, self.background_peptides)
+
+    def test_load_bio_database (self):
+        """
+        Tests that the bundled datasets load natively and that the columnar cache
+        reproduces the parsed tables exactly.
+        """
+        
+        parsed = load_bio_database("mage_off_targets", use_cache=False)
+        self.assertEqual(parsed.shape, (61, 5))
+        self.assertEqual(parsed['peptide_sequence'].iloc[0], "EVDPMDIMY")
+        
+        load_bio_database("mage_off_targets", cache_dir=self.directory.name)
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, "mage_off_targets.npz")))
+        _BIO_DATABASE_MEMORY.clear()
+        cached = load_bio_database("mage_off_targets", cache_dir=self.directory.name)
+        pd.testing.assert_frame_equal(cached, parsed, check_dtype=False)
+        
+        backgrounds = load_off_target_backgrounds(cache_dir=self.directory.name)
+        self.assertEqual(list(backgrounds), ["HLA-A*01:01"])
+        self.assertEqual(len(backgrounds["HLA-A*01:01"]), parsed['peptide_sequence'].nunique())
+
+if __name__ == '__main__':
+    unittest.main()
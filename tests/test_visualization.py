@@ -0,0 +1,123 @@
+# Import needed libraries & packages
+import os
+import tempfile
+import unittest
+import numpy as np
+
+# Import core objects
+from crossdome.core_classes import xrBackground
+
+# Import core and visualization functions
+from crossdome.core_functions import cross_compose_many
+from crossdome.visualization import plot_mismatch_distribution, plot_query_reports, plot_relatedness_score_distribution
+
+"""
+Unit tests for the plots of the CrossDome project.
+
+Tested Functions:
+    - plot_mismatch_distribution: Mismatch counts aggregated with np.bincount.
+    - plot_relatedness_score_distribution: Scores aggregated with np.histogram.
+    - plot_query_reports: Per-query report figures rendered in batches.
+"""
+
+class TestVisualization (unittest.TestCase):
+    """
+    Unit tests for the CrossDome plots.
+
+    Methods:
+
+    setUp(): Prepares a background, queries and an output directory.
+    test_mismatch_distribution(): Tests one bar per number of mismatches, from a result or a list.
+    test_relatedness_score_distribution(): Tests the aggregated histogram saved to a file.
+    test_query_reports(): Tests one figure per query, from lists and long-form results, with workers.
+    test_query_reports_names(): Tests reports of queries without hits and unique names of repeated queries.
+    """
+
+    def setUp (self):
+        """
+        Setup function to prepare data before each test runs.
+        """
+
+        rng = np.random.default_rng(0)
+        self.background = xrBackground.from_encoded("HLA-A*01:01", rng.integers(0, 20, size=(500, 9), dtype=np.uint8), validate=False)
+        self.queries = ["EVDPIGHLY", "ESDPIVAQY", "KVAELVHFL"]
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_mismatch_distribution (self):
+        """
+        Tests one bar per number of mismatches, from a result or a list.
+        """
+
+        result = cross_compose_many(self.queries[:1], self.background)[0]
+        file_path = os.path.join(self.directory.name, "mismatches.png")
+        figure = plot_mismatch_distribution(result, file_path=file_path)
+
+        bars = figure.axes[0].patches
+        expected = np.bincount(result.column('num_negative'))
+        self.assertEqual(len(bars), len(expected))
+        self.assertEqual([bar.get_height() for bar in bars], expected.tolist())
+        self.assertTrue(os.path.getsize(file_path) > 0)
+
+        figure = plot_mismatch_distribution([0, 2, 2, 3], file_path=file_path)
+        self.assertEqual([bar.get_height() for bar in figure.axes[0].patches], [1, 0, 2, 1])
+        with self.assertRaises(ValueError):
+            plot_mismatch_distribution([1, -1], file_path=file_path)
+
+    def test_relatedness_score_distribution (self):
+        """
+        Tests the aggregated histogram saved to a file.
+        """
+
+        result = cross_compose_many(self.queries[:1], self.background)[0]
+        file_path = os.path.join(self.directory.name, "scores.svg")
+        figure = plot_relatedness_score_distribution(result, bins=20, file_path=file_path)
+
+        heights = [bar.get_height() for bar in figure.axes[0].patches]
+        self.assertEqual(len(heights), 20)
+        self.assertEqual(sum(heights), len(self.background))
+        self.assertTrue(os.path.getsize(file_path) > 0)
+
+    def test_query_reports (self):
+        """
+        Tests one figure per query, from lists and long-form results, with workers.
+        """
+
+        results = cross_compose_many(self.queries, self.background, top_k=50)
+        paths = plot_query_reports(results, self.directory.name, batch_size=2, workers=2)
+        self.assertEqual(paths, [os.path.join(self.directory.name, f"{query}.png") for query in self.queries])
+        self.assertTrue(all(os.path.getsize(file_path) > 0 for file_path in paths))
+
+        long_form = cross_compose_many(self.queries, self.background, top_k=50, long_form=True)
+        directory = os.path.join(self.directory.name, "long_form")
+        paths = plot_query_reports(long_form, directory, format='svg')
+        self.assertEqual([os.path.basename(file_path) for file_path in paths], [f"{query}.svg" for query in self.queries])
+
+        with self.assertRaises(ValueError):
+            plot_query_reports(results, directory, batch_size=0)
+
+    def test_query_reports_names (self):
+        """
+        Tests that queries without hits get a report and that repeated queries do not overwrite each other.
+        """
+
+        background = xrBackground(allele="HLA-A*01:01", peptides=["ESDPIVAQY", "EVDPIGHFY", "EVDPIGLLY"])
+        other = xrBackground(allele="HLA-B*07:02", peptides=background.peptides)
+        queries = ["EVDPIGHLY", "AAAAAAAAA", "EVDPIGHLY"]
+        for long_form in (True, False):
+            results = cross_compose_many(queries, background, max_mismatches=1, long_form=long_form)
+            self.assertEqual(len(results), 4 if long_form else 3)
+            directory = os.path.join(self.directory.name, f"long_form_{long_form}")
+            paths = plot_query_reports(results, directory)
+            self.assertEqual([os.path.basename(file_path) for file_path in paths],
+                             ["EVDPIGHLY_HLA-A_01_01.png", "AAAAAAAAA.png", "EVDPIGHLY_HLA-A_01_01_2.png"])
+            self.assertTrue(all(os.path.getsize(file_path) > 0 for file_path in paths))
+
+        results = [cross_compose_many(queries[:1], screened)[0] for screened in (background, other)]
+        paths = plot_query_reports(results, os.path.join(self.directory.name, "alleles"))
+        self.assertEqual([os.path.basename(file_path) for file_path in paths],
+                         ["EVDPIGHLY_HLA-A_01_01.png", "EVDPIGHLY_HLA-B_07_02.png"])
+
+
+if __name__ == '__main__':
+    unittest.main()